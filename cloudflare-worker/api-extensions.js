@@ -2,6 +2,8 @@
  * API Extensions for Noderr Fleet Command UI
  */
 
+import { signCommand } from './orchestrator.js';
+
 // Project Management
 export async function handleProjects(request, env, method) {
     const url = new URL(request.url);
@@ -223,42 +225,24 @@ async function approveTask(taskId, request, env) {
     const FLY_ENDPOINT = env.FLY_ENDPOINT || 'https://uncle-frank-claude.fly.dev';
     
     try {
-        // Stage all changes
-        const addResponse = await fetch(`${FLY_ENDPOINT}/git/add`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ path: '/workspace' })
+        // Stage, commit and push in one server-side call (signed: the endpoint is public)
+        const body = JSON.stringify({
+            path: '/workspace',
+            taskId,
+            message: commitMessage || `Task completed: ${task.description}`,
+            push: true
         });
-        
-        if (!addResponse.ok) {
-            throw new Error('Failed to stage changes');
-        }
-        
-        // Commit changes
-        const commitResponse = await fetch(`${FLY_ENDPOINT}/git/commit`, {
+        const signature = await signCommand(body, env.HMAC_SECRET || 'test-secret-change-in-production');
+        const commitResponse = await fetch(`${FLY_ENDPOINT}/git/commit-task`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                path: '/workspace',
-                message: commitMessage || `Task completed: ${task.description}`
-            })
+            headers: { 'Content-Type': 'application/json', 'X-Signature': signature },
+            body
         });
         
+        // Nothing left to commit (Claude committed during the task) still counts
         const commitResult = await commitResponse.json();
-        if (!commitResult.success) {
-            throw new Error(commitResult.error || 'Failed to commit');
-        }
-        
-        // Push to remote
-        const pushResponse = await fetch(`${FLY_ENDPOINT}/git/push`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ path: '/workspace' })
-        });
-        
-        const pushResult = await pushResponse.json();
-        if (!pushResult.success) {
-            throw new Error(pushResult.error || 'Failed to push');
+        if (!commitResult.success && !commitResult.nothing_to_commit) {
+            throw new Error(commitResult.error || `Failed to ${commitResult.phase || 'commit'}`);
         }
         
         // Update task status
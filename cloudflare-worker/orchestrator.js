@@ -162,6 +162,7 @@ async function sendCommandToAgent(command, flyEndpoint, hmacSecret) {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'X-Client-Id': 'orchestrator',  // its own rate limit bucket on the agent
       },
       body: JSON.stringify({
         command: command,
@@ -311,4 +312,4 @@ async function signCommand(command, secret) {
 }
 
 // Export functions for use in the worker
-export { orchestrate, analyzeStateWithClaude, startNoderSession, NODERR_PROMPTS_GUIDE };
\ No newline at end of file
+export { orchestrate, analyzeStateWithClaude, startNoderSession, signCommand, NODERR_PROMPTS_GUIDE };
\ No newline at end of file
@@ -50,6 +50,8 @@ async function executeTask(task, env) {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        'X-Client-Id': 'orchestrator',  // its own rate limit bucket on the agent
+        'Idempotency-Key': task.taskId,  // a retry of a command that did run is not run again
       },
       body: JSON.stringify({
         command: task.command,
@@ -383,11 +385,46 @@ export default {
       // Log the webhook event
       console.log('Webhook received:', data);
       
-      // Trigger orchestration to determine next step
-      const result = await orchestrate(env);
+      // Delta notifications carry transcript offsets; ask for a resend if we missed a range.
+      // The monitor's spool may deliver several events per POST, in order per session.
+      const events = Array.isArray(data.events) ? data.events : [data];
+      const cursors = {};
+      const resend = {};
+      for (const event of events) {
+        if (event.event !== 'output_delta' || !event.session) continue;
+        const cursorKey = `monitor:${event.session}`;
+        if (!(cursorKey in cursors)) {
+          cursors[cursorKey] = await env.TASK_QUEUE.get(cursorKey, 'json') || { seq: 0, offset: 0 };
+        }
+        if (event.from_offset > cursors[cursorKey].offset && !event.reset) {
+          resend[event.session] = cursors[cursorKey].offset;
+        } else {
+          cursors[cursorKey] = { seq: event.seq, offset: event.to_offset };
+          delete resend[event.session];
+        }
+      }
+      for (const [cursorKey, cursor] of Object.entries(cursors)) {
+        await env.TASK_QUEUE.put(cursorKey, JSON.stringify(cursor));
+      }
+      
+      // The monitor classifies output with local rules and already acted on confident
+      // decisions; only ambiguous output (or events from older monitors) needs the LLM
+      const decided = events.filter(e => e.decision && e.decision.action !== 'escalate');
+      for (const event of decided) {
+        await env.TASK_QUEUE.put(`monitor:${event.session}:decision`, JSON.stringify({
+          ...event.decision, seq: event.seq, timestamp: event.timestamp
+        }));
+      }
+      const escalated = decided.length < events.length;
+      
+      // Trigger orchestration to determine next step (once per batch)
+      const result = escalated ? await orchestrate(env) : null;
       
       return new Response(JSON.stringify({
-        status: 'received',
+        status: Object.keys(resend).length ? 'gap' : 'received',
+        received: events.length,
+        resend,
+        decided_locally: decided.length,
         orchestration_result: result
       }), {
         headers: { 'Content-Type': 'application/json' }
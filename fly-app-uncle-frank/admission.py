@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Admission Queue for Noderr
+Commands that arrive over their client's rate limit are kept in a bounded queue in
+the shared state database and dispatched in arrival order (per client) as the
+client's tokens refill, instead of being rejected. Each gets a ticket that reports
+its position and, once dispatched, the result; commands still waiting at their
+deadline expire
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from rate_limit import RateLimiter
+from shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_QUEUE_MAX = int(os.environ.get('ADMISSION_QUEUE_MAX', '100'))  # queued commands, all clients
+ADMISSION_MAX_WAIT = float(os.environ.get('ADMISSION_MAX_WAIT', '600'))  # seconds before a queued command expires
+ADMISSION_RETENTION = float(os.environ.get('ADMISSION_RETENTION', '3600'))  # seconds finished tickets stay readable
+ADMISSION_POLL = float(os.environ.get('ADMISSION_POLL', '1'))  # seconds; picks up other workers' tickets
+
+class QueueFull(Exception):
+    """The admission queue holds ADMISSION_QUEUE_MAX commands already"""
+
+class AdmissionQueue:
+    """Queued commands dispatched by one worker at a time (whichever holds the dispatch lock)"""
+
+    def __init__(self, dispatch: Callable[[str], Dict[str, Any]], limiter: RateLimiter,
+                 ready: Callable[[], bool] = lambda: True, state: Optional[SharedState] = None):
+        self.dispatch = dispatch
+        self.limiter = limiter
+        self.ready = ready  # e.g. the container has finished booting
+        self._state = state or get_shared_state()
+        self._state.connection().execute(
+            'CREATE TABLE IF NOT EXISTS admission ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, ticket TEXT UNIQUE NOT NULL, client TEXT NOT NULL, '
+            'command TEXT NOT NULL, status TEXT NOT NULL, enqueued REAL NOT NULL, deadline REAL NOT NULL, '
+            'finished REAL, result TEXT)'
+        )
+        self._state.connection().execute(
+            'CREATE INDEX IF NOT EXISTS admission_status ON admission (status, client, id)')
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'dispatched': 0, 'expired': 0, 'rejected': 0}
+
+    def enqueue(self, client: str, command: str, max_wait: Optional[float] = None) -> Dict[str, Any]:
+        """Queue a command; raises QueueFull when the queue is at its bound"""
+        now = time.time()
+        wait = ADMISSION_MAX_WAIT if max_wait is None else max(0.1, min(max_wait, ADMISSION_MAX_WAIT))
+        ticket = str(uuid.uuid4())
+        with self._state.transaction() as db:
+            queued = db.execute("SELECT COUNT(*) FROM admission WHERE status = 'queued'").fetchone()[0]
+            if queued >= ADMISSION_QUEUE_MAX:
+                self.stats['rejected'] += 1
+                raise QueueFull(f"{queued} commands already queued")
+            db.execute("INSERT INTO admission (ticket, client, command, status, enqueued, deadline) "
+                       "VALUES (?, ?, ?, 'queued', ?, ?)", (ticket, client, command, now, now + wait))
+        self.stats['enqueued'] += 1
+        self.start()
+        self._wakeup.set()
+        return self.ticket(ticket)
+
+    def has_queued(self, client: str) -> bool:
+        """Whether client has commands waiting (new ones then queue behind them)"""
+        return self._state.connection().execute(
+            "SELECT 1 FROM admission WHERE status = 'queued' AND client = ? LIMIT 1", (client,)).fetchone() is not None
+
+    def ticket(self, ticket: str) -> Optional[Dict[str, Any]]:
+        db = self._state.connection()
+        row = db.execute('SELECT id, status, enqueued, deadline, finished, result FROM admission WHERE ticket = ?',
+                         (ticket,)).fetchone()
+        if row is None:
+            return None
+        row_id, status, enqueued, deadline, finished, result = row
+        info = {
+            'ticket': ticket,
+            'status': status,
+            'enqueued': datetime.fromtimestamp(enqueued).isoformat(),
+            'deadline': datetime.fromtimestamp(deadline).isoformat()
+        }
+        if status == 'queued':
+            info['position'] = db.execute("SELECT COUNT(*) FROM admission WHERE status = 'queued' AND id <= ?",
+                                          (row_id,)).fetchone()[0]
+        if finished:
+            info['finished'] = datetime.fromtimestamp(finished).isoformat()
+        if result:
+            info['result'] = json.loads(result)
+        return info
+
+    def queued(self) -> int:
+        return self._state.connection().execute(
+            "SELECT COUNT(*) FROM admission WHERE status = 'queued'").fetchone()[0]
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='admission', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        # Only one worker process dispatches; the others take over if it exits
+        with open(self._state.path + '.admission.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with self._state.transaction() as db:
+                # Interrupted mid-dispatch: the command may have been typed, so don't repeat it
+                db.execute("UPDATE admission SET status = 'failed', finished = ?, result = ? "
+                           "WHERE status = 'dispatching'",
+                           (time.time(), json.dumps({'success': False, 'message': 'Interrupted by restart'})))
+            while True:
+                try:
+                    wait = self._dispatch_next()
+                except Exception:
+                    logger.exception("Admission dispatch failed")
+                    wait = ADMISSION_POLL
+                if wait:
+                    self._wakeup.wait(wait)
+                    self._wakeup.clear()
+
+    def _dispatch_next(self) -> float:
+        """Dispatch the first command whose client has a token; returns how long to wait (0: go again)"""
+        now = time.time()
+        with self._state.transaction() as db:
+            expired = db.execute("UPDATE admission SET status = 'expired', finished = ? "
+                                 "WHERE status = 'queued' AND deadline < ?", (now, now)).rowcount
+            db.execute("DELETE FROM admission WHERE status != 'queued' AND finished < ?", (now - ADMISSION_RETENTION,))
+        self.stats['expired'] += expired
+        if not self.ready():
+            return ADMISSION_POLL
+
+        rows = self._state.connection().execute(
+            "SELECT id, client, command FROM admission WHERE status = 'queued' ORDER BY id LIMIT 200").fetchall()
+        wait = ADMISSION_POLL
+        blocked = set()
+        for row_id, client, command in rows:
+            if client in blocked:
+                continue  # keep each client's commands in order
+            allowed, retry_after = self.limiter.acquire(client)
+            if not allowed:
+                blocked.add(client)
+                wait = min(wait, retry_after)
+                continue
+            self._state.connection().execute("UPDATE admission SET status = 'dispatching' WHERE id = ?", (row_id,))
+            try:
+                result = self.dispatch(command)
+            except Exception as e:
+                logger.exception("Dispatching a queued command failed")
+                result = {'success': False, 'message': str(e)}
+            self._state.connection().execute(
+                'UPDATE admission SET status = ?, finished = ?, result = ? WHERE id = ?',
+                ('done' if result.get('success') else 'failed', time.time(), json.dumps(result), row_id))
+            self.stats['dispatched'] += 1
+            return 0
+        return wait
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Shared Flask App Factory for Noderr
+Builds every service's Flask app the same way (logging, CORS, liveness and
+readiness routes) and defers rarely used imports to their first use, so a service
+serves its first request sooner after a machine wake
+"""
+
+import os
+import sys
+import logging
+import importlib.util
+from typing import Any, List, Optional
+
+DEFAULT_CORS_METHODS = ["GET", "POST", "OPTIONS"]
+
+def lazy_import(name: str) -> Any:
+    """Module that is only loaded on first attribute access
+
+    For modules a service needs on a few routes (e.g. requests for proxying),
+    which would otherwise add their import time to every cold start.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named {name!r}")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def create_app(import_name: str, cors_methods: Optional[List[str]] = None):
+    """Flask app with logging, optional CORS and /livez + /readyz
+
+    cors_methods enables CORS for any origin on those methods; None leaves it off.
+    """
+    from flask import Flask
+    from startup import setup_startup_routes
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    app = Flask(import_name)
+    if cors_methods:
+        from flask_cors import CORS
+        CORS(app, origins="*", allow_headers=["Content-Type", "Idempotency-Key"], methods=cors_methods)
+    setup_startup_routes(app)
+    return app
+
+def run_app(app, default_port: int) -> None:
+    """Development server on $PORT (supervisor sets it per service)"""
+    port = int(os.environ.get('PORT', default_port))
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
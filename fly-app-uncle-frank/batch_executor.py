@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Batch Executor for Noderr's /execute
+Runs a batch's commands one after another with their delays kept on a timer wheel
+(no thread sleeps per delay). Each command's result is published as soon as it is
+known, optionally after waiting for Claude to finish responding to it, and a batch
+can stop at the first failure or be cancelled by id from any worker
+"""
+
+import os
+import math
+import time
+import uuid
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from completion_rules import RuleEngine
+from shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+BATCH_TICK = float(os.environ.get('BATCH_TICK', '0.01'))  # timer wheel resolution, seconds
+BATCH_WHEEL_SLOTS = int(os.environ.get('BATCH_WHEEL_SLOTS', '512'))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))  # threads running injections and checks
+BATCH_POLL = float(os.environ.get('BATCH_POLL', '1'))  # seconds between completion checks
+BATCH_IDLE = float(os.environ.get('BATCH_IDLE', '5'))  # unchanged output for this long counts as finished
+BATCH_STEP_TIMEOUT = float(os.environ.get('BATCH_STEP_TIMEOUT', '600'))  # seconds to wait for one command
+BATCH_RETENTION = float(os.environ.get('BATCH_RETENTION', '3600'))  # seconds finished batches stay readable
+
+FINISHED_STATES = ('prompt_returned', 'stage_completed', 'needs_input', 'error')
+
+class Timer:
+    def __init__(self, callback: Callable[[], None], rounds: int):
+        self.callback = callback
+        self.rounds = rounds
+        self.cancelled = False
+        self.fired = False
+        self.lock = threading.Lock()
+
+    def cancel(self) -> bool:
+        """False if the timer has already fired"""
+        with self.lock:
+            if self.fired:
+                return False
+            self.cancelled = True
+            return True
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule and cancel, one thread that ticks only while timers are pending"""
+
+    def __init__(self, tick: float = BATCH_TICK, slots: int = BATCH_WHEEL_SLOTS):
+        self.tick = tick
+        self._slots: List[List[Timer]] = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        ticks = max(1, math.ceil(delay / self.tick))
+        with self._cond:
+            timer = Timer(callback, (ticks - 1) // len(self._slots))
+            self._slots[(self._cursor + ticks) % len(self._slots)].append(timer)
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='timer-wheel', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return timer
+
+    def _run(self) -> None:
+        next_tick = time.monotonic() + self.tick
+        while True:
+            with self._cond:
+                while self._pending == 0:
+                    self._cond.wait()
+                    next_tick = time.monotonic() + self.tick
+                remaining = next_tick - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                next_tick += self.tick
+                self._cursor = (self._cursor + 1) % len(self._slots)
+                slot = self._slots[self._cursor]
+                due = [t for t in slot if t.rounds == 0 or t.cancelled]
+                slot[:] = [t for t in slot if not (t.rounds == 0 or t.cancelled)]
+                for t in slot:
+                    t.rounds -= 1
+                self._pending -= len(due)
+            for timer in due:
+                with timer.lock:
+                    timer.fired = not timer.cancelled
+                if timer.fired:
+                    try:
+                        timer.callback()
+                    except Exception:
+                        logger.exception("Timer callback failed")
+
+class Batch:
+    """One submitted batch; events are consumed by the request that submitted it"""
+
+    def __init__(self, commands: List[Dict[str, Any]], wait_for_completion: bool, fail_fast: bool):
+        self.id = str(uuid.uuid4())
+        self.commands = commands
+        self.wait_for_completion = wait_for_completion
+        self.fail_fast = fail_fast
+        self.results: List[Dict[str, Any]] = []
+        self.status = 'running'
+        self.timer: Optional[Timer] = None  # the pending delay before the next command
+        self.events: queue.Queue = queue.Queue()
+        self.done = threading.Event()
+
+    def summary(self) -> Dict[str, Any]:
+        return {'batch_id': self.id, 'status': self.status, 'results': self.results}
+
+    def stream(self):
+        """Events as they happen, ending with the batch's final status"""
+        while True:
+            event = self.events.get()
+            yield event
+            if event['type'] == 'done':
+                return
+
+class BatchExecutor:
+    """Schedules batches; inject types a command, capture returns the session's recent output"""
+
+    def __init__(self, inject: Callable[[str], Dict[str, Any]], capture: Callable[[], Optional[str]]):
+        self.inject = inject
+        self.capture = capture
+        self.wheel = TimerWheel()
+        self.rules = RuleEngine()
+        self._pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+        self._batches = get_shared_state().dict('batches')
+        self._running: Dict[str, Batch] = {}
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'commands': 0, 'cancelled': 0}
+
+    def submit(self, commands: List[Dict[str, Any]], wait_for_completion: bool = False,
+               fail_fast: bool = False) -> Batch:
+        batch = Batch(commands, wait_for_completion, fail_fast)
+        self._prune()
+        self._batches[batch.id] = {'status': 'running', 'total': len(commands), 'results': [],
+                                   'cancelled': False, 'created': time.time()}
+        self.stats['batches'] += 1
+        with self._lock:
+            self._running[batch.id] = batch
+        batch.events.put({'type': 'accepted', 'batch_id': batch.id, 'total': len(commands)})
+        self._schedule(batch, 0)
+        return batch
+
+    def status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return self._batches.get(batch_id)
+
+    def cancel(self, batch_id: str) -> bool:
+        """Stop a batch (in whichever worker runs it) before its next command"""
+        try:
+            with self._batches.edit(batch_id) as record:
+                if record['status'] != 'running':
+                    return False
+                record['cancelled'] = True
+        except KeyError:
+            return False
+        self.stats['cancelled'] += 1
+        with self._lock:
+            batch = self._running.get(batch_id)
+        # Running here and waiting out a delay: stop now rather than when it ends
+        if batch and batch.timer and batch.timer.cancel():
+            self._finish(batch, 'cancelled')
+        return True
+
+    def _cancelled(self, batch: Batch) -> bool:
+        record = self._batches.get(batch.id)
+        return bool(record and record.get('cancelled'))
+
+    def _schedule(self, batch: Batch, index: int) -> None:
+        if index == len(batch.commands):
+            return self._finish(batch, 'completed')
+        delay = batch.commands[index].get('delay_ms', 0) / 1000
+        batch.timer = self.wheel.schedule(delay, lambda: self._pool.submit(self._run_step, batch, index))
+
+    def _run_step(self, batch: Batch, index: int) -> None:
+        if self._cancelled(batch):
+            return self._finish(batch, 'cancelled')
+        command = batch.commands[index]['command']
+        baseline = self.capture() if batch.wait_for_completion else None
+        result = self.inject(command)
+        self.stats['commands'] += 1
+        if result.get('success') and batch.wait_for_completion:
+            started = time.monotonic()
+            self.wheel.schedule(BATCH_POLL, lambda: self._pool.submit(
+                self._check_completion, batch, index, result, baseline, started, baseline, started))
+        else:
+            self._step_done(batch, index, result)
+
+    def _check_completion(self, batch: Batch, index: int, result: Dict[str, Any], baseline: Optional[str],
+                          started: float, last_output: Optional[str], last_change: float) -> None:
+        """Done once the output has moved on from the baseline and the rules say Claude stopped"""
+        now = time.monotonic()
+        output = self.capture()
+        if output != last_output:
+            last_output, last_change = output, now
+        state = None
+        if output is not None and output != baseline:
+            state = self.rules.decide(output)['state']
+        if state in FINISHED_STATES or (state and now - last_change >= BATCH_IDLE):
+            result = {**result, 'completion': state}
+            if state == 'error':
+                result['success'] = False
+            return self._step_done(batch, index, result)
+        if now - started >= BATCH_STEP_TIMEOUT:
+            return self._step_done(batch, index, {**result, 'success': False, 'completion': 'timeout'})
+        if self._cancelled(batch):
+            return self._step_done(batch, index, {**result, 'completion': 'cancelled'})
+        self.wheel.schedule(BATCH_POLL, lambda: self._pool.submit(
+            self._check_completion, batch, index, result, baseline, started, last_output, last_change))
+
+    def _step_done(self, batch: Batch, index: int, result: Dict[str, Any]) -> None:
+        batch.results.append(result)
+        batch.events.put({'type': 'result', 'batch_id': batch.id, 'index': index,
+                          'command': batch.commands[index]['command'], **result})
+        with self._batches.edit(batch.id) as record:
+            record['results'].append(result)
+        if batch.fail_fast and not result.get('success'):
+            return self._finish(batch, 'failed')
+        self._schedule(batch, index + 1)
+
+    def _finish(self, batch: Batch, status: str) -> None:
+        with self._lock:
+            if batch.status != 'running':
+                return
+            batch.status = status
+            self._running.pop(batch.id, None)
+        with self._batches.edit(batch.id) as record:
+            record['status'] = status
+            record['finished'] = time.time()
+        batch.events.put({'type': 'done', 'batch_id': batch.id, 'status': status, 'completed': len(batch.results),
+                          'total': len(batch.commands)})
+        batch.done.set()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - BATCH_RETENTION
+        for batch_id, record in self._batches.to_dict().items():
+            if record.get('finished', time.time()) < cutoff:
+                try:
+                    del self._batches[batch_id]
+                except KeyError:
+                    pass
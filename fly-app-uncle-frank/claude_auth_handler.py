@@ -9,16 +9,18 @@ import subprocess
 import json
 import re
 import time
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from flask import request, jsonify
 import threading
 import uuid
+from app_factory import create_app, run_app, DEFAULT_CORS_METHODS
+from tmux_channel import tmux
+from local_services import health_cache
+from shared_state import get_shared_state
 
-app = Flask(__name__)
-CORS(app, origins="*", allow_headers=["Content-Type"], methods=["GET", "POST", "OPTIONS"])
+app = create_app(__name__, cors_methods=DEFAULT_CORS_METHODS)
 
-# Store active auth sessions
-auth_sessions = {}
+# Store active auth sessions (shared by every worker process)
+auth_sessions = get_shared_state().dict('auth-sessions')
 
 @app.route('/claude/auth/start', methods=['POST', 'OPTIONS'])
 def start_auth():
@@ -35,34 +37,19 @@ def start_auth():
         def run_auth():
             try:
                 # Kill any existing auth tmux session
-                subprocess.run(
-                    ['sudo', '-u', 'claude-user', 'tmux', 'kill-session', '-t', tmux_session],
-                    capture_output=True,
-                    timeout=10
-                )
+                tmux('kill-session', '-t', tmux_session, timeout=10)
             except:
                 pass  # Session might not exist
             
             try:
                 # Create new tmux session for auth
-                subprocess.run(
-                    ['sudo', '-u', 'claude-user', 'tmux', 'new-session', '-d', '-s', tmux_session,
-                     'claude auth login'],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
+                tmux('new-session', '-d', '-s', tmux_session, 'claude auth login', timeout=30)
                 
                 # Wait for output to appear
                 time.sleep(3)
                 
                 # Capture output from tmux session
-                result = subprocess.run(
-                    ['sudo', '-u', 'claude-user', 'tmux', 'capture-pane', '-t', tmux_session, '-p'],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
+                result = tmux('capture-pane', '-t', tmux_session, '-p', timeout=30)
                 
                 output = result.stdout
                 
@@ -155,12 +142,7 @@ def check_auth_status(session_id):
     # If there's a tmux session, check its output for updates
     if 'tmux_session' in session:
         try:
-            result = subprocess.run(
-                ['sudo', '-u', 'claude-user', 'tmux', 'capture-pane', '-t', session['tmux_session'], '-p'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            result = tmux('capture-pane', '-t', session['tmux_session'], '-p', timeout=30)
             
             output = result.stdout
             session['latest_output'] = output
@@ -171,11 +153,7 @@ def check_auth_status(session_id):
                 
                 # Clean up tmux session
                 try:
-                    subprocess.run(
-                        ['sudo', '-u', 'claude-user', 'tmux', 'kill-session', '-t', session['tmux_session']],
-                        capture_output=True,
-                        timeout=10
-                    )
+                    tmux('kill-session', '-t', session['tmux_session'], timeout=10)
                 except:
                     pass
         except:
@@ -199,23 +177,15 @@ def check_auth_status(session_id):
     except:
         session['authenticated'] = False
     
+    auth_sessions[session_id] = session
     return jsonify(session)
 
-@app.route('/claude/auth/verify', methods=['GET', 'OPTIONS'])
-def verify_auth():
-    """Verify current Claude authentication"""
-    if request.method == 'OPTIONS':
-        return '', 204
-    
+def claude_session_status():
+    """Whether a Claude CLI session is running in tmux (the verify result)"""
     # First check if Claude tmux session is running
     try:
         # Check for any tmux sessions
-        list_result = subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'list-sessions'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        list_result = tmux('list-sessions', timeout=5)
         
         # Look for claude-code session or any claude-auth session
         if list_result.returncode == 0 and list_result.stdout:
@@ -229,12 +199,7 @@ def verify_auth():
             if session_name:
                 try:
                     # Capture current state with shorter timeout
-                    capture_result = subprocess.run(
-                        ['sudo', '-u', 'claude-user', 'tmux', 'capture-pane', '-t', session_name, '-p'],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
+                    capture_result = tmux('capture-pane', '-t', session_name, '-p', timeout=5)
                     
                     output = capture_result.stdout.lower()
                     
@@ -251,13 +216,13 @@ def verify_auth():
                     
                     if any(indicator in output for indicator in claude_indicators):
                         # Claude is running
-                        return jsonify({
+                        return {
                             'authenticated': True,
                             'user': 'claude-user',
                             'method': 'tmux_session_active',
                             'session': session_name,
                             'output': 'Claude CLI is running in tmux session'
-                        })
+                        }
                 except Exception as e:
                     # Log but don't fail
                     pass
@@ -267,11 +232,19 @@ def verify_auth():
     
     # Don't try auth status check if Claude might be running interactively
     # It will timeout because Claude can't respond while in interactive mode
-    return jsonify({
+    return {
         'authenticated': False,
         'method': 'no_tmux_session',
         'message': 'No active Claude session found. Please authenticate.'
-    })
+    }
+
+@app.route('/claude/auth/verify', methods=['GET', 'OPTIONS'])
+def verify_auth():
+    """Verify current Claude authentication"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    return jsonify(health_cache.get('claude-session', claude_session_status))
 
 @app.route('/claude/auth/logout', methods=['POST', 'OPTIONS'])
 def logout():
@@ -373,25 +346,15 @@ def debug_claude():
     
     # Check tmux sessions
     try:
-        tmux_result = subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'list-sessions'],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        tmux_result = tmux('list-sessions', timeout=10)
         debug_info['tmux_sessions'] = tmux_result.stdout or 'No sessions'
     except Exception as e:
         debug_info['tmux_sessions'] = f'Error or no sessions: {str(e)}'
     
     return jsonify(debug_info)
 
-@app.route('/health', methods=['GET', 'OPTIONS'])
-def health():
-    """Health check with Claude status"""
-    if request.method == 'OPTIONS':
-        return '', 204
-    
-    # Check Claude authentication
+def cli_authenticated():
+    """Whether `claude auth status` reports a login"""
     try:
         result = subprocess.run(
             ['sudo', '-u', 'claude-user', 'claude', 'auth', 'status'],
@@ -399,9 +362,18 @@ def health():
             text=True,
             timeout=30
         )
-        claude_authenticated = 'Authenticated' in result.stdout or 'logged in' in result.stdout.lower()
+        return 'Authenticated' in result.stdout or 'logged in' in result.stdout.lower()
     except:
-        claude_authenticated = False
+        return False
+
+@app.route('/health', methods=['GET', 'OPTIONS'])
+def health():
+    """Health check with Claude status"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    # Check Claude authentication (the CLI takes seconds to start, so results are shared briefly)
+    claude_authenticated = health_cache.get('claude-auth-status', cli_authenticated)
     
     return jsonify({
         'status': 'healthy',
@@ -410,5 +382,4 @@ def health():
     })
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 8083))
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    run_app(app, 8083)
\ No newline at end of file
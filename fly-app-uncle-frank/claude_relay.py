@@ -4,14 +4,18 @@ Simple Claude Relay System - MVP
 Relays messages from user through pilot to executor
 """
 
-import subprocess
+import os
 import time
 import re
-from flask import Flask, request, jsonify, Response
-from flask_cors import CORS
+from functools import lru_cache
+from flask import request, jsonify, Response
+from app_factory import create_app, run_app, DEFAULT_CORS_METHODS
+from tmux_channel import tmux, send_text
+from local_services import health_cache
 
-app = Flask(__name__)
-CORS(app, origins="*", allow_headers=["Content-Type"], methods=["GET", "POST", "OPTIONS"])
+app = create_app(__name__, cors_methods=DEFAULT_CORS_METHODS)
+
+TEST_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'relay_test.html')
 
 # Noderr principles for the pilot to enforce
 PILOT_PROMPT = """You are a Claude Pilot that reformats user requests for another Claude instance.
@@ -35,19 +39,11 @@ def send_to_tmux(session_name, message):
     """Send a message to a tmux session and wait for response"""
     try:
         # Clear any existing input
-        subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', session_name, 'C-c'],
-            capture_output=True,
-            timeout=2
-        )
+        tmux('send-keys', '-t', session_name, 'C-c', timeout=2)
         time.sleep(0.5)
         
         # Send the message
-        subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', session_name, message, 'C-m'],
-            capture_output=True,
-            timeout=5
-        )
+        send_text(session_name, message, timeout=5)
         
         # Wait for response (Claude takes 3-15 seconds typically)
         response = ""
@@ -55,12 +51,7 @@ def send_to_tmux(session_name, message):
             time.sleep(1)
             
             # Capture output
-            result = subprocess.run(
-                ['sudo', '-u', 'claude-user', 'tmux', 'capture-pane', '-t', session_name, '-p'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
+            result = tmux('capture-pane', '-t', session_name, '-p', timeout=5)
             
             output = result.stdout
             
@@ -133,32 +124,21 @@ def relay_message():
             'error': str(e)
         }), 500
 
+def session_running(session_name):
+    """Whether a tmux session exists"""
+    try:
+        return tmux('has-session', '-t', session_name).returncode == 0
+    except Exception:
+        return False
+
 @app.route('/health', methods=['GET', 'OPTIONS'])
 def health():
     """Check if both Claude sessions are running"""
     if request.method == 'OPTIONS':
         return '', 204
     
-    pilot_running = False
-    executor_running = False
-    
-    try:
-        result = subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'has-session', '-t', 'claude-pilot'],
-            capture_output=True
-        )
-        pilot_running = (result.returncode == 0)
-    except:
-        pass
-    
-    try:
-        result = subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'has-session', '-t', 'claude-executor'],
-            capture_output=True
-        )
-        executor_running = (result.returncode == 0)
-    except:
-        pass
+    pilot_running = health_cache.get('tmux:claude-pilot', lambda: session_running('claude-pilot'))
+    executor_running = health_cache.get('tmux:claude-executor', lambda: session_running('claude-executor'))
     
     return jsonify({
         'status': 'healthy',
@@ -167,183 +147,16 @@ def health():
         'ready': pilot_running and executor_running
     })
 
+@lru_cache(maxsize=1)
+def load_test_page() -> str:
+    """Read the test page once, on its first request rather than at import"""
+    with open(TEST_PAGE, encoding='utf-8') as f:
+        return f.read()
+
 @app.route('/test', methods=['GET'])
 def serve_test_page():
     """Serve the test HTML page"""
-    html = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Claude Relay Test - MVP</title>
-    <style>
-        body {
-            font-family: 'Monaco', 'Courier New', monospace;
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-            background: #1e1e1e;
-            color: #d4d4d4;
-        }
-        h1 { color: #569cd6; }
-        .container {
-            display: grid;
-            grid-template-columns: 1fr 1fr 1fr;
-            gap: 20px;
-            margin-top: 20px;
-        }
-        .panel {
-            background: #2d2d30;
-            border: 1px solid #3e3e42;
-            padding: 15px;
-            border-radius: 5px;
-        }
-        .panel h2 {
-            color: #4ec9b0;
-            margin-top: 0;
-            font-size: 14px;
-            text-transform: uppercase;
-        }
-        input, textarea {
-            width: 100%;
-            padding: 10px;
-            background: #1e1e1e;
-            border: 1px solid #3e3e42;
-            color: #d4d4d4;
-            font-family: inherit;
-            border-radius: 3px;
-            box-sizing: border-box;
-        }
-        button {
-            background: #007acc;
-            color: white;
-            border: none;
-            padding: 10px 20px;
-            cursor: pointer;
-            font-family: inherit;
-            border-radius: 3px;
-            margin-top: 10px;
-        }
-        button:hover { background: #005a9e; }
-        button:disabled { background: #3e3e42; cursor: not-allowed; }
-        .status {
-            padding: 5px 10px;
-            border-radius: 3px;
-            margin-bottom: 10px;
-            font-size: 12px;
-        }
-        .status.ready { background: #0e5a0e; color: #4ec9b0; }
-        .status.processing { background: #5a4b0e; color: #dcdcaa; }
-        .status.error { background: #5a0e0e; color: #f48771; }
-        .content {
-            background: #1e1e1e;
-            padding: 10px;
-            border-radius: 3px;
-            min-height: 200px;
-            white-space: pre-wrap;
-            word-wrap: break-word;
-            font-size: 13px;
-            line-height: 1.5;
-        }
-        .loading { color: #569cd6; animation: pulse 1s infinite; }
-        @keyframes pulse { 0%, 100% { opacity: 1; } 50% { opacity: 0.5; } }
-    </style>
-</head>
-<body>
-    <h1>🚀 Claude Relay System - MVP</h1>
-    <div class="panel">
-        <div id="status" class="status">Checking system status...</div>
-        <input type="text" id="message" placeholder="Enter your message for Claude..." autofocus>
-        <button id="sendBtn" onclick="sendMessage()">Send Message</button>
-    </div>
-    <div class="container">
-        <div class="panel">
-            <h2>1. User Message</h2>
-            <div id="userMessage" class="content">Your message will appear here...</div>
-        </div>
-        <div class="panel">
-            <h2>2. Pilot Reformatted</h2>
-            <div id="pilotMessage" class="content">Pilot will reformat with Noderr principles...</div>
-        </div>
-        <div class="panel">
-            <h2>3. Executor Response</h2>
-            <div id="executorResponse" class="content">Executor's response will appear here...</div>
-        </div>
-    </div>
-    <script>
-        const API_BASE = window.location.origin;
-        checkStatus();
-        setInterval(checkStatus, 10000);
-
-        async function checkStatus() {
-            try {
-                const response = await fetch(`${API_BASE}/health`);
-                const data = await response.json();
-                if (data.ready) {
-                    updateStatus('ready', 'System Ready - Both Claudes Running');
-                } else {
-                    updateStatus('error', `Pilot: ${data.pilot_running ? '✓' : '✗'} | Executor: ${data.executor_running ? '✓' : '✗'}`);
-                }
-            } catch (error) {
-                updateStatus('error', 'Cannot connect to server');
-            }
-        }
-
-        function updateStatus(type, message) {
-            const status = document.getElementById('status');
-            status.className = `status ${type}`;
-            status.textContent = message;
-            document.getElementById('sendBtn').disabled = (type === 'error');
-        }
-
-        async function sendMessage() {
-            const messageInput = document.getElementById('message');
-            const message = messageInput.value.trim();
-            if (!message) return;
-            
-            document.getElementById('userMessage').textContent = message;
-            document.getElementById('pilotMessage').innerHTML = '<span class="loading">Pilot is reformatting...</span>';
-            document.getElementById('executorResponse').innerHTML = '<span class="loading">Waiting for executor...</span>';
-            
-            updateStatus('processing', 'Processing...');
-            document.getElementById('sendBtn').disabled = true;
-            
-            try {
-                const response = await fetch(`${API_BASE}/relay`, {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message })
-                });
-                
-                const data = await response.json();
-                if (data.success) {
-                    document.getElementById('pilotMessage').textContent = data.pilot_reformatted || 'No reformatting needed';
-                    document.getElementById('executorResponse').textContent = data.executor_response || 'No response yet';
-                } else {
-                    throw new Error(data.error || 'Unknown error');
-                }
-                updateStatus('ready', 'Ready for next message');
-            } catch (error) {
-                document.getElementById('pilotMessage').textContent = 'Error: ' + error.message;
-                document.getElementById('executorResponse').textContent = 'Failed to process message';
-                updateStatus('error', 'Error: ' + error.message);
-            }
-            
-            document.getElementById('sendBtn').disabled = false;
-            messageInput.value = '';
-            messageInput.focus();
-        }
-
-        document.getElementById('message').addEventListener('keypress', (e) => {
-            if (e.key === 'Enter' && !document.getElementById('sendBtn').disabled) {
-                sendMessage();
-            }
-        });
-    </script>
-</body>
-</html>'''
-    return Response(html, mimetype='text/html')
+    return Response(load_test_page(), mimetype='text/html')
 
 if __name__ == '__main__':
-    port = 8084
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    run_app(app, 8084)
\ No newline at end of file
@@ -1,47 +1,213 @@
 #!/usr/bin/env python3
 """
 Simplified Completion Monitor for Noderr
-Monitors Claude output changes and notifies CF Worker to orchestrate next steps
+Monitors Claude output changes and notifies CF Worker to orchestrate next steps.
+One asyncio process watches every matching tmux session, each with its own
+transcript, decisions and polling backoff.
 """
 
 import os
+import re
+import asyncio
 import subprocess
 import time
 import requests
 import json
 import hashlib
+from collections import deque
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from webhook_spool import WebhookSpool
+from tmux_channel import send_text
+from completion_rules import RuleEngine
 
 # Configuration
 CF_WORKER_URL = os.environ.get('CF_WORKER_URL', 'https://noderr-orchestrator.bhumanai.workers.dev')
 SESSION_NAME = os.environ.get('SESSION_NAME', 'claude-code')
+SESSION_PATTERN = os.environ.get('SESSION_PATTERN', '^claude')  # tmux sessions to watch (claude-code, claude-pilot, ...)
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', '32'))
+MAX_CONCURRENT_CAPTURES = int(os.environ.get('MAX_CONCURRENT_CAPTURES', '4'))  # capture-pane processes in flight
+DISCOVERY_INTERVAL = float(os.environ.get('DISCOVERY_INTERVAL', '5'))  # seconds between tmux session scans
 CHECK_INTERVAL = int(os.environ.get('CHECK_INTERVAL', '30'))  # seconds
 NOTIFY_THRESHOLD = int(os.environ.get('NOTIFY_THRESHOLD', '500'))  # chars change
+# Adaptive polling: fast while output is changing, exponential backoff while idle
+MIN_INTERVAL = float(os.environ.get('MIN_INTERVAL', '0.5'))  # seconds, used right after a change
+MAX_INTERVAL = float(os.environ.get('MAX_INTERVAL', str(CHECK_INTERVAL)))  # worst-case latency to see a change
+BACKOFF_FACTOR = float(os.environ.get('BACKOFF_FACTOR', '1.5'))
+RATE_WINDOW = 60  # seconds of history for the effective polling rate
+HISTORY_CHARS = int(os.environ.get('HISTORY_CHARS', '65536'))  # transcript tail kept for resends
+INJECT_SETTLE = float(os.environ.get('INJECT_SETTLE', '15'))  # seconds to wait for Claude to pick up a local injection
+
+class AdaptivePoller:
+    """Chooses the next poll interval from whether the last poll saw new output"""
+    
+    def __init__(self, min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL,
+                 factor: float = BACKOFF_FACTOR):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.factor = factor
+        self.interval = self.min_interval
+        self.polls = deque()
+    
+    def next_interval(self, changed: bool) -> float:
+        """Reset to the fast rate on change, otherwise back off up to the latency cap"""
+        now = time.time()
+        self.polls.append(now)
+        while self.polls and now - self.polls[0] > RATE_WINDOW:
+            self.polls.popleft()
+        
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.max_interval)
+        return self.interval
+    
+    def polls_per_minute(self) -> float:
+        """Effective polling rate over the last RATE_WINDOW seconds"""
+        return len(self.polls) * 60.0 / RATE_WINDOW
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'poll_interval': round(self.interval, 2),
+            'polls_per_minute': round(self.polls_per_minute(), 1)
+        }
+
+class OutputTracker:
+    """Turns successive pane captures into one append-only transcript with char offsets
+    
+    Each capture is aligned against the previous one; lines that scrolled off are
+    kept, the new tail is appended. If the TUI redrew lines we already reported,
+    the delta starts at an earlier offset and the receiver truncates to from_offset
+    before appending.
+    """
+    
+    def __init__(self, history_chars: int = HISTORY_CHARS):
+        self.history_chars = history_chars
+        self.window: List[str] = []
+        self.window_start = 0  # transcript offset of window[0]
+        self.end_offset = 0
+        self.history = ""  # transcript tail, starting at history_start
+        self.history_start = 0
+        self.pending_from: Optional[int] = None  # lowest offset changed since the last send
+        self.reset_pending = False
+        self.seq = 0
+    
+    @staticmethod
+    def _chars(lines: List[str]) -> int:
+        return sum(len(line) + 1 for line in lines)
+    
+    @staticmethod
+    def _align(old: List[str], new: List[str]) -> Tuple[int, int]:
+        """Find (k, m) with old[k:k+m] == new[:m], preferring a match that runs to the end of old"""
+        best = (len(old), 0)
+        for k in range(len(old)):
+            m = 0
+            while k + m < len(old) and m < len(new) and old[k + m] == new[m]:
+                m += 1
+            if m and k + m == len(old):
+                return k, m
+            if m > best[1]:
+                best = (k, m)
+        return best
+    
+    def update(self, output: str) -> bool:
+        """Fold a new capture into the transcript; returns True if anything changed"""
+        lines = output.rstrip('\n').split('\n')
+        while lines and not lines[-1].strip():
+            lines.pop()
+        if lines == self.window:
+            return False
+        
+        reset = False
+        if self.window:
+            k, m = self._align(self.window, lines)
+            if m == 0:
+                # Nothing in common (cleared screen, restarted session): append the whole capture
+                k, m, reset = len(self.window), 0, True
+            from_offset = self.window_start + self._chars(self.window[:k + m])
+            self.window_start += self._chars(self.window[:k])
+        else:
+            m, from_offset = 0, self.end_offset
+            self.window_start = self.end_offset
+        
+        delta = ''.join(line + '\n' for line in lines[m:])
+        self.window = lines
+        self.end_offset = from_offset + len(delta)
+        
+        # Rewind history to from_offset, append, and keep only the tail
+        keep = max(0, from_offset - self.history_start)
+        self.history = self.history[:keep] + delta
+        if len(self.history) > self.history_chars:
+            trim = len(self.history) - self.history_chars
+            self.history = self.history[trim:]
+            self.history_start += trim
+        
+        self.pending_from = from_offset if self.pending_from is None else min(self.pending_from, from_offset)
+        self.reset_pending = self.reset_pending or reset
+        return True
+    
+    def delta_since(self, offset: Optional[int] = None) -> Dict[str, Any]:
+        """Delta covering everything from offset (default: pending changes) to the end"""
+        offset = self.pending_from if offset is None else offset
+        offset = self.end_offset if offset is None else offset
+        reset = self.reset_pending
+        if offset < self.history_start:
+            # Older than what we retain: resend the retained tail and flag it
+            offset, reset = self.history_start, True
+        return {
+            'from_offset': offset,
+            'to_offset': self.end_offset,
+            'delta': self.history[offset - self.history_start:],
+            'reset': reset
+        }
+    
+    def text_since(self, offset: int) -> str:
+        """Retained transcript from offset to the end"""
+        return self.history[max(0, offset - self.history_start):]
+    
+    def mark_sent(self, to_offset: int) -> None:
+        self.seq += 1
+        self.reset_pending = False
+        self.pending_from = None if to_offset >= self.end_offset else to_offset
+
+def capture_args(session: str) -> List[str]:
+    """tmux arguments for the last 200 lines of a session's pane"""
+    return ['capture-pane', '-t', session, '-p', '-S', '-200']
 
 class CompletionMonitor:
-    def __init__(self):
+    """Output tracking, local decisions and notifications for one tmux session"""
+    
+    def __init__(self, session: str = SESSION_NAME, spool: Optional[WebhookSpool] = None,
+                 rules: Optional[RuleEngine] = None, owner: Optional[List[str]] = None):
+        self.session = session
+        self.owner = owner  # command prefix for the tmux server the session lives on, if known
         self.last_output = ""
         self.last_output_hash = ""
         self.monitoring = True
         self.last_notification = time.time()
+        self.last_seen_hash = ""
+        self.poller = AdaptivePoller()
+        self.tracker = OutputTracker()
+        self.resend_from: Optional[int] = None
+        self.spool = spool or WebhookSpool(f"{CF_WORKER_URL}/api/webhook", on_response=self.handle_response)
+        self.rules = rules or RuleEngine()
+        self.decision: Optional[Dict[str, Any]] = None
+        self.decision_pending = False
+        self.action_offset = 0  # rules only see output after our last local injection
+        self.injected_at: Optional[float] = None
         
     def get_claude_output(self) -> Optional[str]:
         """Get current output from Claude tmux session"""
         try:
             # Try claude-user first
-            result = subprocess.run([
-                'sudo', '-u', 'claude-user', 'tmux', 'capture-pane',
-                '-t', SESSION_NAME, '-p', '-S', '-200'  # Last 200 lines
-            ], capture_output=True, text=True)
+            result = subprocess.run(['sudo', '-u', 'claude-user', 'tmux'] + capture_args(self.session),
+                                    capture_output=True, text=True)
             
             if result.returncode == 0:
                 return result.stdout
                 
             # Fallback to root
-            result = subprocess.run([
-                'tmux', 'capture-pane', '-t', SESSION_NAME, '-p', '-S', '-200'
-            ], capture_output=True, text=True)
+            result = subprocess.run(['tmux'] + capture_args(self.session), capture_output=True, text=True)
             
             if result.returncode == 0:
                 return result.stdout
@@ -73,70 +239,280 @@ class CompletionMonitor:
         
         return True
     
+    def decide(self) -> Dict[str, Any]:
+        """Classify the transcript tail with the local rules"""
+        decision = self.rules.decide(self.tracker.text_since(self.action_offset))
+        if self.injected_at is not None:
+            if decision['state'] == 'working' or time.time() - self.injected_at > INJECT_SETTLE:
+                self.injected_at = None
+            else:
+                # Claude hasn't started on the injected command yet, so the screen is stale
+                return {**decision, 'action': 'wait'}
+        return decision
+    
+    def inject_command(self, command: str) -> bool:
+        """Type a command into the Claude session directly, without the orchestrator"""
+        prefixes = [self.owner] if self.owner is not None else (['sudo', '-u', 'claude-user'], [])
+        for prefix in prefixes:
+            try:
+                # Pasted rather than typed when long or multi-line, like the agent's injections
+                result = send_text(self.session, command, run_as=prefix[-1] if prefix else '')
+                if result.returncode == 0:
+                    return True
+            except Exception as e:
+                print(f"Error injecting command: {e}")
+        return False
+    
+    def handle_decision(self, decision: Dict[str, Any]) -> None:
+        """Act on confident decisions locally; everything else waits for notify_orchestrator"""
+        previous = self.decision
+        self.decision = decision
+        if previous and decision['rule'] and decision['rule'] == previous['rule'] and not self.decision_pending:
+            # Same state redrawn (cursor, resize): it was already handled
+            return
+        self.decision_pending = decision['action'] != 'wait'
+        if decision['action'] == 'inject':
+            if self.inject_command(decision['command']):
+                self.action_offset = self.tracker.end_offset
+                self.injected_at = time.time()
+                print(f"⚡ [{self.session}] {decision['rule']}: injected next command locally")
+            else:
+                self.decision = {**decision, 'action': 'escalate', 'error': 'local injection failed'}
+        elif decision['state'] != 'ambiguous' and self.decision_pending:
+            print(f"🧭 [{self.session}] {decision['rule']}: {decision['state']} ({decision['action']})")
+    
+    def wants_notify(self, output: str) -> bool:
+        if self.resend_from is not None:
+            return True
+        if not self.decision_pending:
+            return False
+        if self.decision['state'] == 'ambiguous':
+            return self.should_notify(output)
+        return True
+    
     def notify_orchestrator(self, output: str) -> bool:
-        """Notify CF Worker to analyze and orchestrate"""
+        """Queue a notification with only the output appended since the last one
+        
+        Delivery (batching, retry, ordering) is handled by the spool, so once an
+        event is queued its range counts as sent. The local decision travels with
+        it; the orchestrator only runs its own analysis when action is escalate.
+        """
         try:
-            # Send last 3000 chars of output for analysis
-            payload = {
-                "event": "output_change",
+            delta = self.tracker.delta_since(self.resend_from)
+            self.spool.append({
+                "event": "output_delta",
+                "session": self.session,
+                "seq": self.tracker.seq + 1,
+                **delta,
                 "timestamp": datetime.now().isoformat(),
-                "output_sample": output[-3000:] if output else "",
-                "output_length": len(output) if output else 0,
-                "source": "completion_monitor"
-            }
-            
-            response = requests.post(
-                f"{CF_WORKER_URL}/api/webhook",
-                json=payload,
-                timeout=10
-            )
-            
-            if response.ok:
-                result = response.json()
-                print(f"✅ Orchestrator notified: {result.get('status', 'ok')}")
-                self.last_notification = time.time()
-                return True
-            else:
-                print(f"❌ Orchestrator returned {response.status_code}")
-                return False
-                
+                "source": "completion_monitor",
+                "decision": self.decision,
+                "monitor": self.poller.metrics()
+            })
+            self.tracker.mark_sent(delta['to_offset'])
+            self.resend_from = None
+            self.decision_pending = False
+            self.last_notification = time.time()
+            print(f"📨 [{self.session}] Queued output [{delta['from_offset']}-{delta['to_offset']}] "
+                  f"({self.spool.pending()} pending)")
+            return True
         except Exception as e:
-            print(f"❌ Failed to notify orchestrator: {e}")
+            print(f"❌ [{self.session}] Failed to queue notification: {e}")
             return False
     
+    def handle_response(self, result: Dict[str, Any]) -> None:
+        """Called by the spool after a batch is accepted"""
+        print(f"✅ Orchestrator notified: {result.get('status', 'ok')}")
+        # The receiver saw a gap in our offsets and asks for everything since its cursor
+        resend = (result.get('resend') or {}).get(self.session)
+        if resend is not None:
+            self.resend_from = resend
+    
+    def process(self, output: str) -> bool:
+        """Fold one capture into this session's state and notify if needed; returns whether it changed"""
+        output_hash = hashlib.sha256(output.encode()).hexdigest()
+        changed = output_hash != self.last_seen_hash
+        self.last_seen_hash = output_hash
+        if changed and self.tracker.update(output):
+            self.handle_decision(self.decide())
+        
+        if self.wants_notify(output):
+            print(f"\n📊 [{self.session}] Output change detected (+{abs(len(output) - len(self.last_output))} chars)")
+            
+            # Send the delta; the orchestrator analyzes it only if we couldn't decide
+            self.notify_orchestrator(output)
+            
+            # Update tracking
+            self.last_output = output
+            self.last_output_hash = output_hash
+        return changed
+    
     def run(self):
-        """Main monitoring loop"""
+        """Single-session monitoring loop"""
         print(f"🔍 Noderr Completion Monitor Started (Simplified)")
         print(f"   CF Worker: {CF_WORKER_URL}")
-        print(f"   Session: {SESSION_NAME}")
-        print(f"   Check interval: {CHECK_INTERVAL}s")
+        print(f"   Session: {self.session}")
+        print(f"   Poll interval: {MIN_INTERVAL}s-{MAX_INTERVAL}s (x{BACKOFF_FACTOR} backoff when idle)")
         print(f"   Notify threshold: {NOTIFY_THRESHOLD} chars")
+        print(f"   Spool: {self.spool.path} ({self.spool.pending()} pending)")
+        print(f"   Rules: {self.rules.path} ({len(self.rules.rules)} rules)")
         print("-" * 50)
         
+        self.spool.start()
+        last_report = time.time()
+        
         while self.monitoring:
+            changed = False
             try:
                 # Get current output
                 output = self.get_claude_output()
-                
-                if output and self.should_notify(output):
-                    print(f"\n📊 Output change detected (+{abs(len(output) - len(self.last_output))} chars)")
-                    
-                    # Notify orchestrator to analyze and decide
-                    if self.notify_orchestrator(output):
-                        print(f"   Orchestrator will analyze and determine next action")
-                    
-                    # Update tracking
-                    self.last_output = output
-                    self.last_output_hash = hashlib.sha256(output.encode()).hexdigest()
+                if output:
+                    changed = self.process(output)
                 
             except KeyboardInterrupt:
                 print("\n⏹️ Monitoring stopped by user")
                 break
             except Exception as e:
                 print(f"❌ Monitor error: {e}")
-                
-            time.sleep(CHECK_INTERVAL)
+            
+            interval = self.poller.next_interval(changed)
+            if time.time() - last_report >= RATE_WINDOW:
+                metrics = self.poller.metrics()
+                print(f"⏱️ Polling every {metrics['poll_interval']}s ({metrics['polls_per_minute']}/min), "
+                      f"{self.rules.stats['decisions']} decisions, {self.rules.stats['ambiguous']} ambiguous")
+                last_report = time.time()
+            
+            time.sleep(interval)
+
+class MultiSessionMonitor:
+    """Watches every tmux session matching SESSION_PATTERN from one event loop
+    
+    Sessions are discovered from tmux (claude-user's server first, then root's)
+    and get their own CompletionMonitor and polling task, so an idle session backs
+    off independently of a busy one. The webhook spool and rules are shared.
+    """
+    
+    def __init__(self, pattern: str = SESSION_PATTERN, max_sessions: int = MAX_SESSIONS,
+                 max_concurrent: int = MAX_CONCURRENT_CAPTURES):
+        self.pattern = re.compile(pattern)
+        self.max_sessions = max_sessions
+        self.max_concurrent = max_concurrent
+        self.spool = WebhookSpool(f"{CF_WORKER_URL}/api/webhook", on_response=self.handle_response)
+        self.rules = RuleEngine()
+        self.monitors: Dict[str, CompletionMonitor] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.owners: Dict[str, List[str]] = {}  # session -> command prefix for the tmux server it lives on
+        self.capture_slots: Optional[asyncio.Semaphore] = None
+    
+    async def tmux(self, prefix: List[str], *args: str) -> Optional[str]:
+        """Run tmux without blocking the loop; None on failure"""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *prefix, 'tmux', *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+            )
+        except OSError:
+            return None
+        stdout, _ = await proc.communicate()
+        return stdout.decode(errors='replace') if proc.returncode == 0 else None
+    
+    async def list_sessions(self) -> Dict[str, List[str]]:
+        """Matching session names mapped to the prefix that reaches them"""
+        found: Dict[str, List[str]] = {}
+        for prefix in ([], ['sudo', '-u', 'claude-user']):
+            listing = await self.tmux(prefix, 'list-sessions', '-F', '#{session_name}')
+            for name in (listing or '').split():
+                if self.pattern.search(name):
+                    found[name] = prefix  # claude-user's server wins on a name clash
+        return found
+    
+    async def discover(self) -> None:
+        """Start watchers for new sessions and stop those whose session is gone"""
+        found = await self.list_sessions()
+        for name in list(self.tasks):
+            if name not in found:
+                self.tasks.pop(name).cancel()
+                self.monitors.pop(name, None)
+                self.owners.pop(name, None)
+                print(f"➖ Session {name} gone, stopped watching")
+        for name, prefix in found.items():
+            self.owners[name] = prefix
+            if name in self.tasks:
+                self.monitors[name].owner = prefix
+                continue
+            if len(self.tasks) >= self.max_sessions:
+                print(f"⚠️ Not watching {name}: MAX_SESSIONS ({self.max_sessions}) reached")
+                continue
+            self.monitors[name] = CompletionMonitor(name, spool=self.spool, rules=self.rules, owner=prefix)
+            self.tasks[name] = asyncio.ensure_future(self.watch(self.monitors[name]))
+            print(f"➕ Watching session {name}")
+    
+    async def watch(self, monitor: CompletionMonitor) -> None:
+        """Poll one session with its own adaptive interval"""
+        loop = asyncio.get_running_loop()
+        while True:
+            changed = False
+            try:
+                async with self.capture_slots:
+                    output = await self.tmux(self.owners[monitor.session], *capture_args(monitor.session))
+                if output:
+                    # process() may inject a command (blocking tmux calls), so it runs off the loop
+                    changed = await loop.run_in_executor(None, monitor.process, output)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ [{monitor.session}] Monitor error: {e}")
+            await asyncio.sleep(monitor.poller.next_interval(changed))
+    
+    def handle_response(self, result: Dict[str, Any]) -> None:
+        """Called by the spool thread after a batch is accepted; routes resend requests per session"""
+        print(f"✅ Orchestrator notified: {result.get('status', 'ok')}")
+        for session, offset in (result.get('resend') or {}).items():
+            monitor = self.monitors.get(session)
+            if monitor and offset is not None:
+                monitor.resend_from = offset
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'sessions': {name: m.poller.metrics() for name, m in self.monitors.items()},
+            'polls_per_minute': round(sum(m.poller.polls_per_minute() for m in self.monitors.values()), 1),
+            'decisions': self.rules.stats['decisions'],
+            'ambiguous': self.rules.stats['ambiguous'],
+            'pending': self.spool.pending()
+        }
+    
+    async def run_async(self) -> None:
+        self.capture_slots = asyncio.Semaphore(self.max_concurrent)
+        self.spool.start()
+        last_report = time.time()
+        while True:
+            try:
+                await self.discover()
+            except Exception as e:
+                print(f"❌ Session discovery failed: {e}")
+            if time.time() - last_report >= RATE_WINDOW:
+                metrics = self.metrics()
+                print(f"⏱️ {len(self.monitors)} sessions, {metrics['polls_per_minute']} polls/min, "
+                      f"{metrics['decisions']} decisions, {metrics['ambiguous']} ambiguous, "
+                      f"{metrics['pending']} pending")
+                last_report = time.time()
+            await asyncio.sleep(DISCOVERY_INTERVAL)
+    
+    def run(self):
+        """Main monitoring loop"""
+        print(f"🔍 Noderr Completion Monitor Started (multi-session)")
+        print(f"   CF Worker: {CF_WORKER_URL}")
+        print(f"   Sessions: /{self.pattern.pattern}/ (max {self.max_sessions}, "
+              f"{self.max_concurrent} concurrent captures, rescan every {DISCOVERY_INTERVAL}s)")
+        print(f"   Poll interval: {MIN_INTERVAL}s-{MAX_INTERVAL}s per session (x{BACKOFF_FACTOR} backoff when idle)")
+        print(f"   Notify threshold: {NOTIFY_THRESHOLD} chars")
+        print(f"   Spool: {self.spool.path} ({self.spool.pending()} pending)")
+        print(f"   Rules: {self.rules.path} ({len(self.rules.rules)} rules)")
+        print("-" * 50)
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            print("\n⏹️ Monitoring stopped by user")
 
 if __name__ == "__main__":
-    monitor = CompletionMonitor()
+    monitor = MultiSessionMonitor()
     monitor.run()
\ No newline at end of file
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Local Completion Rules for Noderr
+Classifies the tail of Claude's output (working, prompt returned, loop stage
+completed, error, needs input) from declarative rules in a JSON file that is
+reloaded when it changes, so only ambiguous output goes to the orchestrator
+"""
+
+import os
+import re
+import json
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+COMPLETION_RULES = os.environ.get(
+    'COMPLETION_RULES',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'completion_rules.json')
+)
+RULES_RELOAD_INTERVAL = float(os.environ.get('RULES_RELOAD_INTERVAL', '2'))  # seconds between mtime checks
+
+STATES = ('working', 'prompt_returned', 'stage_completed', 'error', 'needs_input')
+ACTIONS = ('wait', 'inject', 'report', 'escalate')
+AMBIGUOUS = {'state': 'ambiguous', 'action': 'escalate', 'rule': None, 'stage': None}
+
+class Rule:
+    """One compiled rule: any `match` pattern hits, all `require` hit, no `unless` hits"""
+
+    def __init__(self, spec: Dict[str, Any], default_tail: int, flags: int):
+        self.name = spec['name']
+        self.state = spec['state']
+        self.action = spec.get('action', 'escalate')
+        self.stage = spec.get('stage')
+        self.command = spec.get('command')
+        self.tail_lines = int(spec.get('tail_lines', default_tail))
+        if self.state not in STATES:
+            raise ValueError(f"rule {self.name}: unknown state {self.state!r}")
+        if self.action not in ACTIONS:
+            raise ValueError(f"rule {self.name}: unknown action {self.action!r}")
+        if self.action == 'inject' and not self.command:
+            raise ValueError(f"rule {self.name}: inject needs a command")
+        self.match = [re.compile(p, flags) for p in spec.get('match', [])]
+        self.require = [re.compile(p, flags) for p in spec.get('require', [])]
+        self.unless = [re.compile(p, flags) for p in spec.get('unless', [])]
+        if not self.match and not self.require:
+            raise ValueError(f"rule {self.name}: needs match or require patterns")
+
+    def matches(self, text: str) -> bool:
+        if self.match and not any(p.search(text) for p in self.match):
+            return False
+        if not all(p.search(text) for p in self.require):
+            return False
+        return not any(p.search(text) for p in self.unless)
+
+    def decision(self) -> Dict[str, Any]:
+        decision = {'state': self.state, 'action': self.action, 'rule': self.name, 'stage': self.stage}
+        if self.command:
+            decision['command'] = self.command
+        return decision
+
+class RuleEngine:
+    """Ordered rule list; the first matching rule decides"""
+
+    def __init__(self, path: str = COMPLETION_RULES, reload_interval: float = RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.rules: List[Rule] = []
+        self.max_tail = 0
+        self.mtime: Optional[float] = None
+        self.last_check = 0.0
+        self.stats = {'decisions': 0, 'ambiguous': 0, 'reloads': 0, 'reload_errors': 0}
+        self.load()
+
+    def load(self) -> bool:
+        """(Re)compile the rules file; on any error the previous rules stay active"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path) as f:
+                config = json.load(f)
+            flags = re.MULTILINE | (re.IGNORECASE if config.get('ignore_case', True) else 0)
+            default_tail = int(config.get('tail_lines', 40))
+            rules = [Rule(spec, default_tail, flags) for spec in config.get('rules', [])]
+        except (OSError, ValueError, KeyError, TypeError, re.error) as e:
+            self.stats['reload_errors'] += 1
+            logger.error(f"Failed to load completion rules from {self.path}: {e}")
+            return False
+        self.rules = rules
+        self.max_tail = max((r.tail_lines for r in rules), default=0)
+        self.mtime = mtime
+        self.stats['reloads'] += 1
+        logger.info(f"Loaded {len(rules)} completion rules from {self.path}")
+        return True
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self.last_check < self.reload_interval:
+            return
+        self.last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime != self.mtime:
+            self.load()
+
+    def decide(self, text: str) -> Dict[str, Any]:
+        """Decision for the end of a transcript; unmatched output is ambiguous"""
+        self._maybe_reload()
+        self.stats['decisions'] += 1
+        # Rules only look at the last few lines, so never split more than that
+        lines = text.rstrip('\n').rsplit('\n', self.max_tail)
+        tails: Dict[int, str] = {}
+        for rule in self.rules:
+            tail = tails.get(rule.tail_lines)
+            if tail is None:
+                tail = tails[rule.tail_lines] = '\n'.join(lines[-rule.tail_lines:])
+            if rule.matches(tail):
+                return rule.decision()
+        self.stats['ambiguous'] += 1
+        return dict(AMBIGUOUS)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Incremental Claude Auth/Config Snapshots for Noderr
+Fingerprints Claude's auth and config files, copies only changed ones into a
+content-addressed store on /data, and restores from the latest complete snapshot
+"""
+
+import os
+import re
+import sys
+import json
+import pwd
+import time
+import fnmatch
+import hashlib
+import logging
+import signal
+import tempfile
+import subprocess
+import threading
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLAUDE_HOME = os.environ.get('CLAUDE_HOME', '/home/claude-user')
+CLAUDE_USER = os.environ.get('CLAUDE_USER', 'claude-user')
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '/data/claude-snapshots')
+SNAPSHOT_KEEP = int(os.environ.get('SNAPSHOT_KEEP', '10'))  # manifests retained; older objects are collected
+SNAPSHOT_DEBOUNCE = float(os.environ.get('SNAPSHOT_DEBOUNCE', '2'))  # seconds of quiet after a change
+SNAPSHOT_MIN_INTERVAL = float(os.environ.get('SNAPSHOT_MIN_INTERVAL', '10'))  # seconds between snapshots
+SNAPSHOT_POLL = float(os.environ.get('SNAPSHOT_POLL', '15'))  # stat scan interval without inotifywait
+SNAPSHOT_EXCLUDE = [p for p in os.environ.get('SNAPSHOT_EXCLUDE', '*.lock,*.tmp,*.swp').split(',') if p]
+# Session transcripts and per-turn state under ~/.claude: they change on every Claude turn,
+# so they are neither captured nor watched (only auth and config matter for a restore)
+SNAPSHOT_EXCLUDE_DIRS = [d for d in os.environ.get(
+    'SNAPSHOT_EXCLUDE_DIRS', 'projects,todos,statsig,shell-snapshots').split(',') if d]
+
+# (directory, top-level entries captured from it, key prefix inside the snapshot)
+SOURCES = [
+    (CLAUDE_HOME, ['.config', '.anthropic', '.claude*'], ''),
+    ('/root', ['.anthropic'], 'root/'),  # in case auth was done as root
+]
+
+def _excluded(name: str) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) for pattern in SNAPSHOT_EXCLUDE)
+
+def iter_files() -> Iterator[Tuple[str, str]]:
+    """(snapshot key, absolute path) for every regular file covered by SOURCES"""
+    for root, patterns, prefix in SOURCES:
+        try:
+            entries = sorted(os.listdir(root))
+        except OSError:
+            continue
+        for entry in entries:
+            if not any(fnmatch.fnmatch(entry, p) for p in patterns) or _excluded(entry):
+                continue
+            path = os.path.join(root, entry)
+            if os.path.islink(path):
+                continue
+            if os.path.isfile(path):
+                yield prefix + entry, path
+            elif os.path.isdir(path):
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames[:] = sorted(d for d in dirnames if not _excluded(d) and d not in SNAPSHOT_EXCLUDE_DIRS)
+                    for name in sorted(filenames):
+                        full = os.path.join(dirpath, name)
+                        if not _excluded(name) and os.path.isfile(full) and not os.path.islink(full):
+                            yield prefix + os.path.relpath(full, root), full
+
+def key_to_path(key: str) -> str:
+    """Where a snapshot key is restored to"""
+    for root, _, prefix in sorted(SOURCES, key=lambda s: -len(s[2])):
+        if key.startswith(prefix):
+            return os.path.join(root, key[len(prefix):])
+    raise ValueError(f"No source for {key}")
+
+def _write_atomic(path: str, data: bytes, mode: int = 0o600) -> None:
+    """Write via a temp file in the same directory and rename, so readers never see a partial file"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.snap-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+class SnapshotStore:
+    """Content-addressed objects plus one JSON manifest per snapshot"""
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+        self.objects = os.path.join(root, 'objects')
+        self.manifests = os.path.join(root, 'manifests')
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.manifests, exist_ok=True)
+        # key -> (size, mtime_ns, sha): unchanged files are never re-read
+        self._stat_cache: Dict[str, Tuple[int, int, str]] = {}
+
+    def _object_path(self, sha: str) -> str:
+        return os.path.join(self.objects, sha[:2], sha)
+
+    def _manifest_names(self) -> List[str]:
+        return sorted((n for n in os.listdir(self.manifests) if n.endswith('.json')), reverse=True)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """Newest manifest whose objects are all present"""
+        for name in self._manifest_names():
+            try:
+                with open(os.path.join(self.manifests, name)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if all(os.path.exists(self._object_path(e['sha'])) for e in manifest['files'].values()):
+                return manifest
+            logger.warning(f"Snapshot {name} is missing objects, trying an older one")
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Capture changed files; writes nothing when the content is unchanged"""
+        started = time.monotonic()
+        previous = self.latest()
+        before = previous['files'] if previous else {}
+        files: Dict[str, Dict[str, Any]] = {}
+        bytes_written = 0
+        changed: List[str] = []
+        for key, path in iter_files():
+            try:
+                st = os.stat(path)
+                cached = self._stat_cache.get(key)
+                if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+                    sha = cached[2]
+                else:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    sha = hashlib.sha256(data).hexdigest()
+                    target = self._object_path(sha)
+                    if not os.path.exists(target):
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        _write_atomic(target, data)
+                        bytes_written += len(data)
+                    self._stat_cache[key] = (st.st_size, st.st_mtime_ns, sha)
+            except OSError as e:
+                # Deleted or unreadable mid-scan; the next change event retries
+                logger.debug(f"Skipping {path}: {e}")
+                continue
+            files[key] = {'sha': sha, 'size': st.st_size, 'mode': st.st_mode & 0o777}
+            old = before.get(key)
+            if not old or (old['sha'], old['mode']) != (sha, files[key]['mode']):
+                changed.append(key)
+        removed = [key for key in before if key not in files]
+
+        result = {'changed': changed, 'removed': removed, 'files': len(files)}
+        if not changed and not removed and previous:
+            return {**result, 'seq': previous['seq'], 'bytes_written': 0,
+                    'duration_ms': round((time.monotonic() - started) * 1000, 1)}
+
+        seq = (previous['seq'] if previous else 0) + 1
+        manifest = json.dumps({'seq': seq, 'created': time.time(), 'files': files}, indent=1).encode()
+        _write_atomic(os.path.join(self.manifests, f"{seq:010d}.json"), manifest)
+        bytes_written += len(manifest)
+        self.prune()
+        return {**result, 'seq': seq, 'bytes_written': bytes_written,
+                'duration_ms': round((time.monotonic() - started) * 1000, 1)}
+
+    def prune(self) -> None:
+        """Drop manifests beyond SNAPSHOT_KEEP and objects no kept manifest references"""
+        names = self._manifest_names()
+        for name in names[SNAPSHOT_KEEP:]:
+            os.unlink(os.path.join(self.manifests, name))
+        referenced = set()
+        for name in names[:SNAPSHOT_KEEP]:
+            try:
+                with open(os.path.join(self.manifests, name)) as f:
+                    referenced.update(e['sha'] for e in json.load(f)['files'].values())
+            except (OSError, ValueError):
+                return  # never collect objects while a manifest can't be read
+        for dirpath, _, filenames in os.walk(self.objects):
+            for name in filenames:
+                if name not in referenced and not name.startswith('.snap-'):
+                    os.unlink(os.path.join(dirpath, name))
+
+    def restore(self) -> Dict[str, Any]:
+        """Write files from the latest consistent snapshot that differ from what is on disk"""
+        manifest = self.latest()
+        if not manifest:
+            return {'success': False, 'error': f"No snapshot in {self.root}"}
+        try:
+            owner = pwd.getpwnam(CLAUDE_USER)
+        except KeyError:
+            owner = None
+        restored, bytes_written = [], 0
+        for key, entry in manifest['files'].items():
+            path = key_to_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    if hashlib.sha256(f.read()).hexdigest() == entry['sha']:
+                        continue
+            except OSError:
+                pass
+            with open(self._object_path(entry['sha']), 'rb') as f:
+                data = f.read()
+            created = self._makedirs(os.path.dirname(path))
+            _write_atomic(path, data, entry['mode'])
+            if owner and path.startswith(CLAUDE_HOME + os.sep):
+                for p in created + [path]:
+                    os.chown(p, owner.pw_uid, owner.pw_gid)
+            restored.append(key)
+            bytes_written += len(data)
+        return {'success': True, 'seq': manifest['seq'], 'restored': restored,
+                'files': len(manifest['files']), 'bytes_written': bytes_written}
+
+    @staticmethod
+    def _makedirs(path: str) -> List[str]:
+        """mkdir -p returning the directories it created"""
+        created = []
+        while not os.path.isdir(path):
+            created.append(path)
+            path = os.path.dirname(path)
+        for directory in reversed(created):
+            os.mkdir(directory)
+        return created
+
+def _watch_paths() -> Tuple[List[str], List[str]]:
+    """(directories to watch recursively, directories whose direct entries matter)"""
+    recursive, shallow = [], []
+    for root, patterns, _ in SOURCES:
+        if not os.path.isdir(root):
+            continue
+        shallow.append(root)
+        for entry in os.listdir(root):
+            path = os.path.join(root, entry)
+            if any(fnmatch.fnmatch(entry, p) for p in patterns) and os.path.isdir(path) and not os.path.islink(path):
+                recursive.append(path)
+    return recursive, shallow
+
+def _start_watchers(changed: threading.Event) -> List[subprocess.Popen]:
+    """inotifywait processes that set `changed` on every relevant file event"""
+    recursive, shallow = _watch_paths()
+    events = ['-e', 'close_write,moved_to,moved_from,create,delete,attrib']
+    # --exclude also keeps -r from adding watches inside those directories
+    skip = ['--exclude', f"/({'|'.join(map(re.escape, SNAPSHOT_EXCLUDE_DIRS))})(/|$)"] if SNAPSHOT_EXCLUDE_DIRS else []
+    commands = [['inotifywait', '-m', '-q', '-r', *events, *skip, '--format', '%f', *recursive]] if recursive else []
+    commands.append(['inotifywait', '-m', '-q', *events, '--format', '%f', *shallow])
+    procs = []
+    for command in commands:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        procs.append(proc)
+
+        def follow(proc=proc):
+            for line in proc.stdout:
+                if not _excluded(line.strip()):
+                    changed.set()
+        threading.Thread(target=follow, daemon=True).start()
+    return procs
+
+def watch(store: SnapshotStore) -> None:
+    """Snapshot after file changes settle; falls back to stat polling without inotifywait"""
+    changed = threading.Event()
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+        changed.set()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        watchers = _start_watchers(changed)
+        logger.info(f"Watching {', '.join(sum(_watch_paths(), []))} for changes")
+    except FileNotFoundError:
+        watchers = []
+        logger.warning(f"inotifywait not found; scanning every {SNAPSHOT_POLL:.0f}s instead")
+    # Snapshotting before the boot restore would record an empty home as the latest state
+    from startup import wait_for_phase
+    if not wait_for_phase('restore'):
+        logger.warning("Boot restore still running; snapshotting anyway")
+    topology = _watch_paths()
+    changed.set()  # snapshot once at startup
+    last = 0.0
+
+    while not stopping.is_set():
+        if not changed.wait(None if watchers else SNAPSHOT_POLL) and watchers:
+            continue
+        # Debounce bursts (Claude rewrites several files at once), then rate-limit
+        while changed.is_set() and not stopping.is_set():
+            changed.clear()
+            stopping.wait(SNAPSHOT_DEBOUNCE)
+        stopping.wait(max(0, SNAPSHOT_MIN_INTERVAL - (time.time() - last)))
+        changed.clear()
+        report(store.snapshot())
+        last = time.time()
+        # A newly created source directory (e.g. ~/.anthropic after login) needs its own watch
+        if watchers and _watch_paths() != topology:
+            for proc in watchers:
+                proc.terminate()
+            watchers = _start_watchers(changed)
+            topology = _watch_paths()
+
+    report(store.snapshot())  # capture anything written during shutdown
+    for proc in watchers:
+        proc.terminate()
+
+def report(result: Dict[str, Any]) -> None:
+    if result.get('changed') or result.get('removed'):
+        logger.info(f"Snapshot {result['seq']}: {len(result['changed'])} changed, {len(result['removed'])} removed, "
+                    f"{result['bytes_written']} bytes written in {result['duration_ms']}ms")
+    else:
+        logger.debug(f"No changes ({result['files']} files checked in {result['duration_ms']}ms)")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    store = SnapshotStore()
+    if command == 'snapshot':
+        result = store.snapshot()
+        report(result)
+        print(json.dumps(result))
+    elif command == 'restore':
+        result = store.restore()
+        print(json.dumps(result))
+        sys.exit(0 if result['success'] else 1)
+    elif command == 'watch':
+        watch(store)
+    else:
+        print(f"usage: {sys.argv[0]} snapshot|restore|watch")
+        sys.exit(2)
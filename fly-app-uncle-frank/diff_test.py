@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Local test for /git/diff's summary, per-file and cached views
+Builds a throwaway repository and checks that cached diffs follow edits,
+staging and renames, that fingerprinting never writes to the repository,
+and that every view reports failures the same way
+"""
+
+import os
+import time
+import tempfile
+import subprocess
+
+os.environ['GIT_RUN_AS'] = ''  # run git as the current user
+
+from flask import Flask
+
+from git_operations import get_worktree_fingerprint, get_diff_summary, setup_git_routes
+
+def git(repo, *args):
+    return subprocess.run(['git', '-C', repo, *args], capture_output=True, text=True, check=True).stdout
+
+def make_repo():
+    repo = tempfile.mkdtemp()
+    git(repo, 'init', '-q')
+    git(repo, 'config', 'user.email', 'test@noderr.local')
+    git(repo, 'config', 'user.name', 'Noderr Test')
+    for name in ('a.txt', 'b c.txt', 'old.txt'):
+        with open(os.path.join(repo, name), 'w') as f:
+            f.write(f"{name}\n" * 20)
+    git(repo, 'add', '-A')
+    git(repo, 'commit', '-q', '-m', 'init')
+    return repo
+
+def write(repo, name, text):
+    with open(os.path.join(repo, name), 'w') as f:
+        f.write(text)
+
+def objects(repo):
+    """Loose objects and whether index.lock exists (fingerprinting must change neither)"""
+    found = sum(len(files) for _, _, files in os.walk(os.path.join(repo, '.git', 'objects')))
+    return found, os.path.exists(os.path.join(repo, '.git', 'index.lock'))
+
+def check(label, ok):
+    print(f"   {'✓' if ok else '✗'} {label}")
+    return ok
+
+def test_diff():
+    print("=" * 60)
+    print("LOCAL TEST: git diff views and fingerprint cache")
+    print("=" * 60)
+    repo = make_repo()
+    results = []
+
+    print("\n1. Fingerprint is read-only and stable")
+    write(repo, 'a.txt', 'changed\n')
+    before = objects(repo)
+    first = get_worktree_fingerprint(repo)
+    results.append(check("same fingerprint twice", first == get_worktree_fingerprint(repo)))
+    results.append(check("no objects written, no index.lock", objects(repo) == before))
+
+    print("\n2. Cached summary follows the worktree")
+    summary = get_diff_summary(repo)
+    results.append(check("first summary computed", not summary['cached'] and summary['totals']['files'] == 1))
+    results.append(check("repeat served from cache", get_diff_summary(repo)['cached']))
+    time.sleep(0.01)
+    write(repo, 'a.txt', 'CHANGED\n')  # same size, new content
+    summary = get_diff_summary(repo)
+    results.append(check("same-size edit invalidates", not summary['cached']))
+    write(repo, 'b c.txt', 'more\n')
+    summary = get_diff_summary(repo)
+    results.append(check("second dirty file (name with a space) counted", summary['totals']['files'] == 2))
+    write(repo, 'untracked.txt', 'new\n')
+    results.append(check("untracked file doesn't invalidate", get_diff_summary(repo)['cached']))
+
+    print("\n3. Staging and renames")
+    git(repo, 'add', 'a.txt')
+    results.append(check("staging changes the fingerprint", get_worktree_fingerprint(repo) != first))
+    staged = get_diff_summary(repo, staged=True)
+    results.append(check("staged summary has the staged file", [f['path'] for f in staged['files']] == ['a.txt']))
+    git(repo, 'mv', 'old.txt', 'new name.txt')
+    staged = get_diff_summary(repo, staged=True)
+    renamed = [f for f in staged['files'] if f.get('old_path') == 'old.txt']
+    results.append(check("rename reported with its old path",
+                         bool(renamed) and renamed[0]['path'] == 'new name.txt'))
+
+    print("\n4. Views report failures alike")
+    app = Flask(__name__)
+    setup_git_routes(app)
+    client = app.test_client()
+    for view in ('summary', 'file', 'full'):
+        response = client.get(f"/git/diff?path={repo}&view={view}&file=nope.txt")
+        results.append(check(f"view={view}: 200", response.status_code == 200))
+    response = client.get(f"/git/diff?path={repo}&view=file")
+    results.append(check("view=file without a file: success false",
+                         response.status_code == 200 and not response.get_json()['success']))
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+
+if __name__ == "__main__":
+    test_diff()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Single-Process Gateway for Noderr
+Runs noderr-api, inject-agent, claude-auth and claude-relay in one Python process,
+each still on its own port, with calls between them made in-process instead of over
+localhost HTTP, one shared tmux control-mode channel and one health cache.
+Optional: supervisor starts the separate services unless this is enabled instead
+"""
+
+import os
+import logging
+import threading
+from typing import List, Tuple
+
+from werkzeug.serving import make_server
+
+import local_services
+import tmux_channel
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_TMUX_CHANNEL = os.environ.get('GATEWAY_TMUX_CHANNEL', 'control')  # tmux channel shared by all services
+
+def load_services() -> List[Tuple[str, object, int]]:
+    """Import every service and mount it for in-process calls: (name, app, port)"""
+    # Before the services import tmux(), so every call goes through the one channel
+    tmux_channel.use_channel(GATEWAY_TMUX_CHANNEL)
+    import noderr_api
+    import inject_agent
+    import claude_auth_handler
+    import claude_relay
+    services = [
+        ('noderr-api', noderr_api.app, int(os.environ.get('NODERR_API_PORT', '8080'))),
+        ('inject-agent', inject_agent.app, int(os.environ.get('INJECT_AGENT_PORT', '8082'))),
+        ('claude-auth', claude_auth_handler.app, int(os.environ.get('CLAUDE_AUTH_PORT', '8083'))),
+        ('claude-relay', claude_relay.app, int(os.environ.get('CLAUDE_RELAY_PORT', '8084'))),
+    ]
+    for name, app, _ in services:
+        local_services.mount(name, app)
+    return services
+
+def start_background_work() -> None:
+    """What inject_agent starts when it runs on its own"""
+    import inject_agent
+    if inject_agent.WORKTREE_POOL_SIZE > 0:
+        threading.Thread(target=inject_agent.get_worktree_pool().warm, daemon=True).start()
+    if inject_agent.STANDBY_SESSIONS > 0:
+        inject_agent.get_session_pool().start()
+
+def serve(services: List[Tuple[str, object, int]]) -> None:
+    servers = [(name, make_server('0.0.0.0', port, app, threaded=True)) for name, app, port in services]
+    for name, server in servers[1:]:
+        threading.Thread(target=server.serve_forever, name=name, daemon=True).start()
+    for name, server in servers:
+        logger.info(f"{name} listening on port {server.server_port}")
+    servers[0][1].serve_forever()
+
+if __name__ == '__main__':
+    services = load_services()
+    start_background_work()
+    serve(services)
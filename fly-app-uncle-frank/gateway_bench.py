@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Local benchmark: separate services vs. the single-process gateway
+Starts noderr-api, inject-agent, claude-auth and claude-relay once as four
+processes and once as gateway.py, then compares request latency through
+noderr-api (routes that call another service and ones that don't) and the
+resident memory of the Python processes
+"""
+
+import os
+import sys
+import time
+import socket
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+REQUESTS = int(os.environ.get('BENCH_REQUESTS', '300'))
+ROUTES = ['/relay/test', '/relay/health', '/claude/auth/verify', '/health']
+SERVICES = {
+    'noderr-api': ('noderr_api', 'NODERR_API'),
+    'inject-agent': ('inject_agent', 'INJECT_AGENT'),
+    'claude-auth': ('claude_auth_handler', 'CLAUDE_AUTH'),
+    'claude-relay': ('claude_relay', 'CLAUDE_RELAY'),
+}
+# Keep inject_agent from booting standby sessions or worktrees while measuring
+BENCH_ENV = {'STANDBY_SESSIONS': '0', 'WORKTREE_POOL_SIZE': '0', 'PYTHONUNBUFFERED': '1'}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def get(url: str) -> None:
+    try:
+        urllib.request.urlopen(url, timeout=10).read()
+    except urllib.error.HTTPError as e:
+        e.read()
+
+def wait_ready(ports) -> None:
+    deadline = time.time() + 30
+    for port in ports:
+        while True:
+            try:
+                get(f"http://127.0.0.1:{port}/livez")
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"service on port {port} did not start")
+                time.sleep(0.05)
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def start(mode: str):
+    """(processes, noderr-api port) for 'separate' or 'gateway'"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    ports = {name: free_port() for name in SERVICES}
+    env = {**os.environ, **BENCH_ENV}
+    for name, (_, prefix) in SERVICES.items():
+        env[f"{prefix}_URL"] = f"http://127.0.0.1:{ports[name]}"
+        env[f"{prefix}_PORT"] = str(ports[name])
+    if mode == 'gateway':
+        commands = [([sys.executable, 'gateway.py'], {})]
+    else:
+        commands = [([sys.executable, f"{module}.py"], {'PORT': str(ports[name])})
+                    for name, (module, _) in SERVICES.items()]
+    procs = [subprocess.Popen(argv, cwd=here, env={**env, **extra},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+             for argv, extra in commands]
+    wait_ready(ports.values())
+    return procs, ports['noderr-api']
+
+def measure(mode: str):
+    procs, port = start(mode)
+    try:
+        latencies = {}
+        for route in ROUTES:
+            url = f"http://127.0.0.1:{port}{route}"
+            get(url)  # warm-up
+            samples = []
+            for _ in range(REQUESTS):
+                started = time.perf_counter()
+                get(url)
+                samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            latencies[route] = (statistics.median(samples), samples[int(len(samples) * 0.99) - 1])
+        memory = sum(rss_kb(p.pid) for p in procs)
+        return latencies, memory
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+def test_gateway():
+    print("=" * 60)
+    print("LOCAL TEST: Separate services vs. single-process gateway")
+    print("=" * 60)
+
+    results = {mode: measure(mode) for mode in ('separate', 'gateway')}
+    print(f"\n{'route':<22}{'separate p50/p99':>20}{'gateway p50/p99':>20}")
+    for route in ROUTES:
+        (s50, s99), (g50, g99) = results['separate'][0][route], results['gateway'][0][route]
+        print(f"{route:<22}{s50:>10.2f}/{s99:<8.2f}ms{g50:>10.2f}/{g99:<8.2f}ms")
+    print(f"\nresident memory: separate {results['separate'][1] / 1024:.1f} MB, "
+          f"gateway {results['gateway'][1] / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    test_gateway()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Persistent `git cat-file --batch` reader for Noderr
+Keeps one long-lived cat-file process per repository so file contents at
+any revision can be read over a single pipe instead of one git per file
+"""
+
+import os
+import base64
+import logging
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from git_operations import git_argv
+
+logger = logging.getLogger(__name__)
+
+CATFILE_CACHE_BYTES = int(os.environ.get('CATFILE_CACHE_BYTES', str(64 * 1024 * 1024)))  # LRU blob budget
+CATFILE_MAX_BLOB = int(os.environ.get('CATFILE_MAX_BLOB', str(8 * 1024 * 1024)))  # larger blobs aren't cached
+
+# (sha, type, size, data); data is None for --batch-check lookups
+GitObject = Tuple[str, str, int, Optional[bytes]]
+
+class _BatchProcess:
+    """One `git cat-file --batch[-check]` pipe; callers must hold the owner's lock"""
+
+    def __init__(self, project_path: str, mode: str):
+        self.project_path = project_path
+        self.mode = mode
+        self.proc: Optional[subprocess.Popen] = None
+
+    def _ensure(self) -> subprocess.Popen:
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen(
+                git_argv(self.project_path, 'cat-file', self.mode),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        return self.proc
+
+    def _read_one(self, proc: subprocess.Popen, spec: str) -> Optional[GitObject]:
+        header = proc.stdout.readline()
+        if not header:
+            raise BrokenPipeError('cat-file exited')
+        # "<spec> missing" / "<spec> ambiguous"; the spec itself may contain spaces
+        if header.endswith((b' missing\n', b' ambiguous\n')):
+            return None
+        parts = header.decode(errors='replace').split()
+        sha, obj_type, size = parts[0], parts[1], int(parts[2])
+        data = None
+        if self.mode == '--batch':
+            data = proc.stdout.read(size)
+            proc.stdout.read(1)  # trailing LF
+        return sha, obj_type, size, data
+
+    def query(self, specs: List[str]) -> List[Optional[GitObject]]:
+        """Pipeline several object specs through the process and return results in order"""
+        for attempt in range(2):
+            proc = self._ensure()
+            request = ''.join(f"{spec}\n" for spec in specs).encode()
+            # Write from a thread so large responses can't deadlock against our writes
+            writer = threading.Thread(target=self._write, args=(proc, request), daemon=True)
+            writer.start()
+            try:
+                results = [self._read_one(proc, spec) for spec in specs]
+                writer.join()
+                return results
+            except (BrokenPipeError, ValueError, OSError):
+                logger.warning(f"cat-file {self.mode} for {self.project_path} died, restarting")
+                self.close()
+                if attempt:
+                    raise
+        return []
+
+    @staticmethod
+    def _write(proc: subprocess.Popen, request: bytes) -> None:
+        try:
+            proc.stdin.write(request)
+            proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def close(self) -> None:
+        if self.proc:
+            try:
+                self.proc.kill()
+                self.proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            self.proc = None
+
+class CatFileReader:
+    """Thread-safe client around persistent --batch/--batch-check processes with an LRU blob cache"""
+
+    def __init__(self, project_path: str, cache_bytes: int = CATFILE_CACHE_BYTES):
+        self.project_path = project_path
+        self.cache_bytes = cache_bytes
+        self._batch = _BatchProcess(project_path, '--batch')
+        self._check = _BatchProcess(project_path, '--batch-check')
+        self._batch_lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._cache: "OrderedDict[str, GitObject]" = OrderedDict()
+        self._cache_size = 0
+        self._cache_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _cached(self, sha: str) -> Optional[GitObject]:
+        with self._cache_lock:
+            obj = self._cache.get(sha)
+            if obj:
+                self._cache.move_to_end(sha)
+                self.stats['hits'] += 1
+            else:
+                self.stats['misses'] += 1
+            return obj
+
+    def _store(self, obj: GitObject) -> None:
+        # Objects are immutable by SHA, so entries never go stale
+        if obj[2] > CATFILE_MAX_BLOB:
+            return
+        with self._cache_lock:
+            if obj[0] in self._cache:
+                return
+            self._cache[obj[0]] = obj
+            self._cache_size += obj[2]
+            while self._cache_size > self.cache_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= evicted[2]
+                self.stats['evictions'] += 1
+
+    def info(self, specs: List[str]) -> List[Optional[GitObject]]:
+        """Resolve specs ("rev:path", SHAs, refs) to (sha, type, size) without reading content"""
+        # A newline would desynchronize the line protocol; such specs simply don't resolve
+        valid = [i for i, spec in enumerate(specs) if '\n' not in spec]
+        with self._check_lock:
+            found = self._check.query([specs[i] for i in valid]) if valid else []
+        results: List[Optional[GitObject]] = [None] * len(specs)
+        for i, obj in zip(valid, found):
+            results[i] = obj
+        return results
+
+    def read(self, specs: List[str]) -> List[Optional[GitObject]]:
+        """Read objects for each spec, serving known SHAs from the cache"""
+        resolved = self.info(specs)
+        results: List[Optional[GitObject]] = []
+        missing = []
+        for i, info in enumerate(resolved):
+            obj = self._cached(info[0]) if info else None
+            results.append(obj)
+            if info and not obj:
+                missing.append(i)
+        if missing:
+            with self._batch_lock:
+                fetched = self._batch.query([resolved[i][0] for i in missing])
+            for i, obj in zip(missing, fetched):
+                if obj:
+                    self._store(obj)
+                results[i] = obj
+        return results
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            return {'path': self.project_path, 'cache_bytes': self._cache_size,
+                    'objects': len(self._cache), **self.stats}
+
+    def close(self) -> None:
+        with self._batch_lock:
+            self._batch.close()
+        with self._check_lock:
+            self._check.close()
+
+_readers: Dict[str, CatFileReader] = {}
+_readers_lock = threading.Lock()
+
+def get_catfile(project_path: str = '/workspace') -> CatFileReader:
+    """Return the shared reader for a repository"""
+    key = os.path.realpath(project_path)
+    with _readers_lock:
+        if key not in _readers:
+            _readers[key] = CatFileReader(key)
+        return _readers[key]
+
+def _is_utf8(data: bytes) -> bool:
+    try:
+        data.decode()
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def parse_tree(data: bytes, sha_len: int = 20) -> List[Dict[str, str]]:
+    """Decode raw tree object content ("<mode> <name>\\0<binary sha>" records)"""
+    entries = []
+    pos = 0
+    while pos < len(data):
+        nul = data.index(b'\0', pos)
+        mode, name = data[pos:nul].split(b' ', 1)
+        sha = data[nul + 1:nul + 1 + sha_len].hex()
+        pos = nul + 1 + sha_len
+        entries.append({
+            'mode': mode.decode(),
+            'name': name.decode(errors='replace'),
+            'sha': sha,
+            'type': 'tree' if mode == b'40000' else ('commit' if mode == b'160000' else 'blob')
+        })
+    return entries
+
+def show_files(project_path: str, rev: str, paths: List[str]) -> List[Dict[str, Any]]:
+    """File contents at a revision; text is returned as-is, binary as base64"""
+    reader = get_catfile(project_path)
+    objects = reader.read([f"{rev}:{p}" for p in paths])
+    files = []
+    for path, obj in zip(paths, objects):
+        if not obj:
+            files.append({'path': path, 'found': False})
+            continue
+        sha, obj_type, size, data = obj
+        entry = {'path': path, 'found': True, 'sha': sha, 'type': obj_type, 'size': size}
+        if obj_type == 'tree':
+            entry['entries'] = parse_tree(data, len(sha) // 2)
+        elif b'\0' not in data[:8000] and _is_utf8(data):
+            entry['content'] = data.decode()
+            entry['encoding'] = 'utf-8'
+        else:
+            entry['content'] = base64.b64encode(data).decode()
+            entry['encoding'] = 'base64'
+        files.append(entry)
+    return files
+
+# Flask route handlers to be imported by inject_agent.py
+def setup_catfile_routes(app):
+    """Setup blob access Flask routes"""
+
+    @app.route('/git/show', methods=['GET'])
+    def git_show_route():
+        """File contents at a revision: ?rev=HEAD&path=a.py[&path=b.py][&repo=/workspace][&raw=true]"""
+        from flask import request, jsonify, Response
+        project_path = request.args.get('repo', '/workspace')
+        rev = request.args.get('rev', 'HEAD')
+        paths = request.args.getlist('path')
+        if not paths:
+            return jsonify({'success': False, 'error': 'No path provided'}), 400
+
+        if request.args.get('raw', 'false').lower() == 'true':
+            obj = get_catfile(project_path).read([f"{rev}:{paths[0]}"])[0]
+            if not obj or obj[1] != 'blob':
+                return jsonify({'success': False, 'error': 'Blob not found'}), 404
+            return Response(obj[3], mimetype='application/octet-stream', headers={'ETag': obj[0]})
+
+        files = show_files(project_path, rev, paths)
+        if len(paths) == 1:
+            return jsonify({'success': files[0]['found'], 'rev': rev, **files[0]}), (200 if files[0]['found'] else 404)
+        return jsonify({'success': True, 'rev': rev, 'files': files})
+
+    @app.route('/git/show/stats', methods=['GET'])
+    def git_show_stats_route():
+        """Blob cache statistics per repository"""
+        from flask import jsonify
+        with _readers_lock:
+            readers = list(_readers.values())
+        return jsonify({'repositories': [r.cache_stats() for r in readers]})
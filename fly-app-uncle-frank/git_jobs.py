@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Background Git push/pull/fetch jobs for Noderr
+Runs network git operations off the request thread, parses `--progress`
+output and streams it to clients over SSE, with retry and cancellation
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from git_operations import git_argv, get_current_branch, valid_branch, valid_remote
+from git_scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+GIT_JOB_TIMEOUT = int(os.environ.get('GIT_JOB_TIMEOUT', '600'))  # seconds per attempt
+GIT_JOB_RETRIES = int(os.environ.get('GIT_JOB_RETRIES', '3'))  # extra attempts on transient failures
+GIT_JOB_BACKOFF = float(os.environ.get('GIT_JOB_BACKOFF', '2'))  # base backoff seconds
+GIT_JOB_HISTORY = int(os.environ.get('GIT_JOB_HISTORY', '50'))  # finished jobs kept for inspection
+
+JOB_OPS = ('push', 'pull', 'fetch')
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+# e.g. "Receiving objects:  45% (9/20), 1.20 MiB | 2.00 MiB/s" or "remote: Counting objects: 100% (20/20), done."
+PROGRESS_RE = re.compile(r'^(?:remote: )?([A-Za-z][A-Za-z ]+):\s+(\d+)% \((\d+)/(\d+)\)')
+TRANSIENT_ERRORS = re.compile(
+    r'Could not resolve host|Connection (?:timed out|reset|refused)|Operation timed out|'
+    r'early EOF|remote end hung up unexpectedly|RPC failed|HTTP 5\d\d|'
+    r'The requested URL returned error: 5\d\d|gnutls_handshake|SSL_ERROR',
+    re.IGNORECASE
+)
+
+class GitJob:
+    """One push/pull/fetch run with its progress event log"""
+
+    def __init__(self, op: str, project_path: str, remote: str, branch: str, force: bool = False):
+        self.id = str(uuid.uuid4())
+        self.op = op
+        self.project_path = project_path
+        self.remote = remote
+        self.branch = branch
+        self.force = force
+        self.status = 'queued'
+        self.progress: Dict[str, Any] = {}
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.output: List[str] = []
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.changed = threading.Condition()
+        self.cancelled = threading.Event()
+        self.process: Optional[subprocess.Popen] = None
+
+    def argv(self) -> List[str]:
+        force = ['--force'] if self.op == 'push' and self.force else []
+        # remote and branch come from the request body: never let git read them as options
+        return git_argv(self.project_path, self.op, '--progress', *force, '--end-of-options',
+                        self.remote, self.branch)
+
+    def emit(self, event: str, **data: Any) -> None:
+        """Append to the event log and wake SSE listeners"""
+        with self.changed:
+            self.events.append({'event': event, 'job': self.id, 'ts': time.time(), **data})
+            self.changed.notify_all()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'op': self.op,
+            'path': self.project_path,
+            'remote': self.remote,
+            'branch': self.branch,
+            'status': self.status,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            'error': self.error,
+            'output': '\n'.join(self.output[-20:]),
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+def _read_progress(job: GitJob) -> None:
+    """Consume git's stderr, splitting on \\r as well as \\n so progress updates arrive live"""
+    buf = b''
+    last_emit = 0.0
+    while True:
+        byte = job.process.stderr.read(1)
+        if not byte:
+            break
+        if byte not in (b'\r', b'\n'):
+            buf += byte
+            continue
+        line = buf.decode(errors='replace').strip()
+        buf = b''
+        if not line:
+            continue
+        match = PROGRESS_RE.match(line)
+        if match:
+            phase, percent, current, total = match.groups()
+            job.progress = {'phase': phase, 'percent': int(percent), 'current': int(current), 'total': int(total)}
+            # Throttle to ~10 events/s but never drop the end of a phase
+            now = time.monotonic()
+            if now - last_emit >= 0.1 or percent == '100':
+                last_emit = now
+                job.emit('progress', **job.progress)
+        else:
+            job.output.append(line)
+            job.emit('output', line=line)
+
+def _attempt(job: GitJob) -> int:
+    # Runs after any wait for the scheduler's write lock, so a cancel that came
+    # in meanwhile must stop git from starting at all
+    if job.cancelled.is_set():
+        return -1
+    job.attempts += 1
+    job.output.append(f"$ git {job.op} {job.remote} {job.branch} (attempt {job.attempts})")
+    job.process = subprocess.Popen(job.argv(), stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if job.cancelled.is_set():
+        job.process.terminate()  # cancel_job ran before job.process was set
+    reader = threading.Thread(target=_read_progress, args=(job,), daemon=True)
+    reader.start()
+    try:
+        returncode = job.process.wait(timeout=GIT_JOB_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        job.process.kill()
+        returncode = job.process.wait()
+        job.output.append(f"timed out after {GIT_JOB_TIMEOUT}s")
+    reader.join(timeout=5)
+    return returncode
+
+def _run_job(job: GitJob) -> None:
+    job.status = 'running'
+    job.started = time.time()
+    job.emit('started', op=job.op, branch=job.branch)
+
+    returncode = -1
+    for attempt in range(GIT_JOB_RETRIES + 1):
+        if job.cancelled.is_set():
+            break
+        # Only pull touches the index/worktree; push and fetch just update refs
+        if job.op == 'pull':
+            returncode = get_scheduler(job.project_path).write(lambda: _attempt(job))
+        else:
+            returncode = _attempt(job)
+        if returncode == 0 or job.cancelled.is_set():
+            break
+        transient = TRANSIENT_ERRORS.search('\n'.join(job.output[-10:]))
+        if not transient or attempt == GIT_JOB_RETRIES:
+            break
+        delay = GIT_JOB_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+        job.emit('retry', attempt=job.attempts, delay=round(delay, 2))
+        logger.warning(f"git {job.op} job {job.id} failed transiently, retrying in {delay:.1f}s")
+        job.cancelled.wait(delay)
+
+    job.finished = time.time()
+    if job.cancelled.is_set():
+        job.status = 'cancelled'
+    elif returncode == 0:
+        job.status = 'succeeded'
+    else:
+        job.status = 'failed'
+        errors = [l for l in job.output if l.startswith(('fatal:', 'error:'))]
+        job.error = errors[-1] if errors else f"git {job.op} exited with {returncode}"
+    job.emit('finished', status=job.status, error=job.error,
+             duration_ms=round((job.finished - job.started) * 1000))
+
+_jobs: "OrderedDict[str, GitJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def start_job(op: str, project_path: str = '/workspace', remote: str = 'origin',
+              branch: Optional[str] = None, force: bool = False) -> GitJob:
+    """Create a background job and start it immediately"""
+    job = GitJob(op, project_path, remote, branch or get_current_branch(project_path), force)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        # Forget the oldest finished jobs beyond the history limit
+        finished = [j for j in _jobs.values() if j.status in FINISHED]
+        for old in finished[:max(0, len(finished) - GIT_JOB_HISTORY)]:
+            del _jobs[old.id]
+    threading.Thread(target=_run_job, args=(job,), daemon=True).start()
+    logger.info(f"Started git {op} job {job.id} ({remote} {job.branch})")
+    return job
+
+def get_job(job_id: str) -> Optional[GitJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def cancel_job(job_id: str) -> Optional[GitJob]:
+    """Stop a queued/running job (the git process is terminated)"""
+    job = get_job(job_id)
+    if job and job.status not in FINISHED:
+        job.cancelled.set()
+        if job.process and job.process.poll() is None:
+            job.process.terminate()
+    return job
+
+def stream_job_events(job: GitJob, heartbeat: float = 15):
+    """SSE generator replaying the job's events and following it until it finishes"""
+    sent = 0
+    while True:
+        with job.changed:
+            if sent >= len(job.events) and job.status not in FINISHED:
+                job.changed.wait(heartbeat)
+            pending = job.events[sent:]
+            sent += len(pending)
+            done = job.status in FINISHED and sent >= len(job.events)
+        if not pending:
+            yield ": heartbeat\n\n"
+        for event in pending:
+            yield f"event: git:{event['event']}\ndata: {json.dumps(event)}\n\n"
+        if done:
+            return
+
+# Flask route handlers to be imported by inject_agent.py
+def setup_git_job_routes(app):
+    """Setup background git job Flask routes"""
+
+    @app.route('/git/jobs', methods=['GET', 'POST'])
+    def git_jobs_route():
+        """List jobs, or start one; body: {op: push|pull|fetch, path, remote, branch, force}"""
+        from flask import request, jsonify
+        if request.method == 'GET':
+            with _jobs_lock:
+                return jsonify([j.to_dict() for j in _jobs.values()])
+        data = request.get_json() or {}
+        op = data.get('op')
+        if op not in JOB_OPS:
+            return jsonify({'success': False, 'error': f"op must be one of {', '.join(JOB_OPS)}"}), 400
+        path = data.get('path', '/workspace')
+        remote = data.get('remote', 'origin')
+        if not valid_remote(path, remote):
+            return jsonify({'success': False, 'error': 'Invalid remote'}), 400
+        branch = data.get('branch')
+        if branch is not None and not valid_branch(path, branch):
+            return jsonify({'success': False, 'error': 'Invalid branch name'}), 400
+        job = start_job(op, path, remote, branch, bool(data.get('force', False)))
+        return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+    @app.route('/git/jobs/<job_id>', methods=['GET'])
+    def git_job_route(job_id):
+        """Get job status and latest progress"""
+        from flask import jsonify
+        job = get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/git/jobs/<job_id>/cancel', methods=['POST'])
+    def git_job_cancel_route(job_id):
+        """Cancel a running job"""
+        from flask import jsonify
+        job = cancel_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job.to_dict()})
+
+    @app.route('/git/jobs/<job_id>/events', methods=['GET'])
+    def git_job_events_route(job_id):
+        """Server-sent progress events for a job"""
+        from flask import jsonify, Response, stream_with_context
+        job = get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        response = Response(stream_with_context(stream_job_events(job)), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
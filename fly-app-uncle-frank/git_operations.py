@@ -1,41 +1,59 @@
 #!/usr/bin/env python3
 """
 Git Operations Module for Noderr
-Provides Git functionality via tmux commands to Claude Code
+Provides Git functionality by running git directly against the workspace
 """
 
 import os
+import re
 import subprocess
 import json
+import hashlib
 import logging
-from typing import Dict, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Iterator, List, Tuple
+from git_scheduler import get_scheduler, get_scheduler_stats
+from tmux_channel import send_text, tmux
 
 logger = logging.getLogger(__name__)
 
 SESSION_NAME = os.environ.get('SESSION_NAME', 'claude-code')
+GIT_RUN_AS = os.environ.get('GIT_RUN_AS', 'claude-user')  # empty = run git as current user
+DIFF_MAX_BYTES = int(os.environ.get('DIFF_MAX_BYTES', str(1024 * 1024)))  # cap for full/streamed diffs
+DIFF_PAGE_BYTES = int(os.environ.get('DIFF_PAGE_BYTES', str(64 * 1024)))  # default page for per-file hunks
+DIFF_CACHE_SIZE = int(os.environ.get('DIFF_CACHE_SIZE', '128'))  # cached summaries/file diffs
+
+# LRU cache for diff results, keyed by (kind, path, staged, fingerprint, ...)
+_diff_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+_diff_cache_lock = threading.Lock()
+
+COMMIT_SHA = re.compile(r'[0-9a-f]{40}')
+
+def git_argv(project_path: str, *args: str) -> List[str]:
+    """Build argv for running git directly (not through the Claude pane)"""
+    argv = ['git', '-C', project_path] + list(args)
+    if GIT_RUN_AS:
+        argv = ['sudo', '-u', GIT_RUN_AS] + argv
+    return argv
+
+def run_git(project_path: str, *args: str, timeout: int = 30) -> subprocess.CompletedProcess:
+    """Run a git command directly and return the completed process (bytes output)"""
+    return subprocess.run(git_argv(project_path, *args), capture_output=True, timeout=timeout)
 
 def execute_git_command(command: str) -> Dict[str, Any]:
     """Execute a git command in the Claude Code session and capture output"""
     try:
-        # First inject the command
-        result = subprocess.run([
-            'sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', SESSION_NAME, command
-        ], capture_output=True, text=True)
+        # First inject the command (and Enter)
+        result = send_text(SESSION_NAME, command)
         
         if result.returncode == 0:
-            # Send Enter key
-            subprocess.run([
-                'sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', SESSION_NAME, 'C-m'
-            ], capture_output=True, text=True)
-            
             # Wait a moment for command to execute
             subprocess.run(['sleep', '2'])
             
             # Capture the output
-            capture = subprocess.run([
-                'sudo', '-u', 'claude-user', 'tmux', 'capture-pane', 
-                '-t', SESSION_NAME, '-p', '-S', '-50'  # Get last 50 lines
-            ], capture_output=True, text=True)
+            capture = tmux('capture-pane', '-t', SESSION_NAME, '-p', '-S', '-50')  # Get last 50 lines
             
             if capture.returncode == 0:
                 return {
@@ -63,163 +81,471 @@ def execute_git_command(command: str) -> Dict[str, Any]:
             'command': command
         }
 
+def git_result(result: subprocess.CompletedProcess, args: tuple) -> Dict[str, Any]:
+    """Shape a finished git run like the pane-based results (success, output, command)"""
+    output = (result.stdout + result.stderr).decode(errors='replace')
+    command = 'git ' + ' '.join(args)
+    if result.returncode == 0:
+        return {'success': True, 'output': output, 'command': command}
+    return {'success': False, 'error': output.strip() or f"git exited with {result.returncode}",
+            'output': output, 'command': command}
+
+def run_git_command(project_path: str, *args: str, timeout: int = 60) -> Dict[str, Any]:
+    """Run git directly and wait for it to finish (so the caller's write lock covers all of it)"""
+    try:
+        return git_result(run_git(project_path, *args, timeout=timeout), args)
+    except subprocess.TimeoutExpired:
+        return {'success': False, 'error': f"Timed out after {timeout}s", 'command': 'git ' + ' '.join(args)}
+
+def parse_status(output: bytes) -> List[Tuple[str, str, Optional[str]]]:
+    """Parse `git status --porcelain -z` into (XY, path, original path for renames/copies)"""
+    entries = []
+    fields = output.split(b'\0')
+    i = 0
+    while i < len(fields):
+        entry = fields[i]
+        i += 1
+        if len(entry) < 4:
+            continue
+        xy, path, orig = entry[:2].decode(), entry[3:].decode(errors='replace'), None
+        # A rename or copy is followed by a field holding the path it came from
+        if xy[0] in 'RC' and i < len(fields):
+            orig = fields[i].decode(errors='replace')
+            i += 1
+        entries.append((xy, path, orig))
+    return entries
+
 def get_git_status(project_path: str = '/workspace') -> Dict[str, Any]:
     """Get current git status"""
-    command = f"cd {project_path} && git status --porcelain"
-    result = execute_git_command(command)
+    try:
+        result = run_git(project_path, 'status', '--porcelain', '-z')
+    except subprocess.TimeoutExpired:
+        return {'success': False, 'error': 'git status timed out'}
+    if result.returncode != 0:
+        return {'success': False, 'error': result.stderr.decode(errors='replace').strip()}
     
-    if result['success']:
-        output = result['output']
-        # Parse git status output
-        modified = []
-        untracked = []
-        staged = []
-        
-        for line in output.split('\n'):
-            if line.startswith(' M '):
-                modified.append(line[3:].strip())
-            elif line.startswith('?? '):
-                untracked.append(line[3:].strip())
-            elif line.startswith('M  ') or line.startswith('A  '):
-                staged.append(line[3:].strip())
-        
-        # Get branch info
-        branch_command = f"cd {project_path} && git branch --show-current"
-        branch_result = execute_git_command(branch_command)
-        branch = 'main'
-        if branch_result['success']:
-            # Extract branch name from output
-            lines = branch_result['output'].split('\n')
-            for line in reversed(lines):
-                if line and not line.startswith('$') and not line.startswith('cd '):
-                    branch = line.strip()
-                    break
-        
-        return {
-            'success': True,
-            'branch': branch,
-            'modified': modified,
-            'untracked': untracked,
-            'staged': staged
-        }
-    else:
-        return result
+    modified = []
+    untracked = []
+    staged = []
+    for xy, path, _ in parse_status(result.stdout):
+        if xy == '??':
+            untracked.append(path)
+            continue
+        if xy[0] != ' ':
+            staged.append(path)
+        if xy[1] != ' ':
+            modified.append(path)
+    
+    return {
+        'success': True,
+        'branch': get_current_branch(project_path),
+        'modified': modified,
+        'untracked': untracked,
+        'staged': staged
+    }
+
+def _cache_get(key: tuple) -> Any:
+    with _diff_cache_lock:
+        if key in _diff_cache:
+            _diff_cache.move_to_end(key)
+            return _diff_cache[key]
+    return None
+
+def _cache_put(key: tuple, value: Any) -> None:
+    with _diff_cache_lock:
+        _diff_cache[key] = value
+        _diff_cache.move_to_end(key)
+        while len(_diff_cache) > DIFF_CACHE_SIZE:
+            _diff_cache.popitem(last=False)
+
+def get_worktree_fingerprint(project_path: str = '/workspace') -> Optional[str]:
+    """Fingerprint (HEAD, index entries, dirty tracked files) so cached diffs can be reused safely
 
-def get_git_diff(project_path: str = '/workspace', staged: bool = False) -> Dict[str, Any]:
-    """Get git diff for changes"""
-    if staged:
-        command = f"cd {project_path} && git diff --staged"
-    else:
-        command = f"cd {project_path} && git diff"
+    Only read-only plumbing runs here (no write-tree, no index refresh), so a diff request
+    never writes objects or takes index.lock. Untracked files aren't part of any diff and
+    are left out, which also spares the untracked scan.
+    """
+    try:
+        head = run_git(project_path, 'rev-parse', '--verify', '-q', 'HEAD').stdout.strip()
+        index = run_git(project_path, '--no-optional-locks', 'ls-files', '-s', '-z')
+        dirty = run_git(project_path, '--no-optional-locks', 'diff-files', '--name-only', '-z')
+        if index.returncode != 0 or dirty.returncode != 0:
+            return None
+    except (subprocess.TimeoutExpired, OSError):
+        logger.exception(f"Failed to fingerprint worktree: {project_path}")
+        return None
     
-    result = execute_git_command(command)
+    digest = hashlib.sha1(head + b'\0' + hashlib.sha1(index.stdout).digest() + dirty.stdout)
+    # The names alone miss a dirty file being edited again, so mix in size/mtime
+    for path in filter(None, dirty.stdout.split(b'\0')):
+        try:
+            st = os.stat(os.path.join(project_path.encode(), path))
+            digest.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(b'missing')
+    return digest.hexdigest()
+
+def _diff_args(staged: bool, revs: Optional[List[str]] = None, options: tuple = ()) -> List[str]:
+    args = ['diff', '--no-color', '--no-ext-diff'] + (['--staged'] if staged else []) + list(options)
+    # Revisions can never be read as options
+    return args + (['--end-of-options'] + revs if revs else [])
+
+def _parse_numstat(output: bytes) -> List[Dict[str, Any]]:
+    """Parse `git diff --numstat -z` output (renames use an empty path plus two NUL fields)"""
+    files = []
+    fields = output.split(b'\0')
+    i = 0
+    while i < len(fields):
+        record = fields[i]
+        i += 1
+        if not record:
+            continue
+        parts = record.split(b'\t', 2)
+        if len(parts) != 3:
+            continue
+        added, deleted, path = parts
+        entry: Dict[str, Any] = {}
+        if not path and i + 1 < len(fields):
+            entry['old_path'] = fields[i].decode(errors='replace')
+            path = fields[i + 1]
+            i += 2
+        binary = added == b'-'
+        entry.update({
+            'path': path.decode(errors='replace'),
+            'additions': 0 if binary else int(added),
+            'deletions': 0 if binary else int(deleted),
+            'binary': binary
+        })
+        files.append(entry)
+    return files
+
+def get_diff_summary(project_path: str = '/workspace', staged: bool = False,
+                     fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """Diffstat summary (files and line counts) without any hunk content"""
+    fingerprint = fingerprint or get_worktree_fingerprint(project_path)
+    key = ('summary', project_path, staged, fingerprint)
+    if fingerprint:
+        cached = _cache_get(key)
+        if cached:
+            return {**cached, 'cached': True}
     
-    if result['success']:
-        # Parse diff output to extract changed files
-        files = []
-        diff_lines = result['output'].split('\n')
-        for line in diff_lines:
-            if line.startswith('diff --git'):
-                # Extract filename from diff header
-                parts = line.split(' ')
-                if len(parts) >= 4:
-                    filename = parts[3][2:] if parts[3].startswith('b/') else parts[3]
-                    if filename not in files:
-                        files.append(filename)
-        
-        return {
-            'success': True,
-            'diff': result['output'],
-            'files': files
+    try:
+        result = run_git(project_path, *_diff_args(staged), '--numstat', '-z')
+    except subprocess.TimeoutExpired:
+        return {'success': False, 'error': 'git diff timed out'}
+    if result.returncode != 0:
+        return {'success': False, 'error': result.stderr.decode(errors='replace').strip()}
+    
+    files = _parse_numstat(result.stdout)
+    summary = {
+        'success': True,
+        'staged': staged,
+        'fingerprint': fingerprint,
+        'files': files,
+        'totals': {
+            'files': len(files),
+            'additions': sum(f['additions'] for f in files),
+            'deletions': sum(f['deletions'] for f in files)
         }
-    else:
-        return result
+    }
+    if fingerprint:
+        _cache_put(key, summary)
+    return {**summary, 'cached': False}
+
+def get_file_diff(project_path: str = '/workspace', path: str = '', staged: bool = False,
+                  offset: int = 0, limit: int = DIFF_PAGE_BYTES,
+                  fingerprint: Optional[str] = None) -> Dict[str, Any]:
+    """Hunks for a single file, paginated by byte offset on line boundaries"""
+    if not path:
+        return {'success': False, 'error': 'No file path provided'}
+    
+    fingerprint = fingerprint or get_worktree_fingerprint(project_path)
+    key = ('file', project_path, staged, fingerprint, path)
+    patch = _cache_get(key) if fingerprint else None
+    cached = patch is not None
+    if patch is None:
+        try:
+            result = run_git(project_path, *_diff_args(staged), '--', path)
+        except subprocess.TimeoutExpired:
+            return {'success': False, 'error': 'git diff timed out', 'path': path}
+        if result.returncode != 0:
+            return {'success': False, 'error': result.stderr.decode(errors='replace').strip(), 'path': path}
+        patch = result.stdout
+        if fingerprint:
+            _cache_put(key, patch)
+    
+    offset = max(0, offset)
+    end = min(len(patch), offset + max(1, limit))
+    if end < len(patch):
+        # Don't split a line across pages unless a single line exceeds the page
+        newline = patch.rfind(b'\n', offset, end)
+        if newline != -1:
+            end = newline + 1
+    
+    return {
+        'success': True,
+        'path': path,
+        'staged': staged,
+        'fingerprint': fingerprint,
+        'diff': patch[offset:end].decode(errors='replace'),
+        'offset': offset,
+        'next_offset': end if end < len(patch) else None,
+        'total_bytes': len(patch),
+        'cached': cached
+    }
+
+def stream_git_diff(project_path: str = '/workspace', staged: bool = False,
+                    max_bytes: int = DIFF_MAX_BYTES, chunk_size: int = DIFF_PAGE_BYTES,
+                    revs: Optional[List[str]] = None) -> Iterator[bytes]:
+    """Yield raw diff output in chunks, stopping (and killing git) once max_bytes is reached"""
+    proc = subprocess.Popen(git_argv(project_path, *_diff_args(staged, revs)),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    sent = 0
+    try:
+        while sent < max_bytes:
+            chunk = proc.stdout.read(min(chunk_size, max_bytes - sent))
+            if not chunk:
+                break
+            sent += len(chunk)
+            yield chunk
+        else:
+            if proc.stdout.read(1):
+                yield f"\n# diff truncated after {max_bytes} bytes\n".encode()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+def get_git_diff(project_path: str = '/workspace', staged: bool = False,
+                 max_bytes: int = DIFF_MAX_BYTES) -> Dict[str, Any]:
+    """Get git diff for changes (full patch, capped at max_bytes)"""
+    summary = get_diff_summary(project_path, staged)
+    if not summary['success']:
+        return summary
+    
+    diff = b''.join(stream_git_diff(project_path, staged, max_bytes))
+    return {
+        'success': True,
+        'diff': diff.decode(errors='replace'),
+        'files': [f['path'] for f in summary['files']],
+        'stats': summary['totals'],
+        'truncated': len(diff) > max_bytes
+    }
+
+def get_head_commit(project_path: str = '/workspace') -> Optional[str]:
+    """Full SHA of HEAD, or None for an unborn branch / non-repo"""
+    try:
+        result = run_git(project_path, 'rev-parse', '--verify', '-q', 'HEAD')
+    except (subprocess.TimeoutExpired, OSError):
+        logger.exception(f"Failed to resolve HEAD: {project_path}")
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode().strip() or None
+
+def is_commit(project_path: str, rev: Any) -> bool:
+    """Whether rev is a full SHA of a commit in the repository"""
+    if not isinstance(rev, str) or not COMMIT_SHA.fullmatch(rev):
+        return False
+    try:
+        return run_git(project_path, 'rev-parse', '--verify', '-q', f"{rev}^{{commit}}", timeout=10).returncode == 0
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+
+def valid_branch(project_path: str, branch: Any) -> bool:
+    """Whether branch is a plain, well-formed branch name (never read as a git option)"""
+    if not isinstance(branch, str) or not branch or branch.startswith('-'):
+        return False
+    try:
+        result = run_git(project_path, 'check-ref-format', '--branch', branch, timeout=10)
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+    # --branch also expands shorthands like @{-1}; only names that stay as given are accepted
+    return result.returncode == 0 and result.stdout.decode(errors='replace').strip() == branch
+
+def valid_remote(project_path: str, remote: Any) -> bool:
+    """Whether remote is a well-formed remote name (git checks them the same way)"""
+    if not isinstance(remote, str) or not remote or remote.startswith('-'):
+        return False
+    try:
+        return run_git(project_path, 'check-ref-format', f"refs/remotes/{remote}/test", timeout=10).returncode == 0
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+
+def get_current_branch(project_path: str = '/workspace') -> str:
+    """Current branch name read straight from HEAD ('main' if detached or unknown)"""
+    try:
+        result = run_git(project_path, 'symbolic-ref', '--short', '-q', 'HEAD', timeout=10)
+    except (subprocess.TimeoutExpired, OSError):
+        return 'main'
+    return result.stdout.decode().strip() or 'main'
+
+def get_range_diff(project_path: str = '/workspace', base: str = '', head: Optional[str] = None,
+                   max_bytes: int = DIFF_MAX_BYTES) -> Dict[str, Any]:
+    """Diff and diffstat between two commits (head=None compares base to the worktree)"""
+    for rev in [base] + ([head] if head else []):
+        if not is_commit(project_path, rev):
+            return {'success': False, 'error': f"Not a commit SHA: {rev!r}"}
+    revs = [base] + ([head] if head else [])
+    try:
+        numstat = run_git(project_path, *_diff_args(False, revs, ('--numstat', '-z')))
+    except subprocess.TimeoutExpired:
+        return {'success': False, 'error': 'git diff timed out'}
+    if numstat.returncode != 0:
+        return {'success': False, 'error': numstat.stderr.decode(errors='replace').strip()}
+    
+    files = _parse_numstat(numstat.stdout)
+    diff = b''.join(stream_git_diff(project_path, False, max_bytes, revs=revs))
+    return {
+        'success': True,
+        'base': base,
+        'head': head,
+        'diff': diff.decode(errors='replace'),
+        'files': files,
+        'stats': {
+            'files': len(files),
+            'additions': sum(f['additions'] for f in files),
+            'deletions': sum(f['deletions'] for f in files)
+        },
+        'truncated': len(diff) > max_bytes
+    }
 
 def git_add(project_path: str = '/workspace', files: list = None) -> Dict[str, Any]:
     """Stage files for commit"""
     if files:
-        file_list = ' '.join(files)
-        command = f"cd {project_path} && git add {file_list}"
-    else:
-        command = f"cd {project_path} && git add ."
-    
-    return execute_git_command(command)
+        return run_git_command(project_path, 'add', '--', *files)
+    return run_git_command(project_path, 'add', '-A')
 
 def git_commit(project_path: str = '/workspace', message: str = None) -> Dict[str, Any]:
     """Create a git commit"""
     if not message:
         message = "Update from Noderr autonomous system"
     
-    # Escape quotes in message
-    message = message.replace('"', '\\"')
-    command = f'cd {project_path} && git commit -m "{message}"'
-    
-    result = execute_git_command(command)
-    
-    if result['success']:
-        # Extract commit hash from output
-        commit_hash = None
-        for line in result['output'].split('\n'):
-            if '[' in line and ']' in line:
-                # Parse commit info line
-                import re
-                match = re.search(r'\[[\w\-]+ ([a-f0-9]+)\]', line)
-                if match:
-                    commit_hash = match.group(1)
-                    break
-        
-        return {
-            'success': True,
-            'commit': commit_hash,
-            'message': message,
-            'output': result['output']
-        }
-    else:
+    result = run_git_command(project_path, 'commit', '-m', message)
+    if not result['success']:
         return result
+    
+    return {
+        'success': True,
+        'commit': get_head_commit(project_path),
+        'message': message,
+        'output': result['output']
+    }
 
 def git_push(project_path: str = '/workspace', branch: str = None, force: bool = False) -> Dict[str, Any]:
     """Push commits to remote"""
     if not branch:
-        # Get current branch
-        status = get_git_status(project_path)
-        branch = status.get('branch', 'main')
+        branch = get_current_branch(project_path)
     
-    if force:
-        command = f"cd {project_path} && git push origin {branch} --force"
-    else:
-        command = f"cd {project_path} && git push origin {branch}"
-    
-    return execute_git_command(command)
+    force_args = ['--force'] if force else []
+    return run_git_command(project_path, 'push', *force_args, '--end-of-options', 'origin', branch, timeout=300)
 
 def git_pull(project_path: str = '/workspace', branch: str = None) -> Dict[str, Any]:
     """Pull latest changes from remote"""
     if not branch:
-        # Get current branch
-        status = get_git_status(project_path)
-        branch = status.get('branch', 'main')
+        branch = get_current_branch(project_path)
+    
+    return run_git_command(project_path, 'pull', '--end-of-options', 'origin', branch, timeout=300)
+
+def commit_task(project_path: str = '/workspace', message: str = None, files: list = None,
+                push: bool = False, remote: str = 'origin', branch: str = None) -> Dict[str, Any]:
+    """Stage -> commit -> optional push in one call, with per-phase timings"""
+    message = message or "Update from Noderr autonomous system"
+    timings: Dict[str, float] = {}
+    started = time.monotonic()
+    if push and not (valid_remote(project_path, remote) and (branch is None or valid_branch(project_path, branch))):
+        return {'success': False, 'phase': 'push', 'error': 'Invalid remote or branch name', 'invalid': True,
+                'message': message}
+    
+    def phase(name: str, *args: str, timeout: int = 60) -> subprocess.CompletedProcess:
+        phase_start = time.monotonic()
+        result = run_git(project_path, *args, timeout=timeout)
+        timings[name] = round((time.monotonic() - phase_start) * 1000, 1)
+        return result
+    
+    def stage_and_commit() -> Dict[str, Any]:
+        staged = phase('stage', 'add', '--', *files) if files else phase('stage', 'add', '-A')
+        if staged.returncode != 0:
+            return {'success': False, 'phase': 'stage', 'error': staged.stderr.decode(errors='replace').strip()}
+        
+        names = run_git(project_path, 'diff', '--cached', '--name-only', '-z').stdout
+        changed = [n.decode(errors='replace') for n in names.split(b'\0') if n]
+        if not changed:
+            # Already committed (e.g. by Claude during the task): still push what's there
+            return {'success': True, 'files': [], 'nothing_to_commit': True, 'commit': get_head_commit(project_path)}
+        
+        committed = phase('commit', 'commit', '-q', '-m', message)
+        if committed.returncode != 0:
+            error = (committed.stderr or committed.stdout).decode(errors='replace').strip()
+            return {'success': False, 'phase': 'commit', 'error': error}
+        
+        return {'success': True, 'files': changed,
+                'commit': phase('rev-parse', 'rev-parse', 'HEAD').stdout.decode().strip()}
     
-    command = f"cd {project_path} && git pull origin {branch}"
-    return execute_git_command(command)
+    try:
+        result = get_scheduler(project_path).write(stage_and_commit)
+        if result['success'] and push:
+            branch = branch or get_current_branch(project_path)
+            pushed = phase('push', 'push', '--end-of-options', remote, branch, timeout=300)
+            result['pushed'] = pushed.returncode == 0
+            if not result['pushed']:
+                result.update(success=False, phase='push', error=pushed.stderr.decode(errors='replace').strip())
+            result['branch'] = branch
+    except subprocess.TimeoutExpired as e:
+        result = {'success': False, 'error': f"Timed out: {' '.join(e.cmd[-3:])}"}
+    
+    timings['total'] = round((time.monotonic() - started) * 1000, 1)
+    return {**result, 'message': message, 'timings_ms': timings}
 
 # Flask route handlers to be imported by inject_agent.py
-def setup_git_routes(app):
-    """Setup Git-related Flask routes"""
+def setup_git_routes(app, notify=None):
+    """Setup Git-related Flask routes (notify(event_type, data) publishes to SSE if given)"""
     
     @app.route('/git/status', methods=['GET'])
     def git_status_route():
         """Get git status"""
         from flask import request, jsonify
         project_path = request.args.get('path', '/workspace')
-        result = get_git_status(project_path)
+        result = get_scheduler(project_path).read(
+            ('status',), lambda: get_git_status(project_path))
         return jsonify(result)
     
     @app.route('/git/diff', methods=['GET'])
     def git_diff_route():
-        """Get git diff"""
-        from flask import request, jsonify
+        """Get git diff
+        
+        view=summary  diffstat only (files + line counts)
+        view=file     hunks for ?file=<path>, paginated with offset/limit (bytes)
+        view=stream   chunked raw patch, capped at max_bytes
+        (default)     full patch as JSON, capped at max_bytes
+        """
+        from flask import request, jsonify, Response, stream_with_context
         project_path = request.args.get('path', '/workspace')
         staged = request.args.get('staged', 'false').lower() == 'true'
-        result = get_git_diff(project_path, staged)
+        view = request.args.get('view', 'full')
+        max_bytes = min(request.args.get('max_bytes', DIFF_MAX_BYTES, type=int), DIFF_MAX_BYTES)
+        scheduler = get_scheduler(project_path)
+        
+        if view == 'summary':
+            return jsonify(scheduler.read(
+                ('diff-summary', staged), lambda: get_diff_summary(project_path, staged)))
+        if view == 'file':
+            file_path = request.args.get('file', '')
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', DIFF_PAGE_BYTES, type=int)
+            result = scheduler.read(
+                ('diff-file', staged, file_path, offset, limit),
+                lambda: get_file_diff(project_path, file_path, staged, offset=offset, limit=limit))
+            return jsonify(result)
+        if view == 'stream':
+            return Response(
+                stream_with_context(scheduler.read_stream(stream_git_diff(project_path, staged, max_bytes))),
+                mimetype='text/x-diff'
+            )
+        
+        result = scheduler.read(
+            ('diff', staged, max_bytes), lambda: get_git_diff(project_path, staged, max_bytes))
         return jsonify(result)
     
     @app.route('/git/add', methods=['POST'])
@@ -229,7 +555,7 @@ def setup_git_routes(app):
         data = request.get_json()
         project_path = data.get('path', '/workspace')
         files = data.get('files', None)
-        result = git_add(project_path, files)
+        result = get_scheduler(project_path).write(lambda: git_add(project_path, files))
         return jsonify(result)
     
     @app.route('/git/commit', methods=['POST'])
@@ -239,9 +565,11 @@ def setup_git_routes(app):
         data = request.get_json()
         project_path = data.get('path', '/workspace')
         message = data.get('message', None)
-        result = git_commit(project_path, message)
+        result = get_scheduler(project_path).write(lambda: git_commit(project_path, message))
         return jsonify(result)
     
+    setup_commit_task_route(app, notify)
+    
     @app.route('/git/push', methods=['POST'])
     def git_push_route():
         """Push to remote"""
@@ -250,7 +578,11 @@ def setup_git_routes(app):
         project_path = data.get('path', '/workspace')
         branch = data.get('branch', None)
         force = data.get('force', False)
-        result = git_push(project_path, branch, force)
+        if data.get('async'):
+            from git_jobs import start_job
+            job = start_job('push', project_path, branch=branch, force=force)
+            return jsonify({'success': True, 'job': job.to_dict()}), 202
+        result = get_scheduler(project_path).write(lambda: git_push(project_path, branch, force))
         return jsonify(result)
     
     @app.route('/git/pull', methods=['POST'])
@@ -260,5 +592,44 @@ def setup_git_routes(app):
         data = request.get_json()
         project_path = data.get('path', '/workspace')
         branch = data.get('branch', None)
-        result = git_pull(project_path, branch)
-        return jsonify(result)
\ No newline at end of file
+        if data.get('async'):
+            from git_jobs import start_job
+            job = start_job('pull', project_path, branch=branch)
+            return jsonify({'success': True, 'job': job.to_dict()}), 202
+        result = get_scheduler(project_path).write(lambda: git_pull(project_path, branch))
+        return jsonify(result)
+    
+    @app.route('/git/scheduler', methods=['GET'])
+    def git_scheduler_route():
+        """Queue depth and lock wait metrics per repository"""
+        from flask import jsonify
+        return jsonify(get_scheduler_stats())
+
+def setup_commit_task_route(app, notify=None, verify=None):
+    """Setup /git/commit-task alone (verify() -> bool guards it where the port is public)"""
+    
+    @app.route('/git/commit-task', methods=['POST'])
+    def git_commit_task_route():
+        """Stage, commit and optionally push in one transaction"""
+        from flask import request, jsonify
+        if verify and not verify():
+            return jsonify({'success': False, 'error': 'Invalid signature'}), 401
+        data = request.get_json(silent=True) or {}
+        project_path = data.get('path', '/workspace')
+        files = data.get('files')
+        if files is not None and not (isinstance(files, list) and all(isinstance(f, str) for f in files)):
+            return jsonify({'success': False, 'error': 'files must be a list of paths'}), 400
+        result = commit_task(
+            project_path,
+            data.get('message'),
+            files,
+            push=bool(data.get('push', False)),
+            remote=data.get('remote', 'origin'),
+            branch=data.get('branch')
+        )
+        if result.get('invalid'):
+            return jsonify(result), 400
+        result['taskId'] = data.get('taskId')
+        if notify:
+            notify('git:committed' if result['success'] else 'git:commit-failed', result)
+        return jsonify(result), (200 if result['success'] else 500)
\ No newline at end of file
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Per-repository Git operation scheduler for Noderr
+Serializes mutating git operations, runs read-only ones in parallel and
+coalesces identical in-flight reads so they only do the work once
+"""
+
+import os
+import time
+import logging
+import tempfile
+import threading
+from typing import Dict, Any, Callable, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+INDEX_LOCK_TIMEOUT = float(os.environ.get('INDEX_LOCK_TIMEOUT', '30'))  # seconds to wait on a foreign index.lock
+INDEX_LOCK_POLL = 0.1
+STREAM_SPOOL_MEMORY = int(os.environ.get('STREAM_SPOOL_MEMORY', str(256 * 1024)))  # bytes a streamed read buffers in memory before spilling to disk
+STREAM_SPOOL_CHUNK = 64 * 1024
+
+class _InflightCall:
+    """Result slot shared by coalesced callers of the same read"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class RepoScheduler:
+    """Readers-writer scheduler for one repository (writers are preferred)"""
+
+    def __init__(self, project_path: str):
+        self.project_path = project_path
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_readers = 0
+        self._waiting_writers = 0
+        self._inflight: Dict[tuple, _InflightCall] = {}
+        self._stats = {
+            'reads': 0,
+            'writes': 0,
+            'coalesced': 0,
+            'index_lock_waits': 0,
+            'lock_wait_total_ms': 0.0,
+            'lock_wait_max_ms': 0.0
+        }
+
+    def _record_wait(self, started: float) -> None:
+        waited_ms = (time.monotonic() - started) * 1000
+        self._stats['lock_wait_total_ms'] += waited_ms
+        self._stats['lock_wait_max_ms'] = max(self._stats['lock_wait_max_ms'], waited_ms)
+
+    def _acquire_read(self) -> None:
+        started = time.monotonic()
+        with self._cond:
+            self._waiting_readers += 1
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._waiting_readers -= 1
+            self._readers += 1
+            self._stats['reads'] += 1
+            self._record_wait(started)
+
+    def _release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def _acquire_write(self) -> None:
+        started = time.monotonic()
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+            self._stats['writes'] += 1
+        # Claude may be running git in its own pane; don't race its index.lock
+        self._wait_for_index_lock()
+        with self._cond:
+            self._record_wait(started)
+
+    def _release_write(self) -> None:
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    def _index_lock_path(self) -> str:
+        git_path = os.path.join(self.project_path, '.git')
+        if os.path.isfile(git_path):
+            # Linked worktree: .git is a "gitdir: <path>" pointer file
+            try:
+                with open(git_path) as f:
+                    gitdir = f.read().strip().split('gitdir:', 1)[-1].strip()
+                git_path = os.path.join(self.project_path, gitdir)
+            except OSError:
+                pass
+        return os.path.join(git_path, 'index.lock')
+
+    def _wait_for_index_lock(self) -> None:
+        lock_path = self._index_lock_path()
+        if not os.path.exists(lock_path):
+            return
+        with self._cond:
+            self._stats['index_lock_waits'] += 1
+        deadline = time.monotonic() + INDEX_LOCK_TIMEOUT
+        while os.path.exists(lock_path):
+            if time.monotonic() >= deadline:
+                logger.warning(f"{lock_path} still held after {INDEX_LOCK_TIMEOUT}s, proceeding")
+                return
+            time.sleep(INDEX_LOCK_POLL)
+
+    def read(self, key: tuple, fn: Callable[[], Any]) -> Any:
+        """Run a read-only operation; concurrent calls with the same key share one execution"""
+        with self._cond:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InflightCall()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            self._acquire_read()
+            try:
+                call.result = fn()
+            finally:
+                self._release_read()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+            call.event.set()
+        return call.result
+
+    def write(self, fn: Callable[[], Any]) -> Any:
+        """Run a mutating operation with exclusive access to the repository"""
+        self._acquire_write()
+        try:
+            return fn()
+        finally:
+            self._release_write()
+
+    def read_stream(self, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Produce a streamed read under shared access, spooled so a slow client can't hold off writers
+
+        The output goes to a temporary file (in memory up to STREAM_SPOOL_MEMORY) while the
+        read lock is held, and is sent from there once it is released.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_MEMORY) as spool:
+            self._acquire_read()
+            try:
+                for chunk in chunks:
+                    spool.write(chunk)
+            finally:
+                self._release_read()
+            spool.seek(0)
+            while True:
+                chunk = spool.read(STREAM_SPOOL_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue depth, active operations and lock wait statistics"""
+        with self._cond:
+            acquired = self._stats['reads'] + self._stats['writes']
+            return {
+                'path': self.project_path,
+                'queue_depth': self._waiting_readers + self._waiting_writers,
+                'waiting_readers': self._waiting_readers,
+                'waiting_writers': self._waiting_writers,
+                'active_readers': self._readers,
+                'writer_active': self._writer,
+                'inflight_reads': len(self._inflight),
+                **self._stats,
+                'lock_wait_avg_ms': self._stats['lock_wait_total_ms'] / acquired if acquired else 0.0
+            }
+
+_schedulers: Dict[str, RepoScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+def get_scheduler(project_path: str = '/workspace') -> RepoScheduler:
+    """Return the scheduler for a repository, creating it on first use"""
+    key = os.path.realpath(project_path)
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = RepoScheduler(key)
+        return _schedulers[key]
+
+def get_scheduler_stats() -> Dict[str, Any]:
+    """Metrics for every repository seen by this process"""
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {'repositories': [s.snapshot() for s in schedulers]}
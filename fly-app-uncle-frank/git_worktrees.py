@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Git Worktree Pool for Noderr
+Keeps pre-created `git worktree` checkouts and leases one per task/session
+on its own branch, so parallel executors never share a working directory
+"""
+
+import os
+import re
+import time
+import uuid
+import logging
+import subprocess
+import threading
+from typing import Dict, Any, List, Optional
+
+from git_operations import run_git, valid_branch
+from git_scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_DIR = os.environ.get('WORKSPACE_DIR', '/workspace')
+WORKTREE_DIR = os.environ.get('WORKTREE_DIR', '/data/worktrees')  # must be writable by GIT_RUN_AS
+WORKTREE_POOL_SIZE = int(os.environ.get('WORKTREE_POOL_SIZE', '2'))  # idle checkouts kept warm
+WORKTREE_BRANCH_PREFIX = os.environ.get('WORKTREE_BRANCH_PREFIX', 'noderr/')
+
+def _git(path: str, *args: str, timeout: int = 120) -> str:
+    """Run git in path, raising RuntimeError with git's stderr on failure"""
+    result = run_git(path, *args, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors='replace').strip() or f"git {args[0]} failed")
+    return result.stdout.decode(errors='replace')
+
+class WorktreePool:
+    """Pool of linked worktrees for one repository"""
+
+    def __init__(self, repo_path: str = WORKSPACE_DIR, root: str = WORKTREE_DIR,
+                 size: int = WORKTREE_POOL_SIZE):
+        self.repo_path = repo_path
+        self.root = root
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: List[str] = []
+        self._leases: Dict[str, Dict[str, Any]] = {}
+        self._discovered = False
+
+    def _discover(self) -> None:
+        """Adopt worktrees left under root by a previous process (the root may be on /data)"""
+        if self._discovered:
+            return
+        self._discovered = True
+        _git(self.repo_path, 'worktree', 'prune')
+        listing = _git(self.repo_path, 'worktree', 'list', '--porcelain')
+        for path in re.findall(r'^worktree (.+)$', listing, re.MULTILINE):
+            if os.path.dirname(path) == os.path.realpath(self.root):
+                self._idle.append(path)
+
+    def _create(self) -> str:
+        path = os.path.join(self.root, f"wt-{uuid.uuid4().hex[:8]}")
+        # Adding a worktree writes to the main repo's .git/worktrees
+        get_scheduler(self.repo_path).write(
+            lambda: _git(self.repo_path, 'worktree', 'add', '--detach', path, 'HEAD'))
+        logger.info(f"Created worktree {path}")
+        return path
+
+    def _remove(self, path: str) -> None:
+        get_scheduler(self.repo_path).write(
+            lambda: _git(self.repo_path, 'worktree', 'remove', '--force', path))
+        logger.info(f"Removed worktree {path}")
+
+    def _reset(self, path: str) -> None:
+        """Detach and scrub a worktree so the next lease starts clean"""
+        _git(path, 'checkout', '--detach', '--force')
+        _git(path, 'reset', '--hard', '-q')
+        _git(path, 'clean', '-fdxq')
+
+    def warm(self) -> Dict[str, Any]:
+        """Create idle worktrees until the pool is at its target size"""
+        try:
+            with self._lock:
+                self._discover()
+                missing = self.size - len(self._idle)
+            created = [self._create() for _ in range(max(0, missing))]
+            with self._lock:
+                self._idle.extend(created)
+            return {'success': True, 'created': len(created), **self.status()}
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Failed to warm worktree pool: {e}")
+            return {'success': False, 'error': str(e)}
+
+    def lease(self, owner: str, branch: Optional[str] = None, base: str = 'HEAD') -> Dict[str, Any]:
+        """Lease a worktree for a task/session, checked out on its own branch"""
+        branch = branch or f"{WORKTREE_BRANCH_PREFIX}{owner}"
+        if not valid_branch(self.repo_path, branch):
+            return {'success': False, 'error': f"Invalid branch name: {branch!r}", 'invalid': True}
+        started = time.monotonic()
+        try:
+            with self._lock:
+                self._discover()
+                path = self._idle.pop() if self._idle else None
+            warm = path is not None
+            if not warm:
+                path = self._create()
+
+            try:
+                base_commit = _git(self.repo_path, 'rev-parse', '--verify', '--end-of-options',
+                                   f"{base}^{{commit}}").strip()
+                # Reuse the branch if it already exists (e.g. a revised task), otherwise start it at base
+                if run_git(self.repo_path, 'rev-parse', '--verify', '-q', f"refs/heads/{branch}").returncode == 0:
+                    _git(path, 'checkout', '--force', branch, '--')
+                else:
+                    _git(path, 'checkout', '--force', '-b', branch, base_commit, '--')
+            except (RuntimeError, subprocess.TimeoutExpired):
+                with self._lock:
+                    self._idle.append(path)
+                raise
+
+            lease = {
+                'id': str(uuid.uuid4()),
+                'owner': owner,
+                'path': path,
+                'branch': branch,
+                'base_commit': base_commit,
+                'warm': warm,
+                'leased_at': time.time(),
+                'lease_ms': round((time.monotonic() - started) * 1000, 1)
+            }
+            with self._lock:
+                self._leases[lease['id']] = lease
+            logger.info(f"Leased {path} on {branch} to {owner}")
+            return {'success': True, 'lease': lease}
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Failed to lease worktree for {owner}: {e}")
+            return {'success': False, 'error': str(e)}
+
+    def release(self, lease_id: str) -> Dict[str, Any]:
+        """Return a leased worktree; it is reset and recycled, or removed if the pool is full"""
+        with self._lock:
+            lease = self._leases.pop(lease_id, None)
+        if not lease:
+            return {'success': False, 'error': 'Lease not found'}
+
+        path = lease['path']
+        try:
+            self._reset(path)
+            with self._lock:
+                recycle = len(self._idle) < self.size
+                if recycle:
+                    self._idle.append(path)
+            if not recycle:
+                self._remove(path)
+            return {'success': True, 'recycled': recycle, 'branch': lease['branch']}
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            # A worktree we can't reset must not be handed out again
+            logger.error(f"Failed to recycle {path}: {e}")
+            try:
+                self._remove(path)
+            except (RuntimeError, subprocess.TimeoutExpired):
+                pass
+            return {'success': False, 'error': str(e)}
+
+    def get_lease(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Current lease held by an owner, if any"""
+        with self._lock:
+            return next((l for l in self._leases.values() if l['owner'] == owner), None)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'repo': self.repo_path,
+                'root': self.root,
+                'size': self.size,
+                'idle': list(self._idle),
+                'leases': list(self._leases.values())
+            }
+
+_pool: Optional[WorktreePool] = None
+_pool_lock = threading.Lock()
+
+def get_worktree_pool() -> WorktreePool:
+    """Process-wide pool for WORKSPACE_DIR"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorktreePool()
+        return _pool
+
+# Flask route handlers to be imported by inject_agent.py
+def setup_worktree_routes(app):
+    """Setup worktree pool Flask routes"""
+
+    @app.route('/worktrees', methods=['GET'])
+    def worktrees_status_route():
+        """List idle worktrees and active leases"""
+        from flask import jsonify
+        return jsonify(get_worktree_pool().status())
+
+    @app.route('/worktrees/warm', methods=['POST'])
+    def worktrees_warm_route():
+        """Pre-create idle worktrees up to the pool size"""
+        from flask import jsonify
+        result = get_worktree_pool().warm()
+        return jsonify(result), (200 if result['success'] else 500)
+
+    @app.route('/worktrees/lease', methods=['POST'])
+    def worktrees_lease_route():
+        """Lease a worktree; body: {owner, branch?, base?}"""
+        from flask import request, jsonify
+        data = request.get_json() or {}
+        owner = data.get('owner')
+        if not owner:
+            return jsonify({'success': False, 'error': 'No owner provided'}), 400
+        pool = get_worktree_pool()
+        existing = pool.get_lease(owner)
+        if existing:
+            return jsonify({'success': True, 'lease': existing})
+        result = pool.lease(str(owner), data.get('branch'), str(data.get('base', 'HEAD')))
+        if result['success']:
+            return jsonify(result)
+        return jsonify(result), (400 if result.get('invalid') else 500)
+
+    @app.route('/worktrees/<lease_id>/release', methods=['POST'])
+    def worktrees_release_route(lease_id):
+        """Reset and recycle a leased worktree"""
+        from flask import jsonify
+        result = get_worktree_pool().release(lease_id)
+        if result['success']:
+            return jsonify(result)
+        return jsonify(result), (404 if result['error'] == 'Lease not found' else 500)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Idempotency Keys for Noderr's Endpoints
+A POST carrying an `Idempotency-Key` header runs once: its successful response is
+kept for IDEMPOTENCY_TTL and replayed for repeats of the same request, and a repeat
+that arrives while the first is still running waits for its result. Records live
+in the shared state database, so repeats are caught on any worker
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import functools
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', '86400'))  # seconds a result is replayed
+IDEMPOTENCY_WAIT = float(os.environ.get('IDEMPOTENCY_WAIT', '300'))  # seconds a repeat waits for the first run
+IDEMPOTENCY_STALE = float(os.environ.get('IDEMPOTENCY_STALE', '1800'))  # seconds before an unfinished run is retried
+IDEMPOTENCY_POLL = 0.05  # seconds between checks while waiting
+
+class IdempotencyCache:
+    """Per-key records: pending while the first request runs, then its response"""
+
+    PRUNE_EVERY = 200  # claims between sweeps of expired records
+
+    def __init__(self, namespace: str, ttl: float = IDEMPOTENCY_TTL):
+        self._records = get_shared_state().dict(f"idempotency:{namespace}")
+        self.ttl = ttl
+        self._claims = 0
+        self.stats = {'executed': 0, 'replayed': 0, 'waited': 0}
+
+    def claim(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """None if the caller should run the request, else the record it repeats"""
+        now = time.time()
+        self._claims += 1
+        if self._claims % self.PRUNE_EVERY == 0:
+            self.prune()
+        with self._records.edit(key, {}) as record:
+            # A pending record whose request never finished (e.g. its worker died) is taken over
+            stale = record.get('state') == 'pending' and now - record['started'] > IDEMPOTENCY_STALE
+            if not record or record.get('expires', now) < now or stale:
+                record.clear()
+                record.update({'state': 'pending', 'fingerprint': fingerprint, 'started': now})
+                return None
+            return dict(record)
+
+    def complete(self, key: str, fingerprint: str, status: int, body: str, headers: list) -> None:
+        self._records[key] = {
+            'state': 'done', 'fingerprint': fingerprint, 'expires': time.time() + self.ttl,
+            'status': status, 'body': body, 'headers': headers
+        }
+
+    def release(self, key: str) -> None:
+        """Forget a request that didn't succeed, so a retry runs it again"""
+        try:
+            del self._records[key]
+        except KeyError:
+            pass
+
+    def prune(self) -> None:
+        now = time.time()
+        for key, record in self._records.to_dict().items():
+            if record.get('expires', now) < now:
+                self.release(key)
+
+def _complete_when_final(cache: IdempotencyCache, key: str, fingerprint: str,
+                         final: Callable[[], Tuple[int, Any]]) -> None:
+    """Record a streamed response's final result once it is known (the key stays pending until then)"""
+    try:
+        status, body = final()
+    except Exception:
+        logger.exception(f"No final result for idempotent request {key}")
+        return cache.release(key)
+    if 200 <= status < 300:
+        cache.complete(key, fingerprint, status, json.dumps(body), [('Content-Type', 'application/json')])
+    else:
+        cache.release(key)
+
+def idempotent(cache: IdempotencyCache, verify: Optional[Callable[[], bool]] = None) -> Callable:
+    """Decorate a view so requests with an Idempotency-Key header run at most once
+
+    Requests failing verify() (e.g. a bad signature) skip the cache, so they can't claim
+    or probe keys. A streamed response may set `idempotent_result`, a callable that
+    blocks until its final (status, JSON body): repeats wait for that and replay it.
+    """
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request, jsonify, current_app, Response
+            key = request.headers.get('Idempotency-Key')
+            if not key or request.method in ('GET', 'HEAD', 'OPTIONS') or (verify and not verify()):
+                return view(*args, **kwargs)
+            key = f"{request.endpoint}:{key}"
+            fingerprint = hashlib.sha256(f"{request.method} {request.path}\n".encode() + request.get_data()).hexdigest()
+
+            deadline = time.time() + IDEMPOTENCY_WAIT
+            waited = False
+            while True:
+                record = cache.claim(key, fingerprint)
+                if record is None:
+                    break
+                if record['fingerprint'] != fingerprint:
+                    return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+                if record['state'] == 'done':
+                    cache.stats['replayed'] += 1
+                    response = Response(record['body'], record['status'], record['headers'])
+                    response.headers['Idempotent-Replayed'] = 'true'
+                    return response
+                if time.time() > deadline:
+                    return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+                if not waited:
+                    cache.stats['waited'] += 1
+                    waited = True
+                time.sleep(IDEMPOTENCY_POLL)
+
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                cache.release(key)
+                raise
+            cache.stats['executed'] += 1
+            final = getattr(response, 'idempotent_result', None)
+            # Only successful, complete responses are replayed; anything else may be retried
+            if 200 <= response.status_code < 300 and final:
+                threading.Thread(target=_complete_when_final, args=(cache, key, fingerprint, final),
+                                 daemon=True).start()
+            elif 200 <= response.status_code < 300 and not response.is_streamed:
+                headers = [(name, value) for name, value in response.headers if name != 'Content-Length']
+                cache.complete(key, fingerprint, response.status_code, response.get_data(as_text=True), headers)
+            else:
+                cache.release(key)
+            return response
+        return wrapper
+    return decorator
@@ -5,36 +5,53 @@ Receives authenticated commands and injects them into Claude Code CLI via tmux
 """
 
 import os
+import math
 import subprocess
 import hmac
 import hashlib
 import json
 import logging
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import request, jsonify, Response
 from typing import Dict, Any, Optional
 from git_operations import setup_git_routes
+from git_jobs import setup_git_job_routes
+from git_catfile import setup_catfile_routes
+from git_worktrees import setup_worktree_routes, get_worktree_pool, WORKTREE_POOL_SIZE
+from session_pool import setup_session_pool_routes, get_session_pool, STANDBY_SESSIONS
+from startup import get_boot_gate, BOOT_WAIT_TIMEOUT
+from app_factory import create_app, run_app
+from tmux_channel import tmux, send_text
+from local_services import health_cache
+from rate_limit import RateLimiter, parse_overrides, retry_after_header
+from admission import AdmissionQueue, QueueFull
+from idempotency import IdempotencyCache, idempotent
+from batch_executor import BatchExecutor
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+app = create_app(__name__)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-
 # Setup Git routes
 setup_git_routes(app)
+setup_git_job_routes(app)
+setup_catfile_routes(app)
+setup_worktree_routes(app)
+setup_session_pool_routes(app)
 
 # Configuration from environment
-HMAC_SECRET = os.environ.get('HMAC_SECRET', 'default-secret-change-me')
+HMAC_SECRET = os.environ.get('HMAC_SECRET', 'test-secret-change-in-production')
 SESSION_NAME = os.environ.get('SESSION_NAME', 'claude-code')
 ALLOWED_IPS = os.environ.get('ALLOWED_IPS', '').split(',') if os.environ.get('ALLOWED_IPS') else []
-RATE_LIMIT = int(os.environ.get('RATE_LIMIT', '10'))  # commands per minute
+RATE_LIMIT = int(os.environ.get('RATE_LIMIT', '10'))  # commands per minute, per client
+RATE_BURST = int(os.environ.get('RATE_BURST', str(RATE_LIMIT)))  # commands a client may send at once
+RATE_LIMIT_OVERRIDES = os.environ.get('RATE_LIMIT_OVERRIDES', '')  # e.g. "orchestrator=60:20,ui=10"; the only X-Client-Ids honoured
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'shared')  # shared (all workers) or local
+RATE_LIMIT_MODE = os.environ.get('RATE_LIMIT_MODE', 'queue')  # queue over-limit commands, or reject them (429)
 
-# In-memory rate limiting (simple implementation)
-command_history: list = []
+# Token buckets per client; the shared backend holds limits across worker processes
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST, backend=RATE_LIMIT_BACKEND,
+                           namespace='inject-rate', overrides=parse_overrides(RATE_LIMIT_OVERRIDES))
 
 def verify_hmac(command: str, signature: str) -> bool:
     """Verify HMAC signature for command authentication"""
@@ -45,69 +62,64 @@ def verify_hmac(command: str, signature: str) -> bool:
     ).hexdigest()
     return hmac.compare_digest(signature, expected)
 
-def check_rate_limit() -> bool:
-    """Simple rate limiting check"""
-    now = datetime.now()
-    # Remove commands older than 1 minute
-    global command_history
-    command_history = [t for t in command_history if (now - t).seconds < 60]
-    
-    if len(command_history) >= RATE_LIMIT:
+def signed_request() -> bool:
+    """Whether an /inject or /execute body carries a valid signature"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('signature'), str):
         return False
-    
-    command_history.append(now)
-    return True
+    payload = json.dumps(data['commands'], sort_keys=True) if 'commands' in data else data.get('command')
+    return isinstance(payload, str) and verify_hmac(payload, data['signature'])
+
+def client_key() -> str:
+    """Whom a request counts against: the caller's IP, or an X-Client-Id with a configured override
+
+    Every signed caller shares one secret, so a free-form X-Client-Id would let any of
+    them claim a fresh bucket per request; only the ids in RATE_LIMIT_OVERRIDES count.
+    """
+    client_id = request.headers.get('X-Client-Id')
+    if client_id and client_id in rate_limiter.overrides:
+        return client_id
+    return f"ip:{request.headers.get('Fly-Client-IP') or request.remote_addr}"
+
+def rate_limited_response(retry_after: float):
+    response = jsonify({'error': 'Rate limit exceeded', 'retry_after': round(retry_after, 1)})
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response, 429
 
 def inject_command(command: str) -> Dict[str, Any]:
     """Inject command into tmux session"""
     try:
+        # A missing/dead session is replaced by a booted standby (or a cold boot we wait
+        # out), never recreated here and typed into before the CLI is ready
+        session = get_session_pool().ensure()
+        if not session['success']:
+            logger.warning(f"No ready Claude session: {session['error']}")
+        elif session['swapped']:
+            logger.info(f"Swapped in standby {session['from']} as {SESSION_NAME}")
+        
         # Try as claude-user first (where Claude is actually running)
-        check_session = subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'has-session', '-t', SESSION_NAME],
-            capture_output=True,
-            text=True
-        )
+        check_session = tmux('has-session', '-t', SESSION_NAME)
         
         if check_session.returncode == 0:
             # Check if session is actually alive by trying to list it
-            list_check = subprocess.run(
-                ['sudo', '-u', 'claude-user', 'tmux', 'list-sessions'],
-                capture_output=True,
-                text=True
-            )
+            list_check = tmux('list-sessions')
             
             if SESSION_NAME in list_check.stdout:
                 # Session exists and is alive, inject there
-                result = subprocess.run([
-                    'sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', SESSION_NAME, command
-                ], capture_output=True, text=True)
-                
-                if result.returncode == 0:
-                    # Send Enter key
-                    result = subprocess.run([
-                        'sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', SESSION_NAME, 'C-m'
-                    ], capture_output=True, text=True)
+                # Long or multi-line commands go through a paste buffer, then Enter
+                result = send_text(SESSION_NAME, command)
                 
                 if result.returncode == 0:
                     logger.info(f"Injected command to claude-user session: {command[:50]}...")
-                    return {'success': True, 'message': 'Command injected'}
+                    return {'success': True, 'message': 'Command injected', 'swapped': session.get('swapped', False)}
                 elif "server exited unexpectedly" in result.stderr or "no server running" in result.stderr:
-                    # Session died, recreate it
-                    logger.warning("Claude session died, recreating...")
-                    subprocess.run([
-                        'sudo', '-u', 'claude-user', 'tmux', 'new-session', '-d', '-s', SESSION_NAME,
-                        'cd /workspace && claude --dangerously-skip-permissions'
-                    ])
-                    # Try injection again
-                    result = subprocess.run([
-                        'sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', SESSION_NAME, command
-                    ], capture_output=True, text=True)
-                    if result.returncode == 0:
-                        result = subprocess.run([
-                            'sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', SESSION_NAME, 'C-m'
-                        ], capture_output=True, text=True)
-                    if result.returncode == 0:
-                        return {'success': True, 'message': 'Command injected after session restart'}
+                    # Session died between the check and the send: swap in a standby and retry once
+                    logger.warning("Claude session died, swapping in a standby...")
+                    session = get_session_pool().ensure()
+                    if session['success']:
+                        result = send_text(SESSION_NAME, command)
+                        if result.returncode == 0:
+                            return {'success': True, 'message': 'Command injected after session swap', 'swapped': True}
         
         # Try as root (fallback)
         check_session = subprocess.run(
@@ -124,16 +136,8 @@ def inject_command(command: str) -> Dict[str, Any]:
             ])
             logger.info(f"Created new tmux session: {SESSION_NAME}")
         
-        # Inject command with proper Enter key
-        result = subprocess.run([
-            'tmux', 'send-keys', '-t', SESSION_NAME, command
-        ], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            # Send Enter key
-            result = subprocess.run([
-                'tmux', 'send-keys', '-t', SESSION_NAME, 'C-m'
-            ], capture_output=True, text=True)
+        # Inject command with proper Enter key (pasted like above when it's long)
+        result = send_text(SESSION_NAME, command, run_as='')
         
         if result.returncode == 0:
             logger.info(f"Injected command: {command[:50]}...")
@@ -146,6 +150,36 @@ def inject_command(command: str) -> Dict[str, Any]:
         logger.exception("Error injecting command")
         return {'success': False, 'message': str(e)}
 
+# Replays of /inject and /execute requests that carry an Idempotency-Key
+idempotency_cache = IdempotencyCache('inject-agent')
+
+# Over-limit commands wait here for their client's tokens (RATE_LIMIT_MODE=queue)
+admission_queue = AdmissionQueue(inject_command, rate_limiter,
+                                 ready=lambda: get_boot_gate().is_open())
+# Started with the app (not only under __main__) so each gunicorn worker competes for
+# the dispatch lock and commands queued before a restart go out without a new request
+admission_queue.start()
+
+def queued_response(ticket: Dict[str, Any]):
+    """202 with the ticket to poll for a command that waits in the admission queue"""
+    response = jsonify({'success': True, 'queued': True, **ticket})
+    response.headers['Location'] = f"/inject/tickets/{ticket['ticket']}"
+    return response, 202
+
+def capture_session() -> Optional[str]:
+    """Recent output of the Claude session (batch completion checks read it)"""
+    result = tmux('capture-pane', '-t', SESSION_NAME, '-p', '-S', '-50')
+    return result.stdout if result.returncode == 0 else None
+
+# Runs /execute batches: delays on a timer wheel, results per command as they finish
+batch_executor = BatchExecutor(inject_command, capture_session)
+
+def booting_response():
+    """503 for a request that waited out BOOT_WAIT_TIMEOUT during boot"""
+    response = jsonify({'error': 'Still booting', 'waited_s': BOOT_WAIT_TIMEOUT})
+    response.headers['Retry-After'] = '10'
+    return response, 503
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -153,10 +187,7 @@ def health_check():
     claude_running = False
     
     # Check claude-user session
-    result = subprocess.run([
-        'sudo', '-u', 'claude-user', 'tmux', 'has-session', '-t', SESSION_NAME
-    ], capture_output=True)
-    if result.returncode == 0:
+    if health_cache.get(f"tmux:{SESSION_NAME}", lambda: tmux('has-session', '-t', SESSION_NAME).returncode == 0):
         claude_running = True
     
     # Check root session if user session not found
@@ -174,6 +205,7 @@ def health_check():
     })
 
 @app.route('/inject', methods=['POST'])
+@idempotent(idempotency_cache, verify=signed_request)
 def inject():
     """Main injection endpoint"""
     # IP allowlisting
@@ -181,10 +213,6 @@ def inject():
         logger.warning(f"Rejected request from unauthorized IP: {request.remote_addr}")
         return jsonify({'error': 'Unauthorized'}), 403
     
-    # Rate limiting
-    if not check_rate_limit():
-        return jsonify({'error': 'Rate limit exceeded'}), 429
-    
     # Parse request
     try:
         data = request.get_json()
@@ -198,6 +226,29 @@ def inject():
         logger.warning("Invalid HMAC signature")
         return jsonify({'error': 'Invalid signature'}), 401
     
+    # Rate limiting (after the signature, so only signed callers can claim an override's X-Client-Id)
+    client = client_key()
+    if RATE_LIMIT_MODE == 'queue' and admission_queue.has_queued(client):
+        allowed, retry_after = False, 0.0  # stay behind this client's queued commands
+    else:
+        allowed, retry_after = rate_limiter.acquire(client)
+    if not allowed:
+        if RATE_LIMIT_MODE != 'queue':
+            return rate_limited_response(retry_after)
+        try:
+            max_wait = float(data['max_wait']) if data.get('max_wait') is not None else None
+            if max_wait is not None and not (math.isfinite(max_wait) and max_wait > 0):
+                raise ValueError(max_wait)
+            return queued_response(admission_queue.enqueue(client, command, max_wait))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid max_wait'}), 400
+        except QueueFull:
+            return rate_limited_response(max(retry_after, 1))
+    
+    # Requests arriving while the container boots wait for it instead of failing
+    if not get_boot_gate().wait():
+        return booting_response()
+    
     # Inject command
     result = inject_command(command)
     
@@ -206,6 +257,14 @@ def inject():
     else:
         return jsonify(result), 500
 
+@app.route('/inject/tickets/<ticket>', methods=['GET'])
+def inject_ticket(ticket):
+    """Position or outcome of a command held in the admission queue"""
+    info = admission_queue.ticket(ticket)
+    if info is None:
+        return jsonify({'error': 'Ticket not found'}), 404
+    return jsonify(info)
+
 @app.route('/status', methods=['GET'])
 def status():
     """Get tmux session status"""
@@ -214,10 +273,7 @@ def status():
         current_output = None
         
         # Try claude-user sessions first
-        result = subprocess.run([
-            'sudo', '-u', 'claude-user', 'tmux', 'list-sessions', '-F',
-            '#{session_name}:#{session_created}:#{session_attached}'
-        ], capture_output=True, text=True)
+        result = tmux('list-sessions', '-F', '#{session_name}:#{session_created}:#{session_attached}')
         
         logger.info(f"Claude-user tmux list result: return={result.returncode}, stdout={result.stdout[:100]}, stderr={result.stderr}")
         
@@ -232,10 +288,7 @@ def status():
                     })
             
             # Try to capture from claude-user session
-            capture = subprocess.run([
-                'sudo', '-u', 'claude-user', 'tmux', 'capture-pane', 
-                '-t', SESSION_NAME, '-p', '-S', '-30'  # Get last 30 lines
-            ], capture_output=True, text=True)
+            capture = tmux('capture-pane', '-t', SESSION_NAME, '-p', '-S', '-30')  # Get last 30 lines
             if capture.returncode == 0:
                 current_output = capture.stdout
             else:
@@ -269,8 +322,11 @@ def status():
             'sessions': sessions,
             'current_output': current_output,
             'rate_limit': {
-                'current': len(command_history),
-                'limit': RATE_LIMIT
+                'client': client_key(),
+                'remaining': int(rate_limiter.remaining(client_key())),
+                'limit': RATE_LIMIT,
+                'burst': RATE_BURST,
+                'queued': admission_queue.queued()
             }
         })
         
@@ -279,8 +335,14 @@ def status():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/execute', methods=['POST'])
+@idempotent(idempotency_cache, verify=signed_request)
 def execute_batch():
-    """Execute a batch of commands with delays"""
+    """Execute a batch of commands with delays
+    
+    Options: wait_for_completion (let Claude finish each command before the next
+    one's delay starts), fail_fast (stop at the first failed command) and stream
+    (or Accept: application/x-ndjson) for one JSON line per event as it happens.
+    """
     try:
         data = request.get_json()
         commands = data['commands']  # List of {command, delay_ms}
@@ -291,24 +353,61 @@ def execute_batch():
         if not verify_hmac(batch_str, signature):
             return jsonify({'error': 'Invalid signature'}), 401
         
-        results = []
-        for cmd_data in commands:
-            command = cmd_data['command']
-            delay = cmd_data.get('delay_ms', 0)
-            
-            # Add delay if specified
-            if delay > 0:
-                subprocess.run(['sleep', str(delay/1000)])
-            
-            result = inject_command(command)
-            results.append(result)
+        if not all(isinstance(c, dict) and isinstance(c.get('command'), str) and
+                   isinstance(c.get('delay_ms', 0), (int, float)) for c in commands):
+            return jsonify({'error': 'Each command needs a command string and an optional numeric delay_ms'}), 400
+        
+        if not get_boot_gate().wait():
+            return booting_response()
+        
+        batch = batch_executor.submit(commands, wait_for_completion=bool(data.get('wait_for_completion')),
+                                      fail_fast=bool(data.get('fail_fast')))
+        
+        if data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson':
+            response = Response((json.dumps(event) + '\n' for event in batch.stream()),
+                                mimetype='application/x-ndjson')
+            response.headers['X-Batch-Id'] = batch.id
+            response.headers['X-Accel-Buffering'] = 'no'
+            # A repeat with the same Idempotency-Key waits for the batch and gets its summary
+            def final_result():
+                batch.done.wait()
+                return 200, batch.summary()
+            response.idempotent_result = final_result
+            return response
         
-        return jsonify({'results': results}), 200
+        batch.done.wait()
+        return jsonify(batch.summary()), 200
         
     except Exception as e:
         logger.exception("Error executing batch")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/execute/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    """Results so far of a batch (from any worker)"""
+    status = batch_executor.status(batch_id)
+    if status is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify({'batch_id': batch_id, **status})
+
+@app.route('/execute/<batch_id>/cancel', methods=['POST'])
+def cancel_batch(batch_id):
+    """Cancel a running batch; signature is the HMAC of the batch id"""
+    data = request.get_json(silent=True) or {}
+    if not verify_hmac(batch_id, data.get('signature', '')):
+        return jsonify({'error': 'Invalid signature'}), 401
+    if not batch_executor.cancel(batch_id):
+        return jsonify({'error': 'Batch not found or already finished'}), 404
+    return jsonify({'success': True, 'batch_id': batch_id})
+
 if __name__ == '__main__':
+    # Pre-create worktrees in the background so the first lease is a warm one
+    if WORKTREE_POOL_SIZE > 0:
+        threading.Thread(target=get_worktree_pool().warm, daemon=True).start()
+    
+    # Keep booted Claude sessions on standby so a dead session is swapped, not cold-started
+    if STANDBY_SESSIONS > 0:
+        get_session_pool().start()
+    
     # For development - in production use gunicorn
-    app.run(host='0.0.0.0', port=8080, debug=False)
\ No newline at end of file
+    run_app(app, 8080)
\ No newline at end of file
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Calls Between Noderr's Local Services
+Routes a call to another service over localhost HTTP or, when the gateway has
+mounted that service in the same process, straight into its Flask app. Also holds
+the process-wide health cache the services' health checks share
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from app_factory import lazy_import
+
+requests = lazy_import('requests')  # only loaded once a service is called over HTTP
+
+HEALTH_CACHE_TTL = float(os.environ.get('HEALTH_CACHE_TTL', '5'))  # seconds a health probe result is reused
+
+# Where each service listens when it runs as its own process
+SERVICE_URLS = {
+    'noderr-api': os.environ.get('NODERR_API_URL', 'http://localhost:8080'),
+    'inject-agent': os.environ.get('INJECT_AGENT_URL', 'http://localhost:8082'),
+    'claude-auth': os.environ.get('CLAUDE_AUTH_URL', 'http://localhost:8083'),
+    'claude-relay': os.environ.get('CLAUDE_RELAY_URL', 'http://localhost:8084'),
+}
+
+_local_apps: Dict[str, Any] = {}
+
+def mount(name: str, app) -> None:
+    """Serve calls to `name` in-process from now on (used by the gateway)"""
+    _local_apps[name] = app
+
+class LocalResponse:
+    """The parts of requests.Response that callers use, over a Flask response"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    @property
+    def text(self) -> str:
+        return self._response.get_data(as_text=True)
+
+    def json(self) -> Any:
+        return json.loads(self._response.get_data())
+
+def call_service(name: str, method: str, path: str, json_body: Any = None, timeout: float = 10):
+    """Call another service's route; returns a requests.Response-like object
+
+    In-process calls hand json_body to the view as the already-parsed request
+    JSON, so it is never encoded, and skip the socket and HTTP parsing.
+    """
+    app = _local_apps.get(name)
+    if app is None:
+        return requests.request(method, SERVICE_URLS[name] + path, json=json_body, timeout=timeout)
+    with app.test_request_context(path, method=method,
+                                  content_type='application/json' if json_body is not None else None):
+        from flask import request
+        if json_body is not None:
+            request._cached_json = (json_body, json_body)
+        response = app.full_dispatch_request()
+    return LocalResponse(response)
+
+class HealthCache:
+    """Health probe results reused for HEALTH_CACHE_TTL, with one probe in flight per key"""
+
+    def __init__(self, ttl: float = HEALTH_CACHE_TTL):
+        self.ttl = ttl
+        self._values: Dict[str, tuple] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'probes': 0}
+
+    def get(self, key: str, probe: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            cached = self._values.get(key)
+            if cached and time.monotonic() - cached[0] < ttl:
+                self.stats['hits'] += 1
+                return cached[1]
+            self.stats['probes'] += 1
+            value = probe()
+            self._values[key] = (time.monotonic(), value)
+            return value
+
+health_cache = HealthCache()
@@ -8,20 +8,32 @@ import os
 import json
 import uuid
 import re
-import requests
 from datetime import datetime
-from flask import Flask, request, jsonify, Response
-from flask_cors import CORS
+from flask import request, jsonify, Response
 import time
-from collections import deque
+import hmac
+import hashlib
+import tempfile
+from git_operations import get_head_commit, get_range_diff, is_commit, setup_commit_task_route
+from app_factory import create_app, run_app
+from tmux_channel import tmux, send_text
+from local_services import call_service, health_cache
+from shared_state import get_shared_state
+from idempotency import IdempotencyCache, idempotent
 
-app = Flask(__name__)
-CORS(app, origins="*", allow_headers=["Content-Type"], methods=["GET", "POST", "PATCH", "OPTIONS"])
+app = create_app(__name__, cors_methods=["GET", "POST", "PATCH", "OPTIONS"])
 
-# In-memory storage (replace with database in production)
-projects = {}
-tasks = {}
-sse_clients = []
+WORKSPACE_DIR = os.environ.get('WORKSPACE_DIR', '/workspace')
+HMAC_SECRET = os.environ.get('HMAC_SECRET', 'test-secret-change-in-production')
+# Content-addressed store for computed task diffs (survives restarts on the /data volume)
+CHANGES_DIR = os.environ.get('CHANGES_DIR', '/data/task-changes')
+
+# Shared by every worker process (see shared_state.py)
+projects = get_shared_state().dict('projects')
+tasks = get_shared_state().dict('tasks')
+sse_state = get_shared_state().dict('sse')
+sse_events = get_shared_state().event_log('sse')
+idempotency_cache = IdempotencyCache('noderr-api')
 
 # Sample project for testing
 default_project = {
@@ -31,34 +43,39 @@ default_project = {
     "branch": "main",
     "created": datetime.now().isoformat()
 }
-projects["default"] = default_project
+_default_seeded = False
 
-@app.route('/health', methods=['GET', 'OPTIONS'])
-def health():
-    """Health check endpoint"""
-    if request.method == 'OPTIONS':
-        return '', 204
-    
-    # Check Claude status via the auth service
-    claude_session = False
+@app.before_request
+def seed_default_project():
+    """Add the sample project on the first request (importing the module leaves the database alone)"""
+    global _default_seeded
+    if not _default_seeded:
+        projects.setdefault("default", default_project)
+        _default_seeded = True
+
+def claude_session_running():
+    """Claude session state as the auth service reports it, tmux as the fallback"""
     try:
         # Check with claude-auth service
-        resp = requests.get('http://localhost:8083/claude/auth/verify', timeout=5)
+        resp = call_service('claude-auth', 'GET', '/claude/auth/verify', timeout=5)
         if resp.status_code == 200:
-            data = resp.json()
-            claude_session = data.get('authenticated', False)
+            return resp.json().get('authenticated', False)
+        return False
     except:
         # If auth service is down, check tmux directly as fallback
         try:
-            import subprocess
-            result = subprocess.run(
-                ['sudo', '-u', 'claude-user', 'tmux', 'has-session', '-t', 'claude-code'],
-                capture_output=True,
-                timeout=3
-            )
-            claude_session = (result.returncode == 0)
+            return tmux('has-session', '-t', 'claude-code', timeout=3).returncode == 0
         except:
-            claude_session = False
+            return False
+
+@app.route('/health', methods=['GET', 'OPTIONS'])
+def health():
+    """Health check endpoint"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    # Check Claude status via the auth service
+    claude_session = health_cache.get('noderr-api:claude-session', claude_session_running)
     
     return jsonify({
         'status': 'healthy',
@@ -94,6 +111,7 @@ def handle_projects():
         return jsonify(project), 201
 
 @app.route('/tasks', methods=['GET', 'POST', 'OPTIONS'])
+@idempotent(idempotency_cache)
 def handle_tasks():
     """Get tasks for a project or create a new task"""
     if request.method == 'OPTIONS':
@@ -134,17 +152,27 @@ def update_task(task_id):
         return jsonify({'error': 'Task not found'}), 404
     
     data = request.json
-    task = tasks[task_id]
-    
-    # Update allowed fields
-    if 'status' in data:
-        task['status'] = data['status']
-    if 'progress' in data:
-        task['progress'] = data['progress']
-    if 'agentId' in data:
-        task['agentId'] = data['agentId']
+    # Commits are passed to git: only full SHAs of real commits are accepted
+    for field in ('baseCommit', 'headCommit'):
+        if data.get(field) and not is_commit(WORKSPACE_DIR, data[field]):
+            return jsonify({'error': f"{field} must be the full SHA of a commit"}), 400
     
-    task['updated'] = datetime.now().isoformat()
+    with tasks.edit(task_id) as task:
+        # Update allowed fields
+        if 'status' in data:
+            record_task_commits(task, data['status'])
+            task['status'] = data['status']
+        # The orchestrator may report the exact range it worked on
+        for field in ('baseCommit', 'headCommit'):
+            if data.get(field):
+                task[field] = data[field]
+                task.pop('changesDigest', None)
+        if 'progress' in data:
+            task['progress'] = data['progress']
+        if 'agentId' in data:
+            task['agentId'] = data['agentId']
+        
+        task['updated'] = datetime.now().isoformat()
     
     # Notify SSE clients
     notify_sse('task:updated', task)
@@ -160,9 +188,9 @@ def approve_task(task_id):
     if task_id not in tasks:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = tasks[task_id]
-    task['status'] = 'pushed'
-    task['pushedAt'] = datetime.now().isoformat()
+    with tasks.edit(task_id) as task:
+        task['status'] = 'pushed'
+        task['pushedAt'] = datetime.now().isoformat()
     
     # Notify SSE clients
     notify_sse('task:completed', task)
@@ -178,48 +206,110 @@ def revise_task(task_id):
     if task_id not in tasks:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = tasks[task_id]
-    task['status'] = 'ready'
-    task['revised'] = True
+    with tasks.edit(task_id) as task:
+        task['status'] = 'ready'
+        task['revised'] = True
     
     # Notify SSE clients
     notify_sse('task:updated', task)
     
     return jsonify({'success': True, 'task': task})
 
+def record_task_commits(task, new_status):
+    """Pin the commit a task starts from and the commit it finishes at"""
+    if new_status == 'working' and task.get('status') != 'working':
+        task['baseCommit'] = get_head_commit(WORKSPACE_DIR)
+        task.pop('headCommit', None)
+        task.pop('changesDigest', None)
+    elif new_status == 'review' and task.get('baseCommit'):
+        task['headCommit'] = get_head_commit(WORKSPACE_DIR)
+        task.pop('changesDigest', None)
+
+def store_changes(changes):
+    """Write a change set to the content-addressed store and return its digest"""
+    payload = json.dumps(changes, sort_keys=True).encode()
+    digest = hashlib.sha256(payload).hexdigest()
+    path = os.path.join(CHANGES_DIR, f"{digest}.json")
+    if not os.path.exists(path):
+        os.makedirs(CHANGES_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CHANGES_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    return digest
+
+def load_changes(digest):
+    """Read a change set from the content-addressed store (None if missing)"""
+    try:
+        with open(os.path.join(CHANGES_DIR, f"{digest}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
 @app.route('/tasks/<task_id>/changes', methods=['GET', 'OPTIONS'])
 def get_task_changes(task_id):
-    """Get changes for a task"""
+    """Get changes for a task (diff between its base and head commits)"""
     if request.method == 'OPTIONS':
         return '', 204
     
-    # Mock response for now
-    return jsonify({
-        'diff': '+ Added new feature\n- Removed old code\n~ Modified existing function'
-    })
+    if task_id not in tasks:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    task = tasks[task_id]
+    base = task.get('baseCommit')
+    head = task.get('headCommit')
+    if not base:
+        return jsonify({'diff': '', 'files': [], 'stats': None, 'error': 'Task has no recorded base commit'})
+    
+    # Finished tasks have an immutable range: serve the stored change set
+    if head and task.get('changesDigest'):
+        changes = load_changes(task['changesDigest'])
+        if changes:
+            return jsonify({**changes, 'digest': task['changesDigest'], 'cached': True})
+    
+    # Still running tasks are compared against the live worktree and never stored
+    changes = get_range_diff(WORKSPACE_DIR, base, head)
+    if not changes['success']:
+        return jsonify({'error': changes['error'], 'diff': '', 'files': []}), 500
+    
+    changes.pop('success')
+    if not head:
+        return jsonify({**changes, 'live': True, 'cached': False})
+    
+    try:
+        digest = store_changes(changes)
+    except OSError as e:
+        return jsonify({**changes, 'cached': False, 'store_error': str(e)})
+    with tasks.edit(task_id) as task:
+        # Only if the task still has the range the diff was computed for
+        if task.get('baseCommit') == base and task.get('headCommit') == head:
+            task['changesDigest'] = digest
+    return jsonify({**changes, 'digest': digest, 'cached': False})
 
 @app.route('/sse')
 def sse():
-    """Server-sent events endpoint"""
+    """Server-sent events endpoint (events from every worker, resumable with Last-Event-ID)"""
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = sse_events.last_id()
+    
     def generate():
-        client_queue = deque(maxlen=100)
-        sse_clients.append(client_queue)
+        nonlocal last_id
+        sse_state.incr('clients')
         
         # Send initial ping
         yield f"data: {json.dumps({'type': 'ping'})}\n\n"
         
         try:
             while True:
-                # Check for messages
-                if client_queue:
-                    event_type, data = client_queue.popleft()
-                    yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
-                else:
-                    # Send heartbeat every 30 seconds
-                    time.sleep(1)
+                events = sse_events.wait(last_id, timeout=1)
+                for last_id, event_type, data in events:
+                    yield f"id: {last_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+                if not events:
+                    # Heartbeat after a second without events
                     yield f": heartbeat\n\n"
-        except GeneratorExit:
-            sse_clients.remove(client_queue)
+        finally:
+            sse_state.incr('clients', -1)
     
     response = Response(generate(), mimetype='text/event-stream')
     response.headers['Cache-Control'] = 'no-cache'
@@ -228,11 +318,26 @@ def sse():
 
 def notify_sse(event_type, data):
     """Notify all SSE clients of an event"""
-    for client_queue in sse_clients:
-        try:
-            client_queue.append((event_type, data))
-        except:
-            pass
+    sse_events.append(event_type, data)
+
+@app.route('/internal/events', methods=['POST'])
+def internal_events():
+    """Relay events from local services (e.g. the session supervisor) to SSE clients"""
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    if not data.get('type'):
+        return jsonify({'error': 'Event type required'}), 400
+    notify_sse(data['type'], data.get('data', {}))
+    return jsonify({'success': True, 'clients': sse_state.get('clients', 0)})
+
+def signed_request():
+    """Whether X-Signature is the HMAC of the raw request body"""
+    expected = hmac.new(HMAC_SECRET.encode(), request.get_data(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(request.headers.get('X-Signature', ''), expected)
+
+# Only the signed commit pipeline is public; the other git routes stay on inject-agent
+setup_commit_task_route(app, notify=notify_sse, verify=signed_request)
 
 @app.route('/brainstorm', methods=['POST', 'OPTIONS'])
 def brainstorm():
@@ -256,22 +361,12 @@ Suggest 3-5 specific, actionable development tasks. Format as JSON array:
 Only return the JSON array, nothing else."""
     
     try:
-        import subprocess
-        
         # First, clear any existing command and cancel if Claude is processing
-        subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', 'claude-code', 'C-c'],
-            capture_output=True,
-            timeout=2
-        )
+        tmux('send-keys', '-t', 'claude-code', 'C-c', timeout=2)
         time.sleep(0.5)
         
         # Send the prompt to Claude
-        subprocess.run(
-            ['sudo', '-u', 'claude-user', 'tmux', 'send-keys', '-t', 'claude-code', claude_prompt, 'C-m'],
-            capture_output=True,
-            timeout=5
-        )
+        send_text('claude-code', claude_prompt, timeout=5)
         
         # Wait for Claude to process (Claude usually takes 3-10 seconds)
         max_attempts = 20  # 20 seconds max
@@ -281,12 +376,7 @@ Only return the JSON array, nothing else."""
             time.sleep(1)
             
             # Capture Claude's output
-            result = subprocess.run(
-                ['sudo', '-u', 'claude-user', 'tmux', 'capture-pane', '-t', 'claude-code', '-p'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
+            result = tmux('capture-pane', '-t', 'claude-code', '-p', timeout=5)
             
             output = result.stdout
             
@@ -340,9 +430,9 @@ def proxy_relay():
         return '', 204
     
     try:
-        resp = requests.post(
-            'http://localhost:8084/relay',
-            json=request.json,
+        resp = call_service(
+            'claude-relay', 'POST', '/relay',
+            json_body=request.json,
             timeout=60  # Longer timeout for Claude processing
         )
         return resp.json(), resp.status_code
@@ -356,7 +446,7 @@ def proxy_relay_health():
         return '', 204
     
     try:
-        resp = requests.get('http://localhost:8084/health', timeout=5)
+        resp = call_service('claude-relay', 'GET', '/health', timeout=5)
         return resp.json(), resp.status_code
     except Exception as e:
         return jsonify({'error': f'Relay service unavailable: {str(e)}'}), 503
@@ -365,7 +455,7 @@ def proxy_relay_health():
 def proxy_relay_test():
     """Proxy to relay test page"""
     try:
-        resp = requests.get('http://localhost:8084/test', timeout=5)
+        resp = call_service('claude-relay', 'GET', '/test', timeout=5)
         return resp.text, resp.status_code, {'Content-Type': 'text/html'}
     except Exception as e:
         return f'<h1>Error: Relay service unavailable - {str(e)}</h1>', 503
@@ -378,14 +468,14 @@ def proxy_claude_auth(path):
     
     try:
         # Forward to auth handler
-        auth_url = f'http://localhost:8083/claude/auth/{path}'
+        auth_path = f'/claude/auth/{path}'
         
         if request.method == 'GET':
-            resp = requests.get(auth_url, timeout=10)
+            resp = call_service('claude-auth', 'GET', auth_path, timeout=10)
         else:
-            resp = requests.post(
-                auth_url,
-                json=request.json if request.is_json else None,
+            resp = call_service(
+                'claude-auth', 'POST', auth_path,
+                json_body=request.json if request.is_json else None,
                 timeout=10
             )
         
@@ -401,9 +491,12 @@ def index():
         'version': '1.0',
         'endpoints': [
             '/health',
+            '/livez',
+            '/readyz',
             '/projects',
             '/tasks',
             '/brainstorm',
+            '/git/*',
             '/claude/auth/*',
             '/sse'
         ],
@@ -411,5 +504,4 @@ def index():
     })
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    run_app(app, 8080)
\ No newline at end of file
@@ -8,21 +8,23 @@ import subprocess
 import re
 import time
 import json
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from flask import request, jsonify
 import threading
+from app_factory import create_app, run_app, DEFAULT_CORS_METHODS
+from shared_state import get_shared_state
 
-app = Flask(__name__)
-CORS(app)  # Allow UI to call this
+app = create_app(__name__, cors_methods=DEFAULT_CORS_METHODS)  # Allow UI to call this
 
-# Global state
-oauth_state = {
+# Global state, shared by every worker process
+oauth_state = get_shared_state().dict('oauth')
+for key, value in {
     "status": "idle",  # idle, waiting_for_url, waiting_for_code, authenticating, authenticated
     "auth_url": None,
     "auth_code": None,
     "error": None,
     "session_active": False
-}
+}.items():
+    oauth_state.setdefault(key, value)
 
 def get_claude_oauth_url():
     """Start Claude login and capture the OAuth URL"""
@@ -207,7 +209,7 @@ def oauth_status():
     except:
         oauth_state["session_active"] = False
     
-    return jsonify(oauth_state)
+    return jsonify(oauth_state.to_dict())
 
 @app.route('/oauth/health', methods=['GET'])
 def health():
@@ -227,4 +229,4 @@ if __name__ == '__main__':
     print("  GET /oauth/status - Check status")
     print("  GET /oauth/health - Health check")
     
-    app.run(host='0.0.0.0', port=8085, debug=False)
\ No newline at end of file
+    run_app(app, 8085)
\ No newline at end of file
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Local benchmark: typing prompts with send-keys vs. pasting them from a buffer
+Types prompts of increasing size into a tmux pane running `cat` and times how
+long each takes to arrive in full, once as one send-keys argument (the old
+injection path) and once through load-buffer and paste-buffer (send_text).
+Uses the configured TMUX_CHANNEL and TMUX_RUN_AS
+"""
+
+import os
+import time
+import statistics
+import subprocess
+
+from tmux_channel import tmux, send_text, tmux_argv, TMUX_CHANNEL
+
+SIZES = [int(s) for s in os.environ.get('BENCH_SIZES', '1024,8192,65536,262144').split(',')]
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '5'))
+ARRIVAL_TIMEOUT = 60  # seconds for one prompt to show up in the output file
+SESSION = 'noderr-paste-bench'
+
+def prompt(size: int) -> str:
+    """Multi-line text of about `size` characters, like a long task prompt"""
+    line = 'Implement the next task in the plan and update the tracker when done. ' * 2
+    lines, total = [], 0
+    while total < size:
+        lines.append(line[:min(len(line), size - total - 1)])
+        total += len(lines[-1]) + 1
+    return '\n'.join(lines)
+
+def send_keys(target: str, text: str) -> subprocess.CompletedProcess:
+    result = tmux('send-keys', '-t', target, text, timeout=ARRIVAL_TIMEOUT)
+    if result.returncode == 0:
+        result = tmux('send-keys', '-t', target, 'C-m', timeout=ARRIVAL_TIMEOUT)
+    return result
+
+def arrival_time(method, output: str, text: str):
+    """Seconds from sending until all of text is in the output file, or None if it failed"""
+    expected = os.path.getsize(output) + len(text.encode()) + 1
+    started = time.perf_counter()
+    try:
+        result = method(SESSION, text)
+    except (OSError, subprocess.TimeoutExpired):
+        return None  # e.g. an argument longer than the kernel allows
+    if result.returncode != 0:
+        return None
+    while os.path.getsize(output) < expected:
+        if time.perf_counter() - started > ARRIVAL_TIMEOUT:
+            return None
+        time.sleep(0.001)
+    return time.perf_counter() - started
+
+def main():
+    print("=" * 60)
+    print(f"LOCAL TEST: prompt injection by size (TMUX_CHANNEL={TMUX_CHANNEL})")
+    print("=" * 60)
+
+    output = f"/tmp/noderr-paste-bench-{os.getpid()}.txt"
+    open(output, 'w').close()
+    os.chmod(output, 0o666)  # written by the pane, which may belong to TMUX_RUN_AS
+    # Non-canonical mode so long lines aren't cut at the tty's line limit
+    tmux('new-session', '-d', '-s', SESSION, '-x', '200', '-y', '50',
+         f"stty -echo -icanon; exec cat > {output}")
+    time.sleep(0.5)
+    try:
+        methods = [('send-keys', send_keys), ('paste-buffer', lambda t, s: send_text(t, s, timeout=ARRIVAL_TIMEOUT))]
+        print(f"{'size':>8}  {'method':<14}{'p50 ms':>10}{'MB/s':>10}")
+        for size in SIZES:
+            text = prompt(size)
+            for name, method in methods:
+                times = [arrival_time(method, output, text) for _ in range(ROUNDS)]
+                if None in times:
+                    print(f"{size:>8}  {name:<14}{'failed':>10}")
+                    # Whatever did arrive would throw off the next size's byte count
+                    tmux('send-keys', '-t', SESSION, 'C-m')
+                    time.sleep(0.5)
+                    continue
+                p50 = statistics.median(times)
+                print(f"{size:>8}  {name:<14}{p50 * 1000:>10.1f}{size / p50 / 1e6:>10.2f}")
+    finally:
+        subprocess.run(tmux_argv('kill-session', '-t', f"={SESSION}"), capture_output=True)
+        os.unlink(output)
+
+if __name__ == '__main__':
+    main()
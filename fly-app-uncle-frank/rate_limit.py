@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Token-Bucket Rate Limiting for Noderr
+One bucket per client key, refilled continuously at the configured rate and
+holding up to a burst of tokens. Each check is O(1); buckets live in process memory
+or in the shared state database so every worker enforces the same limits
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from shared_state import get_shared_state
+
+class LocalBuckets:
+    """Bucket store for a single process"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def edit(self, key: str, default: Any) -> Iterator[Any]:
+        with self._lock:
+            yield self._buckets.setdefault(key, default)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._buckets.get(key, default)
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            del self._buckets[key]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._buckets)
+
+def parse_overrides(spec: str) -> Dict[str, Tuple[float, float]]:
+    """'orchestrator=60:20,ui=10' -> {key: (per minute, burst)}; burst defaults to the rate"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        key, _, limits = item.partition('=')
+        rate, _, burst = limits.partition(':')
+        overrides[key] = (float(rate), float(burst or rate))
+    return overrides
+
+class RateLimiter:
+    """Token buckets keyed by client: rate per minute, up to `burst` commands at once"""
+
+    PRUNE_EVERY = 1000  # checks between sweeps of buckets that have refilled completely
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None, backend: str = 'shared',
+                 namespace: str = 'rate-limit', overrides: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.per_minute = per_minute
+        self.burst = burst or per_minute
+        self.overrides = overrides or {}
+        self._buckets = get_shared_state().dict(namespace) if backend == 'shared' else LocalBuckets()
+        self._checks = 0
+
+    def limits(self, key: str) -> Tuple[float, float]:
+        return self.overrides.get(key, (self.per_minute, self.burst))
+
+    def acquire(self, key: str, cost: float = 1) -> Tuple[bool, float]:
+        """Take `cost` tokens from key's bucket: (allowed, seconds until it would be allowed)"""
+        per_minute, burst = self.limits(key)
+        now = time.time()
+        with self._buckets.edit(key, [burst, now]) as bucket:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * per_minute / 60)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            bucket[:] = [tokens, now]
+        self._checks += 1
+        if self._checks % self.PRUNE_EVERY == 0:
+            self.prune()
+        if allowed:
+            return True, 0.0
+        return False, (cost - tokens) * 60 / per_minute
+
+    def remaining(self, key: str) -> float:
+        per_minute, burst = self.limits(key)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return burst
+        return min(burst, bucket[0] + (time.time() - bucket[1]) * per_minute / 60)
+
+    def prune(self) -> None:
+        """Drop buckets that are full again (same as never having been used)"""
+        now = time.time()
+        for key, (tokens, updated) in self._buckets.to_dict().items():
+            per_minute, burst = self.limits(key)
+            if tokens + (now - updated) * per_minute / 60 >= burst:
+                try:
+                    del self._buckets[key]
+                except KeyError:
+                    pass
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
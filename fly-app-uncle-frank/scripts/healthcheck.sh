@@ -1,24 +1,17 @@
 #!/bin/bash
 
 # Health check script for Fly.io
-# Checks if both tmux session and injection agent are running
+# Healthy once the boot has finished and the Claude sessions are running
+# (see /readyz; /livez only says the API process is up)
 
-SESSION_NAME="${SESSION_NAME:-claude}"
 HEALTH_FILE="/tmp/health_status"
 
-# Check tmux session
-tmux has-session -t "$SESSION_NAME" 2>/dev/null
-TMUX_STATUS=$?
-
-# Check injection agent
-curl -f -s http://localhost:8080/health > /dev/null 2>&1
-AGENT_STATUS=$?
-
-# Create health status file for HTTP server
-if [ $TMUX_STATUS -eq 0 ] && [ $AGENT_STATUS -eq 0 ]; then
-    echo '{"status": "healthy", "tmux": true, "agent": true}' > "$HEALTH_FILE"
+if curl -f -s http://localhost:8080/readyz > "$HEALTH_FILE.tmp" 2>/dev/null; then
+    echo '{"status": "healthy", "ready": true}' > "$HEALTH_FILE"
+    rm -f "$HEALTH_FILE.tmp"
     exit 0
 else
-    echo '{"status": "unhealthy", "tmux": '$((TMUX_STATUS == 0))', "agent": '$((AGENT_STATUS == 0))'}' > "$HEALTH_FILE"
+    echo '{"status": "unhealthy", "ready": false}' > "$HEALTH_FILE"
+    rm -f "$HEALTH_FILE.tmp"
     exit 1
-fi
\ No newline at end of file
+fi
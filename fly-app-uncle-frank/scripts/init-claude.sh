@@ -4,7 +4,9 @@
 echo "Initializing Claude configuration..."
 
 # The config should already be saved in /data from previous sessions
-if [ -f "/data/.claude.json" ]; then
+if python3 /app/config_snapshot.py restore; then
+    echo "Claude config restored from snapshot - Claude is pre-authorized!"
+elif [ -f "/data/.claude.json" ]; then
     echo "Restoring Claude config from persistent storage..."
     cp /data/.claude.json /home/claude-user/.claude.json
     chown claude-user:claude-user /home/claude-user/.claude.json
@@ -14,8 +16,8 @@ else
     echo "You may need to authenticate Claude manually"
 fi
 
-# Also restore .claude directory if it exists
-if [ -d "/data/.claude" ]; then
+# Also restore .claude directory if it exists (legacy backup)
+if [ ! -d "/data/claude-snapshots/manifests" ] && [ -d "/data/.claude" ]; then
     echo "Restoring .claude directory..."
     cp -r /data/.claude /home/claude-user/
     chown -R claude-user:claude-user /home/claude-user/.claude
@@ -3,6 +3,14 @@
 
 echo "Restoring Claude authentication from persistent storage..."
 
+# Prefer the latest consistent incremental snapshot
+if python3 /app/config_snapshot.py restore; then
+    echo "Claude authentication restored from snapshot"
+    sudo -u claude-user claude auth status || echo "Auth status check failed - may need manual authentication"
+    exit 0
+fi
+
+# Legacy full-copy backup
 # Check if backup exists
 if [ ! -d "/data/claude-auth-backup" ]; then
     echo "No authentication backup found in /data/claude-auth-backup"
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Warm-Standby Claude Sessions for Noderr
+Keeps pre-booted idle Claude CLI sessions in tmux and renames one into place
+when a session dies or a new one is needed, so injection never waits on CLI startup.
+Every process sees every standby; one process at a time tops the pool up
+"""
+
+import os
+import sys
+import time
+import uuid
+import fcntl
+import logging
+import subprocess
+import threading
+from typing import Dict, Any, Optional
+
+from completion_rules import RuleEngine
+from tmux_channel import tmux
+
+logger = logging.getLogger(__name__)
+
+SESSION_NAME = os.environ.get('SESSION_NAME', 'claude-code')
+STANDBY_SESSIONS = int(os.environ.get('STANDBY_SESSIONS', '1'))  # pre-booted idle sessions kept ready
+STANDBY_PREFIX = os.environ.get('STANDBY_PREFIX', 'standby-')  # must not match the monitor's SESSION_PATTERN
+CLAUDE_COMMAND = os.environ.get('CLAUDE_COMMAND', 'cd /workspace && claude --dangerously-skip-permissions')
+BOOT_TIMEOUT = float(os.environ.get('BOOT_TIMEOUT', '90'))  # seconds for a CLI to reach its prompt
+STANDBY_CHECK_INTERVAL = float(os.environ.get('STANDBY_CHECK_INTERVAL', '2'))  # seconds
+BOOT_BACKOFF_MAX = 300  # seconds between boot attempts after repeated failures
+STANDBY_LOCK = os.environ.get('STANDBY_LOCK', '/tmp/noderr-standby.lock')  # held by the process that tops up
+
+# First launch with --dangerously-skip-permissions asks to accept bypass mode; "2" accepts
+ONBOARDING_PROMPT = 'Yes, I accept'
+
+def session_state(name: str) -> Optional[str]:
+    """'alive', 'dead' (pane exited but kept) or None if there is no such session"""
+    # "=" makes tmux match the name exactly instead of as a prefix ("=name:" for pane targets)
+    result = tmux('list-panes', '-s', '-t', f"={name}", '-F', '#{pane_dead}')
+    if result.returncode != 0:
+        return None
+    return 'alive' if '0' in result.stdout.split() else 'dead'
+
+class SessionPool:
+    """K booting/ready standby sessions plus promotion into named sessions"""
+
+    def __init__(self, active: str = SESSION_NAME, size: int = STANDBY_SESSIONS):
+        self.active = active
+        self.size = size
+        self.rules = RuleEngine()
+        self._lock = threading.Lock()  # guards _standby and all renames
+        self._tick_lock = threading.Lock()
+        self._standby: Dict[str, Dict[str, Any]] = {}
+        self._failures = 0
+        self._next_boot = 0.0
+        self._owner_fd: Optional[int] = None
+        self._waiters = 0  # concurrent ensure() calls, each needs its own standby
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'booted': 0, 'boot_failures': 0, 'promotions': 0, 'cold_starts': 0}
+
+    def _adopt(self) -> None:
+        """Pick up standbys started by other (or previous) processes; they are re-checked before use"""
+        listing = tmux('list-sessions', '-F', '#{session_name}')
+        for name in listing.stdout.split() if listing.returncode == 0 else []:
+            if name.startswith(STANDBY_PREFIX) and name not in self._standby:
+                self._standby[name] = {'name': name, 'state': 'booting', 'created': time.time()}
+
+    def _owns_pool(self) -> bool:
+        """Whether this process keeps the pool at its size (the others only use it)"""
+        if self._owner_fd is None:
+            fd = os.open(STANDBY_LOCK, os.O_RDONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            self._owner_fd = fd
+            logger.info("Topping up the standby pool from this process")
+        return True
+
+    def _spawn(self) -> Optional[str]:
+        name = f"{STANDBY_PREFIX}{uuid.uuid4().hex[:8]}"
+        # The pane is kept if the CLI exits, so a crash while booting is told apart from
+        # another process promoting (renaming) the standby; the option has to be set
+        # before the CLI starts, hence the placeholder that respawn-pane replaces
+        result = tmux('new-session', '-d', '-s', name, '-x', '200', '-y', '50', 'cat')
+        if result.returncode == 0:
+            tmux('set-option', '-w', '-t', f"={name}:", 'remain-on-exit', 'on')
+            result = tmux('respawn-pane', '-k', '-t', f"={name}:", CLAUDE_COMMAND)
+        if result.returncode != 0:
+            logger.error(f"Failed to start standby session: {result.stderr.strip()}")
+            tmux('kill-session', '-t', f"={name}")
+            self._boot_failed()
+            return None
+        self._standby[name] = {'name': name, 'state': 'booting', 'created': time.time()}
+        logger.info(f"Booting standby session {name}")
+        return name
+
+    def _boot_failed(self) -> None:
+        self._failures += 1
+        self.stats['boot_failures'] += 1
+        self._next_boot = time.time() + min(BOOT_BACKOFF_MAX, STANDBY_CHECK_INTERVAL * (2 ** self._failures))
+
+    def _discard(self, name: str, reason: str) -> None:
+        self._standby.pop(name, None)
+        tmux('kill-session', '-t', f"={name}")
+        logger.warning(f"Discarded standby {name}: {reason}")
+        self._boot_failed()
+
+    def _check(self, name: str, info: Dict[str, Any]) -> None:
+        """Advance one standby: booting -> ready, or discard it if it died or got stuck"""
+        session = session_state(name)
+        if session is None:
+            # Promoted or removed by another process: gone, but not a boot failure
+            self._standby.pop(name, None)
+            return
+        if session == 'dead':
+            self._discard(name, 'CLI exited')
+            return
+        screen = tmux('capture-pane', '-t', f"={name}:", '-p')
+        if screen.returncode != 0:
+            return
+        if ONBOARDING_PROMPT in screen.stdout:
+            tmux('send-keys', '-t', f"={name}:", '2')
+            return
+        state = self.rules.decide(screen.stdout)['state']
+        if info['state'] == 'booting':
+            if state == 'prompt_returned':
+                info['state'] = 'ready'
+                info['ready_at'] = time.time()
+                info['boot_ms'] = round((info['ready_at'] - info['created']) * 1000)
+                self._failures = 0
+                self.stats['booted'] += 1
+                logger.info(f"Standby {name} ready after {info['boot_ms']}ms")
+            elif state == 'error':
+                # e.g. not logged in: retrying immediately would fail the same way
+                self._discard(name, 'CLI reported an error while booting')
+            elif time.time() - info['created'] > BOOT_TIMEOUT:
+                self._discard(name, f"not ready after {BOOT_TIMEOUT:.0f}s")
+
+    def tick(self) -> None:
+        """One supervision pass: check standbys and top up the pool
+        
+        Dead sessions are replaced on demand through ensure(), by the session
+        supervisor or by the next injection.
+        """
+        with self._tick_lock:
+            with self._lock:
+                self._adopt()
+                for name, info in list(self._standby.items()):
+                    self._check(name, info)
+                size = self.size if self.size and self._owns_pool() else 0
+                while len(self._standby) < max(size, self._waiters) and time.time() >= self._next_boot:
+                    if not self._spawn():
+                        break
+
+    def ready_count(self) -> int:
+        with self._lock:
+            return sum(1 for info in self._standby.values() if info['state'] == 'ready')
+
+    def promote(self, target: str) -> Dict[str, Any]:
+        """Atomically rename a ready standby to target, replacing a dead session of that name"""
+        with self._lock:
+            ready = sorted((i for i in self._standby.values() if i['state'] == 'ready'),
+                           key=lambda i: i['ready_at'])
+            if not ready:
+                return {'success': False, 'error': 'No ready standby session'}
+            current = session_state(target)
+            if current == 'alive':
+                return {'success': False, 'error': f"Session {target} is already running"}
+            if current == 'dead':
+                tmux('kill-session', '-t', f"={target}")
+            standby = ready[0]
+            result = tmux('rename-session', '-t', f"={standby['name']}", target)
+            if result.returncode != 0:
+                if session_state(standby['name']) is None:
+                    # Another process (e.g. start.sh) promoted it first
+                    del self._standby[standby['name']]
+                return {'success': False, 'error': result.stderr.strip() or 'rename-session failed'}
+            del self._standby[standby['name']]
+            # The active session goes away when its CLI exits, as one started directly would
+            tmux('set-option', '-w', '-t', f"={target}:", 'remain-on-exit', 'off')
+            self.stats['promotions'] += 1
+        logger.info(f"Promoted standby {standby['name']} to {target}")
+        return {'success': True, 'session': target, 'from': standby['name'],
+                'ready_for_ms': round((time.time() - standby['ready_at']) * 1000)}
+
+    def ensure(self, target: Optional[str] = None, timeout: float = BOOT_TIMEOUT) -> Dict[str, Any]:
+        """Make sure target is running a booted CLI, waiting for a standby if none is ready yet"""
+        target = target or self.active
+        if session_state(target) == 'alive':
+            return {'success': True, 'session': target, 'swapped': False}
+        deadline = time.time() + timeout
+        with self._lock:
+            self._adopt()
+            self._waiters += 1
+            if len(self._standby) < self._waiters:
+                # Nothing warm or booting for us (pool disabled or exhausted): cold-boot one and wait it out
+                self.stats['cold_starts'] += 1
+                self._next_boot = 0.0
+                self._spawn()
+        try:
+            while True:
+                result = self.promote(target)
+                if result['success']:
+                    return {**result, 'swapped': True}
+                if session_state(target) == 'alive':
+                    return {'success': True, 'session': target, 'swapped': False}
+                if time.time() > deadline:
+                    return {'success': False, 'error': f"No Claude session ready within {timeout:.0f}s"}
+                self.tick()
+                time.sleep(0.5)
+        finally:
+            with self._lock:
+                self._waiters -= 1
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'active': self.active,
+                'active_state': session_state(self.active),
+                'size': self.size,
+                'standby': list(self._standby.values()),
+                'stats': dict(self.stats)
+            }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.error(f"Standby supervision failed: {e}")
+            self._stop.wait(STANDBY_CHECK_INTERVAL)
+
+    def start(self) -> 'SessionPool':
+        if not self._thread:
+            self._thread = threading.Thread(target=self._run, name='session-pool', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+
+_pool: Optional[SessionPool] = None
+_pool_lock = threading.Lock()
+
+def get_session_pool() -> SessionPool:
+    """Process-wide pool for SESSION_NAME"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool()
+        return _pool
+
+# Flask route handlers to be imported by inject_agent.py
+def setup_session_pool_routes(app):
+    """Setup standby session Flask routes"""
+
+    @app.route('/sessions/standby', methods=['GET'])
+    def standby_status_route():
+        """Active session state and standby sessions"""
+        from flask import jsonify
+        return jsonify(get_session_pool().status())
+
+    @app.route('/sessions/standby/promote', methods=['POST'])
+    def standby_promote_route():
+        """Swap a warm session in under a name; body: {name?} (default: the active session)"""
+        from flask import request, jsonify
+        data = request.get_json(silent=True) or {}
+        result = get_session_pool().ensure(data.get('name'), float(data.get('timeout', BOOT_TIMEOUT)))
+        return jsonify(result), (200 if result['success'] else 503)
+
+if __name__ == '__main__':
+    # `session_pool.py ensure [name]`: bring a session up from a shell script
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if len(sys.argv) < 2 or sys.argv[1] != 'ensure':
+        print(f"usage: {sys.argv[0]} ensure [session]")
+        sys.exit(2)
+    result = SessionPool(size=0).ensure(sys.argv[2] if len(sys.argv) > 2 else None)
+    print(result)
+    sys.exit(0 if result['success'] else 1)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Claude Session Supervisor for Noderr
+Restarts Claude tmux sessions as soon as tmux reports them closed or dead,
+with backoff and crash-loop protection, and publishes lifecycle events to SSE
+"""
+
+import os
+import sys
+import time
+import stat
+import select
+import logging
+import requests
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from session_pool import SessionPool, SESSION_NAME, session_state, tmux
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SUPERVISED_SESSIONS = [s for s in os.environ.get('SUPERVISED_SESSIONS', SESSION_NAME).split(',') if s]
+EVENTS_FIFO = os.environ.get('EVENTS_FIFO', '/tmp/noderr-tmux-events')  # tmux hooks write here
+SUPERVISOR_POLL = float(os.environ.get('SUPERVISOR_POLL', '15'))  # fallback check, e.g. if the tmux server died
+RESTART_BACKOFF = float(os.environ.get('RESTART_BACKOFF', '2'))  # seconds, doubled per consecutive crash
+RESTART_BACKOFF_MAX = float(os.environ.get('RESTART_BACKOFF_MAX', '120'))
+STABLE_AFTER = float(os.environ.get('STABLE_AFTER', '120'))  # seconds up before a session counts as healthy again
+CRASH_LOOP_RESTARTS = int(os.environ.get('CRASH_LOOP_RESTARTS', '5'))  # restarts within the window...
+CRASH_LOOP_WINDOW = float(os.environ.get('CRASH_LOOP_WINDOW', '300'))  # ...that count as a crash loop
+CRASH_LOOP_COOLDOWN = float(os.environ.get('CRASH_LOOP_COOLDOWN', '900'))  # seconds before trying again
+SSE_EVENTS_URL = os.environ.get('SSE_EVENTS_URL', 'http://127.0.0.1:8080/internal/events')
+SESSION_INIT_COMMAND = os.environ.get('SESSION_INIT_COMMAND', '')  # typed into each fresh session
+
+# "-b" so tmux never blocks on the FIFO; the shell waits there until we read
+HOOKS = {
+    'session-closed': "run-shell -b 'echo session-closed #{hook_session_name} > %s'",
+    'pane-died': "run-shell -b 'echo pane-died #{session_name} #{pane_dead_status} > %s'",
+}
+
+class SupervisedSession:
+    """Restart bookkeeping for one session name"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = 'stopped'  # starting, running, waiting (backoff), crash_loop
+        self.started: Optional[float] = None
+        self.crashes = 0  # consecutive, reset once the session has been stable
+        self.restarts: deque = deque()
+        self.next_attempt = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session': self.name,
+            'state': self.state,
+            'started': self.started,
+            'crashes': self.crashes,
+            'restarts_in_window': len(self.restarts),
+            'next_attempt': self.next_attempt or None
+        }
+
+class SessionSupervisor:
+    """Event-driven restarts for SUPERVISED_SESSIONS"""
+
+    def __init__(self, names: List[str] = SUPERVISED_SESSIONS):
+        self.sessions = {name: SupervisedSession(name) for name in names}
+        # Adopts standbys kept warm by inject_agent's pool; boots cold only if there are none
+        self.pool = SessionPool(size=0)
+        self.fifo: Optional[int] = None
+
+    def publish(self, event: str, session: SupervisedSession, **data: Any) -> None:
+        """Forward a lifecycle event to noderr_api's SSE stream (best effort)"""
+        payload = {'type': event, 'data': {**session.to_dict(), **data, 'timestamp': datetime.now().isoformat()}}
+        try:
+            requests.post(SSE_EVENTS_URL, json=payload, timeout=2)
+        except requests.RequestException as e:
+            logger.debug(f"Could not publish {event}: {e}")
+
+    def open_fifo(self) -> None:
+        if not os.path.exists(EVENTS_FIFO) or not stat.S_ISFIFO(os.stat(EVENTS_FIFO).st_mode):
+            if os.path.exists(EVENTS_FIFO):
+                os.remove(EVENTS_FIFO)
+            os.mkfifo(EVENTS_FIFO)
+        # The tmux server runs as claude-user and must be able to write
+        os.chmod(EVENTS_FIFO, 0o622)
+        # O_RDWR keeps the FIFO open between writers, so reads never hit EOF
+        self.fifo = os.open(EVENTS_FIFO, os.O_RDWR | os.O_NONBLOCK)
+
+    def install_hooks(self) -> None:
+        """(Re)install global hooks; they live in the tmux server and vanish with it"""
+        for hook, command in HOOKS.items():
+            tmux('set-hook', '-g', hook, command % EVENTS_FIFO)
+
+    def schedule_restart(self, session: SupervisedSession, reason: str) -> None:
+        """Restart at once after a first crash, back off on repeated ones, give up for a while on a loop"""
+        now = time.time()
+        while session.restarts and now - session.restarts[0] > CRASH_LOOP_WINDOW:
+            session.restarts.popleft()
+        if session.started and now - session.started >= STABLE_AFTER:
+            session.crashes = 0
+        session.crashes += 1
+        session.restarts.append(now)
+        if len(session.restarts) > CRASH_LOOP_RESTARTS:
+            session.state = 'crash_loop'
+            session.next_attempt = now + CRASH_LOOP_COOLDOWN
+            session.restarts.clear()
+            logger.error(f"{session.name} is crash-looping; pausing restarts for {CRASH_LOOP_COOLDOWN:.0f}s")
+            self.publish('session:crash_loop', session, reason=reason, cooldown=CRASH_LOOP_COOLDOWN)
+            return
+        delay = 0 if session.crashes == 1 else min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * (2 ** (session.crashes - 2)))
+        session.state = 'waiting'
+        session.next_attempt = now + delay
+        self.publish('session:restarting', session, reason=reason, delay=delay)
+        if not delay:
+            self.restart(session)
+
+    def restart(self, session: SupervisedSession) -> None:
+        session.state = 'starting'
+        started = time.monotonic()
+        result = self.pool.ensure(session.name)
+        if not result['success']:
+            session.state = 'waiting'
+            session.next_attempt = time.time() + min(RESTART_BACKOFF_MAX, RESTART_BACKOFF * (2 ** session.crashes))
+            logger.error(f"Failed to start {session.name}: {result['error']}")
+            self.publish('session:start_failed', session, error=result['error'])
+            return
+        # Keep the pane after Claude exits so pane-died reports its exit status
+        tmux('set-option', '-w', '-t', f"={session.name}:", 'remain-on-exit', 'on')
+        self.install_hooks()
+        if SESSION_INIT_COMMAND and result.get('swapped', True):
+            tmux('send-keys', '-t', f"={session.name}:", f"{SESSION_INIT_COMMAND} {datetime.now()}", 'C-m')
+        session.state = 'running'
+        session.started = time.time()
+        ms = round((time.monotonic() - started) * 1000)
+        logger.info(f"{session.name} up in {ms}ms ({'standby swap' if result.get('swapped') else 'already running'})")
+        self.publish('session:started', session, swapped=result.get('swapped', False), start_ms=ms)
+
+    def handle_exit(self, name: str, reason: str, status: Optional[str] = None) -> None:
+        session = self.sessions.get(name)
+        if not session or session.state != 'running':
+            return
+        # Hooks are asynchronous: the name may already belong to a fresh session
+        if session_state(name) == 'alive':
+            return
+        tail = None
+        if reason == 'pane-died':
+            screen = tmux('capture-pane', '-t', f"={name}:", '-p', '-S', '-20')
+            tail = screen.stdout[-2000:] if screen.returncode == 0 else None
+        logger.warning(f"{name} exited ({reason}{', status ' + status if status else ''})")
+        self.publish('session:died', session, reason=reason, exit_status=status, tail=tail)
+        self.schedule_restart(session, reason)
+
+    def read_events(self, timeout: float) -> List[List[str]]:
+        ready, _, _ = select.select([self.fifo], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fifo, 65536).decode(errors='replace')
+        except BlockingIOError:
+            return []
+        return [line.split() for line in data.splitlines() if line.strip()]
+
+    def check_all(self) -> None:
+        """Catch anything the hooks missed and retry sessions whose backoff has elapsed"""
+        now = time.time()
+        for session in self.sessions.values():
+            if session.state == 'running':
+                state = session_state(session.name)
+                if state != 'alive':
+                    self.handle_exit(session.name, 'missing' if state is None else 'pane-died')
+            elif session.state in ('waiting', 'crash_loop') and now >= session.next_attempt:
+                if session.state == 'crash_loop':
+                    logger.info(f"Cooldown over for {session.name}, restarting")
+                    session.crashes = 0
+                self.restart(session)
+
+    def run(self, fresh: bool = False) -> None:
+        logger.info(f"Supervising {', '.join(self.sessions)} (hooks via {EVENTS_FIFO})")
+        self.open_fifo()
+        for session in self.sessions.values():
+            if fresh and session_state(session.name):
+                # Same clean slate the start scripts used to give
+                tmux('kill-session', '-t', f"={session.name}")
+            self.restart(session)
+
+        last_check = time.time()
+        while True:
+            for event in self.read_events(min(1.0, SUPERVISOR_POLL)):
+                if event[0] in HOOKS and len(event) > 1:
+                    self.handle_exit(event[1], event[0], event[2] if len(event) > 2 else None)
+            if time.time() - last_check >= SUPERVISOR_POLL or any(
+                    s.state == 'waiting' and time.time() >= s.next_attempt for s in self.sessions.values()):
+                self.check_all()
+                last_check = time.time()
+
+if __name__ == '__main__':
+    SessionSupervisor().run(fresh='--fresh' in sys.argv)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Shared State for Noderr's Services
+Key-value namespaces, counters and an append-only event log kept in one SQLite
+database, so every worker process of a service (e.g. `gunicorn -w N`) sees the same
+tasks, sessions and SSE events instead of each holding its own copy in globals.
+The database is opened on first use, so importing a service touches nothing
+"""
+
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional
+
+# On the Fly volume when there is one, else somewhere writable (local runs, benches, tests)
+STATE_PATH = os.environ.get('STATE_PATH') or (
+    '/data/noderr-state.db' if os.path.isdir('/data') else os.path.join(tempfile.gettempdir(), 'noderr-state.db'))
+STATE_BUSY_TIMEOUT = float(os.environ.get('STATE_BUSY_TIMEOUT', '10'))  # seconds to wait for another writer
+EVENT_LOG_MAX = int(os.environ.get('EVENT_LOG_MAX', '1000'))  # events kept per log for late readers
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', '0.25'))  # seconds; picks up other workers' events
+
+_MISSING = object()
+
+class SharedState:
+    """One SQLite database; a connection per thread, reopened after fork"""
+
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._appended = threading.Condition()  # wakes this process's event readers early
+        self._created = False
+        self._create_lock = threading.Lock()
+
+    def _create(self, db: sqlite3.Connection) -> None:
+        """Set up the file and tables the first time this process connects"""
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS kv ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'PRIMARY KEY (namespace, key)) WITHOUT ROWID'
+        )
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, log TEXT NOT NULL, type TEXT NOT NULL, '
+            'data TEXT NOT NULL, created REAL NOT NULL)'
+        )
+        db.execute('CREATE INDEX IF NOT EXISTS events_log ON events (log, id)')
+
+    def connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            with self._create_lock:
+                if not self._created and os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                db = sqlite3.connect(self.path, timeout=STATE_BUSY_TIMEOUT, isolation_level=None)
+                db.execute('PRAGMA synchronous=NORMAL')
+                if not self._created:
+                    self._create(db)
+                    self._created = True
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction; other processes' writers wait until it commits"""
+        db = self.connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def dict(self, namespace: str) -> 'SharedDict':
+        return SharedDict(self, namespace)
+
+    def event_log(self, name: str) -> 'EventLog':
+        return EventLog(self, name)
+
+class SharedDict(MutableMapping):
+    """Dict of JSON values in one namespace
+
+    Values are copies: changing a value read from it changes nothing until it is
+    stored again. Use edit() for read-modify-write that other workers can't interleave.
+    """
+
+    def __init__(self, state: SharedState, namespace: str):
+        self._state = state
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Any:
+        row = self._state.connection().execute(
+            'SELECT value FROM kv WHERE namespace = ? AND key = ?', (self.namespace, key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._state.connection().execute(
+            'INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)',
+            (self.namespace, key, json.dumps(value)))
+
+    def __delitem__(self, key: str) -> None:
+        cursor = self._state.connection().execute(
+            'DELETE FROM kv WHERE namespace = ? AND key = ?', (self.namespace, key))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._state.connection().execute(
+            'SELECT key FROM kv WHERE namespace = ?', (self.namespace,)).fetchall()
+        return iter([key for key, in rows])
+
+    def __len__(self) -> int:
+        return self._state.connection().execute(
+            'SELECT COUNT(*) FROM kv WHERE namespace = ?', (self.namespace,)).fetchone()[0]
+
+    def __contains__(self, key: object) -> bool:
+        return self._state.connection().execute(
+            'SELECT 1 FROM kv WHERE namespace = ? AND key = ?', (self.namespace, key)).fetchone() is not None
+
+    def values(self) -> List[Any]:
+        rows = self._state.connection().execute(
+            'SELECT value FROM kv WHERE namespace = ?', (self.namespace,)).fetchall()
+        return [json.loads(value) for value, in rows]
+
+    def to_dict(self) -> Dict[str, Any]:
+        rows = self._state.connection().execute(
+            'SELECT key, value FROM kv WHERE namespace = ?', (self.namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        with self._state.transaction() as db:
+            db.execute('INSERT OR IGNORE INTO kv (namespace, key, value) VALUES (?, ?, ?)',
+                       (self.namespace, key, json.dumps(default)))
+            return json.loads(db.execute('SELECT value FROM kv WHERE namespace = ? AND key = ?',
+                                         (self.namespace, key)).fetchone()[0])
+
+    def incr(self, key: str, delta: int = 1) -> int:
+        """Atomically add delta to an integer value (missing counts as 0); returns the new value"""
+        with self._state.transaction() as db:
+            db.execute(
+                'INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (namespace, key) DO UPDATE SET value = CAST(value AS INTEGER) + ?',
+                (self.namespace, key, str(delta), delta))
+            return int(db.execute('SELECT value FROM kv WHERE namespace = ? AND key = ?',
+                                  (self.namespace, key)).fetchone()[0])
+
+    @contextmanager
+    def edit(self, key: str, default: Any = _MISSING) -> Iterator[Any]:
+        """Yield the value for in-place changes and store it back, all in one transaction
+
+        A missing key raises KeyError unless a default (dict or list) is given.
+        """
+        with self._state.transaction() as db:
+            row = db.execute('SELECT value FROM kv WHERE namespace = ? AND key = ?',
+                             (self.namespace, key)).fetchone()
+            if row is None and default is _MISSING:
+                raise KeyError(key)
+            value = json.loads(row[0]) if row else default
+            yield value
+            db.execute('INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)',
+                       (self.namespace, key, json.dumps(value)))
+
+class EventLog:
+    """Append-only log of (id, type, data); readers in any process follow it by id"""
+
+    def __init__(self, state: SharedState, name: str):
+        self._state = state
+        self.name = name
+
+    def append(self, event_type: str, data: Any) -> int:
+        with self._state.transaction() as db:
+            event_id = db.execute('INSERT INTO events (log, type, data, created) VALUES (?, ?, ?, ?)',
+                                  (self.name, event_type, json.dumps(data), time.time())).lastrowid
+            db.execute('DELETE FROM events WHERE log = ? AND id <= ?', (self.name, event_id - EVENT_LOG_MAX))
+        with self._state._appended:
+            self._state._appended.notify_all()
+        return event_id
+
+    def last_id(self) -> int:
+        row = self._state.connection().execute(
+            'SELECT MAX(id) FROM events WHERE log = ?', (self.name,)).fetchone()
+        return row[0] or 0
+
+    def since(self, after_id: int, limit: int = 100) -> List[tuple]:
+        """Events after after_id, oldest first: [(id, type, data)]"""
+        rows = self._state.connection().execute(
+            'SELECT id, type, data FROM events WHERE log = ? AND id > ? ORDER BY id LIMIT ?',
+            (self.name, after_id, limit)).fetchall()
+        return [(event_id, event_type, json.loads(data)) for event_id, event_type, data in rows]
+
+    def wait(self, after_id: int, timeout: float) -> List[tuple]:
+        """Events after after_id, waiting up to timeout for the next one"""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self.since(after_id)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            # Appends in this process notify; other workers' appends are seen on the next poll
+            with self._state._appended:
+                self._state._appended.wait(min(remaining, EVENT_POLL_INTERVAL))
+
+_state: Optional[SharedState] = None
+_state_lock = threading.Lock()
+
+def get_shared_state() -> SharedState:
+    """Process-wide handle on the shared state database"""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = SharedState()
+        return _state
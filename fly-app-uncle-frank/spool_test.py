@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Local test for the webhook spool
+Runs a stand-in orchestrator receiver, measures delivery throughput and
+checks that events queued during an outage arrive in order afterwards,
+and that a batch the receiver rejects is dead-lettered instead of blocking
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('SPOOL_BACKOFF_BASE', '0.1')
+os.environ.setdefault('SPOOL_BACKOFF_MAX', '1')
+
+from webhook_spool import WebhookSpool
+
+received = []
+receiver_up = threading.Event()
+receiver_up.set()
+
+class StandInReceiver(BaseHTTPRequestHandler):
+    """Accepts batches like the CF Worker's /api/webhook, 503s while 'down', 400s a poisoned batch"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not receiver_up.is_set():
+            self.send_response(503)
+            self.end_headers()
+            return
+        events = json.loads(body).get('events', [])
+        if any(e.get('poison') for e in events):
+            self.send_response(400)
+            self.end_headers()
+            return
+        received.extend(events)
+        reply = json.dumps({'status': 'received', 'received': len(events)}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+def wait_for(count, timeout=30):
+    deadline = time.time() + timeout
+    while len(received) < count and time.time() < deadline:
+        time.sleep(0.01)
+    return len(received) >= count
+
+def check_order(events):
+    seqs = [e['seq'] for e in events]
+    return seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+
+def test_spool():
+    print("=" * 60)
+    print("LOCAL TEST: Webhook spool throughput and outage recovery")
+    print("=" * 60)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInReceiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/webhook"
+    spool_path = os.path.join(tempfile.mkdtemp(), 'spool.db')
+    spool = WebhookSpool(url, path=spool_path).start()
+    seq = 0
+
+    def enqueue(n):
+        nonlocal seq
+        for _ in range(n):
+            seq += 1
+            spool.append({'event': 'output_delta', 'session': 'claude-code', 'seq': seq, 'delta': 'x' * 200})
+
+    # 1. Throughput with the receiver up
+    count = 2000
+    started = time.time()
+    enqueue(count)
+    ok = wait_for(count)
+    elapsed = time.time() - started
+    print(f"\n1. Delivered {len(received)}/{count} events in {elapsed:.2f}s "
+          f"({count / elapsed:.0f} events/s, {spool.stats['batches']} POSTs)")
+    print(f"   {'✓' if ok and check_order(received) else '✗'} all delivered in order")
+
+    # 2. Outage: events must stay queued, then drain in order once it recovers
+    receiver_up.clear()
+    enqueue(500)
+    time.sleep(1)
+    queued = spool.pending()
+    print(f"\n2. Receiver down: {queued} events queued, {spool.stats['failures']} failed attempts")
+    receiver_up.set()
+    started = time.time()
+    ok = wait_for(count + 500)
+    print(f"   Recovered: drained in {time.time() - started:.2f}s after the receiver came back")
+    print(f"   {'✓' if ok and check_order(received) else '✗'} no loss, no reordering")
+
+    # 3. Durability: a new spool on the same file resumes undelivered events
+    spool.stop()
+    receiver_up.clear()
+    spool = WebhookSpool(url, path=spool_path)
+    enqueue(100)
+    spool.stop()
+    spool = WebhookSpool(url, path=spool_path).start()
+    receiver_up.set()
+    ok = wait_for(count + 600)
+    print(f"\n3. Restarted spool delivered {len(received) - count - 500}/100 persisted events")
+    print(f"   {'✓' if ok and check_order(received) else '✗'} persisted across restart")
+
+    # 4. A permanently rejected batch is set aside; later events still arrive
+    spool.append({'event': 'output_delta', 'session': 'claude-code', 'seq': seq + 1, 'poison': True})
+    time.sleep(0.2)  # let it go out as a batch of its own
+    seq += 1
+    enqueue(50)
+    ok = wait_for(count + 650, timeout=10)
+    print(f"\n4. Poisoned batch: {spool.stats['dead_lettered']} event(s) dead-lettered, "
+          f"{len(received) - count - 600}/50 later events delivered")
+    print(f"   {'✓' if ok and spool.dead_letters() == 1 and check_order(received) else '✗'} spool kept moving")
+
+    spool.stop()
+    server.shutdown()
+
+if __name__ == "__main__":
+    test_spool()
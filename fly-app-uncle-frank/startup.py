@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Cold-Start Orchestrator for Noderr
+Runs the container's boot phases concurrently where their inputs allow, measures
+time-to-ready per phase against startup_budget.json and hands the sessions to the
+session supervisor. The HTTP services read the boot state it publishes to serve
+liveness/readiness and to hold /inject until the boot has finished
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from functools import partial
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BOOT_STATE = os.environ.get('BOOT_STATE', '/tmp/noderr-boot.json')  # published for the HTTP services
+STARTUP_BUDGET = os.environ.get(
+    'STARTUP_BUDGET',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+)
+BOOT_HISTORY = os.environ.get('BOOT_HISTORY', '/data/boot-history.jsonl')  # one line per boot
+BOOT_SERVICES = os.environ.get(
+    'BOOT_SERVICES',
+    'noderr-api=http://127.0.0.1:8080/livez,inject-agent=http://127.0.0.1:8082/livez'
+)
+BOOT_SERVICE_TIMEOUT = float(os.environ.get('BOOT_SERVICE_TIMEOUT', '60'))  # seconds for a service to answer
+BOOT_WAIT_TIMEOUT = float(os.environ.get('BOOT_WAIT_TIMEOUT', '120'))  # seconds /inject waits for the boot
+WORKSPACE_DIR = os.environ.get('WORKSPACE_DIR', '/workspace')
+CLAUDE_USER = os.environ.get('CLAUDE_USER', 'claude-user')
+ENSURE_CLI_SCRIPT = '/app/ensure-claude.sh'
+# Used only while no incremental snapshot exists; auth first, as config overwrites the same files
+LEGACY_RESTORE_SCRIPTS = ['/app/restore-claude-auth.sh', '/app/init-claude.sh']
+
+def _uptime_ms() -> Optional[int]:
+    """Milliseconds since the machine (VM) started, i.e. since the wake on Fly"""
+    try:
+        with open('/proc/uptime') as f:
+            return round(float(f.read().split()[0]) * 1000)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.boot-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+def load_budget(path: str = STARTUP_BUDGET) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No startup budget ({e}); reporting durations only")
+        return {'phases': {}}
+
+def boot_status() -> Optional[Dict[str, Any]]:
+    """The orchestrator's published state, or None if this process isn't running under it"""
+    try:
+        with open(BOOT_STATE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        if os.environ.get('SUPERVISOR_ENABLED'):
+            # Started by supervisord before the orchestrator wrote its first state
+            return {'finished': False, 'ready': False, 'phases': {}, 'sessions': []}
+        return None
+
+class Phase:
+    """One boot step; `after` only orders it, a failed dependency doesn't skip it"""
+
+    def __init__(self, name: str, run: Callable[[], Any], after: Tuple[str, ...] = ()):
+        self.name = name
+        self.run = run
+        self.after = after
+        self.state = 'pending'  # running, done, failed
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.detail: Any = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+class BootOrchestrator:
+    """Concurrent boot phases with per-phase timing against the budget"""
+
+    def __init__(self, sessions: List[str], fresh: bool = False):
+        from session_pool import SessionPool
+        self.sessions = sessions
+        self.fresh = fresh
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.started = time.time()
+        self.t0 = time.monotonic()
+        self.uptime_at_start = _uptime_ms()
+        self.budget = load_budget()
+        self.pool = SessionPool(size=0)
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+        services = [s.split('=', 1) for s in BOOT_SERVICES.split(',') if '=' in s]
+        phases = [
+            Phase('cli', self.ensure_cli),
+            Phase('restore', self.restore_config),
+            Phase('workspace', self.prepare_workspace),
+            # The CLI reads the restored auth and starts in the workspace
+            Phase('sessions', self.start_sessions, after=('cli', 'restore', 'workspace')),
+            *[Phase(f"service:{name}", partial(self.wait_for_service, url)) for name, url in services]
+        ]
+        self.phases = {phase.name: phase for phase in phases}
+
+    def ensure_cli(self) -> Dict[str, Any]:
+        if not os.path.exists(ENSURE_CLI_SCRIPT):
+            return {'skipped': True}
+        result = subprocess.run([ENSURE_CLI_SCRIPT], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Claude CLI unavailable: {result.stdout.strip().splitlines()[-1:]}")
+        return {}
+
+    def restore_config(self) -> Dict[str, Any]:
+        from config_snapshot import SnapshotStore
+        result = SnapshotStore().restore()
+        if result['success']:
+            return {'seq': result['seq'], 'restored': len(result['restored']), 'bytes_written': result['bytes_written']}
+        # First boot after the switch to snapshots: fall back to the full-copy backups
+        for script in LEGACY_RESTORE_SCRIPTS:
+            if os.path.exists(script):
+                subprocess.run([script], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return {'legacy': True}
+
+    def prepare_workspace(self) -> Dict[str, Any]:
+        os.makedirs(WORKSPACE_DIR, exist_ok=True)
+        # Only fix entries that need it instead of rewriting the owner of the whole tree
+        result = subprocess.run(
+            ['find', WORKSPACE_DIR, '!', '-user', CLAUDE_USER, '-exec', 'chown', '-h',
+             f"{CLAUDE_USER}:{CLAUDE_USER}", '{}', '+'],
+            capture_output=True, text=True
+        )
+        return {'chown_errors': bool(result.returncode)}
+
+    def start_sessions(self) -> Dict[str, Any]:
+        from session_pool import session_state, tmux
+        from session_supervisor import SESSION_INIT_COMMAND
+        results: Dict[str, Dict[str, Any]] = {}
+
+        def start(name: str) -> None:
+            if self.fresh and session_state(name):
+                # Clean state on every boot, as the start scripts always did
+                tmux('kill-session', '-t', f"={name}")
+            results[name] = self.pool.ensure(name)
+            if SESSION_INIT_COMMAND and results[name].get('swapped'):
+                tmux('send-keys', '-t', f"={name}:", f"{SESSION_INIT_COMMAND} {datetime.now()}", 'C-m')
+
+        threads = [threading.Thread(target=start, args=(name,)) for name in self.sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        failed = [name for name in self.sessions if not results.get(name, {}).get('success')]
+        if failed:
+            raise RuntimeError(f"{', '.join(failed)}: {results.get(failed[0], {}).get('error', 'not started')}")
+        return {name: {'swapped': result['swapped']} for name, result in results.items()}
+
+    def wait_for_service(self, url: str) -> Dict[str, Any]:
+        import requests
+        deadline = time.monotonic() + BOOT_SERVICE_TIMEOUT
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                requests.get(url, timeout=1)
+                return {'attempts': attempts}
+            except requests.RequestException:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} not answering after {BOOT_SERVICE_TIMEOUT:.0f}s")
+                time.sleep(0.1)
+
+    def _ms(self, t: Optional[float]) -> Optional[int]:
+        return None if t is None else round((t - self.t0) * 1000)
+
+    def status(self) -> Dict[str, Any]:
+        budgets = self.budget.get('phases', {})
+        phases = {}
+        for phase in self.phases.values():
+            duration = self._ms(phase.finished) - self._ms(phase.started) if phase.finished else None
+            budget = budgets.get(phase.name)
+            phases[phase.name] = {
+                'state': phase.state,
+                'start_ms': self._ms(phase.started),
+                'duration_ms': duration,
+                'budget_ms': budget,
+                'over_budget': bool(budget and duration is not None and duration > budget),
+                'detail': phase.detail,
+                'error': phase.error
+            }
+        time_to_ready = self._ms(self.finished)
+        total_budget = self.budget.get('total_ms')
+        return {
+            'boot_id': self.boot_id,
+            'started': datetime.fromtimestamp(self.started).isoformat(),
+            'sessions': self.sessions,
+            'finished': self.finished is not None,
+            'ready': self.finished is not None and all(p.state == 'done' for p in self.phases.values()),
+            'failed': [p.name for p in self.phases.values() if p.state == 'failed'],
+            'time_to_ready_ms': time_to_ready,
+            # Includes the VM and supervisord start before this process ran
+            'since_machine_start_ms': (self.uptime_at_start + time_to_ready
+                                       if self.uptime_at_start is not None and time_to_ready is not None else None),
+            'budget_ms': total_budget,
+            'over_budget': [n for n, p in phases.items() if p['over_budget']] +
+                           (['total'] if total_budget and time_to_ready and time_to_ready > total_budget else []),
+            'phases': phases
+        }
+
+    def publish(self) -> None:
+        with self._lock:
+            _write_json_atomic(BOOT_STATE, self.status())
+
+    def _run_phase(self, phase: Phase) -> None:
+        for name in phase.after:
+            self.phases[name].done.wait()
+        phase.state = 'running'
+        phase.started = time.monotonic()
+        self.publish()
+        try:
+            phase.detail = phase.run()
+            phase.state = 'done'
+        except Exception as e:
+            phase.state = 'failed'
+            phase.error = str(e)
+            logger.error(f"Boot phase {phase.name} failed: {e}")
+        phase.finished = time.monotonic()
+        phase.done.set()
+        self.publish()
+
+    def run(self) -> Dict[str, Any]:
+        """Run all phases to completion and report them against the budget"""
+        self.publish()
+        threads = [threading.Thread(target=self._run_phase, args=(phase,), name=f"boot-{phase.name}", daemon=True)
+                   for phase in self.phases.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.finished = time.monotonic()
+        self.publish()
+        status = self.status()
+        self.report(status)
+        return status
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name='boot', daemon=True)
+        thread.start()
+        return thread
+
+    def report(self, status: Dict[str, Any]) -> None:
+        for name, phase in status['phases'].items():
+            budget = f"/{phase['budget_ms']}ms" if phase['budget_ms'] else ''
+            line = f"  {name:24} {phase['state']:7} +{phase['start_ms']}ms {phase['duration_ms']}ms{budget}"
+            (logger.warning if phase['over_budget'] or phase['state'] == 'failed' else logger.info)(line)
+        summary = (f"Boot {status['boot_id']} {'ready' if status['ready'] else 'finished with failures'} "
+                   f"in {status['time_to_ready_ms']}ms ({status['since_machine_start_ms']}ms since machine start)")
+        if status['over_budget']:
+            logger.warning(f"{summary}; over budget: {', '.join(status['over_budget'])}")
+        else:
+            logger.info(summary)
+        try:
+            with open(BOOT_HISTORY, 'a') as f:
+                f.write(json.dumps(status) + '\n')
+        except OSError as e:
+            logger.debug(f"Could not record boot history: {e}")
+        try:
+            from session_supervisor import SSE_EVENTS_URL
+            import requests
+            requests.post(SSE_EVENTS_URL, json={'type': 'boot:finished', 'data': status}, timeout=2)
+        except Exception as e:
+            logger.debug(f"Could not publish boot event: {e}")
+
+def wait_for_phase(name: str, timeout: float = BOOT_WAIT_TIMEOUT) -> bool:
+    """Block until a boot phase has finished (True right away outside the orchestrator)"""
+    deadline = time.time() + timeout
+    while True:
+        status = boot_status()
+        if status is None or status.get('finished'):
+            return True
+        if status.get('phases', {}).get(name, {}).get('state') in ('done', 'failed'):
+            return True
+        if time.time() > deadline:
+            return False
+        time.sleep(0.25)
+
+class BootGate:
+    """Holds requests that arrive during boot and releases them in arrival order"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._open = False
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned: set = set()
+
+    def is_open(self) -> bool:
+        if not self._open:
+            status = boot_status()
+            # A finished boot opens the gate even with failures: injection does its own recovery
+            self._open = status is None or bool(status.get('finished'))
+        return self._open
+
+    def waiting(self) -> int:
+        with self._cond:
+            return self._next_ticket - self._serving - len(self._abandoned)
+
+    def _skip_abandoned(self) -> None:
+        while self._serving in self._abandoned:
+            self._abandoned.discard(self._serving)
+            self._serving += 1
+
+    def wait(self, timeout: float = BOOT_WAIT_TIMEOUT) -> bool:
+        """True once the boot has finished and earlier requests have gone through"""
+        with self._cond:
+            if self._open and self._serving == self._next_ticket:
+                return True
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            deadline = time.time() + timeout
+            while not (self._serving == ticket and self.is_open()):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._abandoned.add(ticket)
+                    self._skip_abandoned()
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(min(0.25, remaining))
+            self._serving += 1
+            self._skip_abandoned()
+            self._cond.notify_all()
+            return True
+
+_gate = BootGate()
+
+def get_boot_gate() -> BootGate:
+    return _gate
+
+# Flask route handlers to be imported by the HTTP services
+def setup_startup_routes(app):
+    """Setup liveness and readiness Flask routes"""
+
+    @app.route('/livez', methods=['GET'])
+    def livez_route():
+        """The process is up and serving; never depends on other services"""
+        from flask import jsonify
+        return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+    @app.route('/readyz', methods=['GET'])
+    def readyz_route():
+        """Boot finished without failures and every boot session is running"""
+        from flask import jsonify
+        from session_pool import session_state
+        status = boot_status()
+        if status is None:
+            return jsonify({'ready': True, 'boot': None})
+        sessions = {name: session_state(name) for name in status.get('sessions', [])}
+        ready = bool(status.get('ready')) and all(state == 'alive' for state in sessions.values())
+        return jsonify({
+            'ready': ready,
+            'sessions': sessions,
+            'queued_requests': get_boot_gate().waiting(),
+            'boot': status
+        }), (200 if ready else 503)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if sys.argv[1:2] == ['report']:
+        # `startup.py report`: the last boot against the budget; non-zero if over it or failed
+        status = boot_status()
+        print(json.dumps(status, indent=2))
+        sys.exit(0 if status and status.get('ready') and not status.get('over_budget') else 1)
+
+    from session_supervisor import SessionSupervisor, SUPERVISED_SESSIONS
+    orchestrator = BootOrchestrator(SUPERVISED_SESSIONS, fresh='--fresh' in sys.argv)
+    orchestrator.start()
+    # Supervise as soon as the sessions exist; the service checks may still be running
+    orchestrator.phases['sessions'].done.wait()
+    SessionSupervisor(SUPERVISED_SESSIONS).run()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Local startup benchmark for the Flask services
+Measures each service's import time with `python -X importtime` and the time from
+process start to its first served request, optionally against another git revision
+(e.g. `startup_bench.py HEAD~1`)
+"""
+
+import os
+import re
+import sys
+import time
+import socket
+import shutil
+import tempfile
+import subprocess
+import urllib.request
+import urllib.error
+
+SERVICES = ['noderr_api', 'inject_agent', 'claude_relay', 'claude_auth_handler', 'oauth_handler']
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '5'))
+# Keep inject_agent from booting standby sessions or worktrees while measuring
+BENCH_ENV = {'STANDBY_SESSIONS': '0', 'WORKTREE_POOL_SIZE': '0', 'PYTHONUNBUFFERED': '1'}
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+def import_profile(directory: str, module: str):
+    """(cumulative import µs of the module, its five heaviest direct imports)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=directory, capture_output=True, text=True, env={**os.environ, **BENCH_ENV})
+    rows = [(int(m.group(2)), len(m.group(3)), m.group(4))
+            for m in map(IMPORT_LINE.match, result.stderr.splitlines()) if m]
+    total = next((us for us, depth, name in rows if depth == 1 and name == module), None)
+    children = sorted(((us, name) for us, depth, name in rows if depth == 3), reverse=True)[:5]
+    loaded = {name for _, _, name in rows}
+    return total, children, loaded
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def first_request_ms(directory: str, module: str) -> float:
+    """Process spawn to the first HTTP response (any status counts as served)"""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, f"{module}.py"], cwd=directory,
+                            env={**os.environ, **BENCH_ENV, 'PORT': str(port)},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/livez", timeout=1)
+                break
+            except urllib.error.HTTPError:
+                break
+            except OSError:
+                if proc.poll() is not None or time.perf_counter() - started > 10:
+                    return float('nan')  # e.g. a revision that ignores $PORT
+                time.sleep(0.005)
+        return (time.perf_counter() - started) * 1000
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def measure(directory: str):
+    results = {}
+    for module in SERVICES:
+        if not os.path.exists(os.path.join(directory, f"{module}.py")):
+            continue
+        total, children, loaded = import_profile(directory, module)
+        first = sorted(first_request_ms(directory, module) for _ in range(ROUNDS))[ROUNDS // 2]
+        results[module] = (total, children, loaded, first)
+    return results
+
+def checkout(ref: str, target: str) -> str:
+    """Extract this directory as of `ref` into target"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    archive = subprocess.run(['git', 'archive', ref, '.'], cwd=here, capture_output=True, check=True)
+    subprocess.run(['tar', '-x', '-C', target], input=archive.stdout, check=True)
+    return target
+
+def test_startup():
+    print("=" * 60)
+    print("LOCAL TEST: Service import time and time to first request")
+    print("=" * 60)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    current = measure(here)
+    baseline = {}
+    if len(sys.argv) > 1:
+        target = tempfile.mkdtemp(prefix='startup-bench-')
+        try:
+            baseline = measure(checkout(sys.argv[1], target))
+        finally:
+            shutil.rmtree(target)
+
+    for module, (total, children, loaded, first) in current.items():
+        line = f"\n{module}: import {total / 1000:.0f}ms, first request {first:.0f}ms (median of {ROUNDS})"
+        if module in baseline:
+            old_total, _, old_loaded, old_first = baseline[module]
+            old_first = 'n/a' if old_first != old_first else f"{old_first:.0f}ms"
+            line += f"\n   {sys.argv[1]}: import {old_total / 1000:.0f}ms, first request {old_first}"
+            deferred = sorted(name for name in ('requests', 'flask_cors', 'urllib3')
+                              if name in old_loaded and name not in loaded)
+            if deferred:
+                line += f"\n   no longer imported at startup: {', '.join(deferred)}"
+        print(line)
+        for us, name in children:
+            print(f"     {us / 1000:6.1f}ms {name}")
+
+if __name__ == "__main__":
+    test_startup()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+tmux Broker for Noderr
+Runs as claude-user and holds one control-mode connection to claude-user's tmux
+server. Services send tmux commands over a Unix socket (TMUX_CHANNEL=broker) instead
+of paying for sudo, PAM and a new tmux client per command. Commands on a connection
+are pipelined: they are passed to tmux as they arrive and answered in order
+"""
+
+import os
+import sys
+import time
+import queue
+import socket
+import logging
+import threading
+import subprocess
+
+from tmux_channel import (
+    BROKER_SOCKET, REQUEST_HEADER, REPLY_HEADER, ChannelError, TmuxChannel, _Pending,
+    BrokerChannel, read_exactly, tmux_argv
+)
+
+logger = logging.getLogger(__name__)
+
+BROKER_COMMAND_TIMEOUT = float(os.environ.get('TMUX_BROKER_COMMAND_TIMEOUT', '30'))  # seconds per command
+BROKER_SOCKET_MODE = int(os.environ.get('TMUX_BROKER_SOCKET_MODE', '600'), 8)  # root connects regardless
+BENCH_OPS = int(os.environ.get('BENCH_OPS', '2000'))
+
+class BrokerServer:
+    """Accepts connections on the broker socket and relays their commands to one TmuxChannel"""
+
+    def __init__(self, path: str = BROKER_SOCKET, channel: TmuxChannel = None):
+        self.path = path
+        self.channel = channel or TmuxChannel()
+        self.stats = {'connections': 0, 'commands': 0}
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left over from a previous run
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        os.chmod(self.path, BROKER_SOCKET_MODE)
+        server.listen(64)
+        logger.info(f"tmux broker listening on {self.path}")
+        while True:
+            conn, _ = server.accept()
+            self.stats['connections'] += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        replies: queue.Queue = queue.Queue()
+        writer = threading.Thread(target=self._write_replies, args=(conn, replies), daemon=True)
+        writer.start()
+        try:
+            while True:
+                size, = REQUEST_HEADER.unpack(read_exactly(conn, REQUEST_HEADER.size))
+                args = read_exactly(conn, size).decode().split('\0')
+                try:
+                    item = self.channel.submit(*args)
+                except ChannelError as e:
+                    item = _Pending(args)
+                    item.error, item.lines = True, [str(e)]
+                    item.done.set()
+                self.stats['commands'] += 1
+                replies.put(item)
+        except (OSError, EOFError):
+            pass
+        finally:
+            replies.put(None)
+            writer.join()
+            conn.close()
+
+    def _write_replies(self, conn: socket.socket, replies: queue.Queue) -> None:
+        while True:
+            item = replies.get()
+            if item is None:
+                return
+            if item.done.wait(BROKER_COMMAND_TIMEOUT):
+                output = '\n'.join(item.lines) + ('\n' if item.lines else '')
+                returncode = 1 if item.error else 0
+            else:
+                output, returncode = 'tmux command timed out in broker', -1
+            body = output.encode()
+            try:
+                conn.sendall(REPLY_HEADER.pack(len(body), returncode) + body)
+            except OSError:
+                return
+
+def ops_per_second(run, ops: int) -> float:
+    started = time.perf_counter()
+    run(ops)
+    return ops / (time.perf_counter() - started)
+
+def bench() -> None:
+    """Compare tmux commands per second: exec (sudo when TMUX_RUN_AS is set) vs. the broker"""
+    print("=" * 60)
+    print("LOCAL TEST: tmux commands per second, exec vs. broker")
+    print("=" * 60)
+
+    path = f"/tmp/noderr-tmux-broker-bench-{os.getpid()}.sock"
+    # The broker serves as the current user, as it would as claude-user in production
+    broker = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve'],
+                              env={**os.environ, 'TMUX_BROKER_SOCKET': path, 'TMUX_RUN_AS': ''})
+    try:
+        while not os.path.exists(path):
+            time.sleep(0.01)
+        client = BrokerChannel(path)
+        command = ('list-sessions', '-F', '#{session_name}')
+        client.run(*command)  # connect and start the broker's tmux client
+
+        def sequential(n):
+            for _ in range(n):
+                client.run(*command)
+
+        def pipelined(n):
+            items = [client.submit(*command) for _ in range(n)]
+            for item in items:
+                item.done.wait()
+
+        def threaded(n):
+            workers = [threading.Thread(target=sequential, args=(n // 8,)) for _ in range(8)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+
+        def exec_path(n):
+            for _ in range(n):
+                subprocess.run(tmux_argv(*command), capture_output=True, text=True)
+
+        exec_ops = min(BENCH_OPS, 200)
+        results = [
+            (f"exec ({' '.join(tmux_argv())})", ops_per_second(exec_path, exec_ops)),
+            ('broker, one at a time', ops_per_second(sequential, BENCH_OPS)),
+            ('broker, 8 threads', ops_per_second(threaded, BENCH_OPS)),
+            ('broker, pipelined', ops_per_second(pipelined, BENCH_OPS)),
+        ]
+        base = results[0][1]
+        for name, rate in results:
+            print(f"{name:<32}{rate:>10.0f} ops/s  {rate / base:6.1f}x")
+        client.close()
+    finally:
+        broker.terminate()
+        broker.wait()
+        subprocess.run(tmux_argv('kill-session', '-t', '=noderr-control'), capture_output=True)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'serve':
+        BrokerServer().serve_forever()
+    elif command == 'bench':
+        bench()
+    else:
+        print(f"usage: {sys.argv[0]} serve|bench")
+        sys.exit(2)
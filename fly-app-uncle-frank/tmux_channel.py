@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Shared tmux Channel for Noderr
+Runs tmux commands against claude-user's tmux server, either by executing
+`sudo -u claude-user tmux ...` per command, through one long-lived control-mode
+client (`tmux -C`) shared by every caller in the process, or through the tmux
+broker daemon (tmux_broker.py) that runs as claude-user
+"""
+
+import os
+import re
+import uuid
+import socket
+import struct
+import logging
+import threading
+import subprocess
+from collections import deque
+from typing import Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TMUX_RUN_AS = os.environ.get('TMUX_RUN_AS', 'claude-user')  # empty runs tmux as the current user
+TMUX_CHANNEL = os.environ.get('TMUX_CHANNEL', 'exec')  # exec (one process per command), control or broker
+CONTROL_SESSION = os.environ.get('TMUX_CONTROL_SESSION', 'noderr-control')  # session the control client attaches to
+BROKER_SOCKET = os.environ.get('TMUX_BROKER_SOCKET', '/tmp/noderr-tmux-broker.sock')
+PASTE_THRESHOLD = int(os.environ.get('TMUX_PASTE_THRESHOLD', '256'))  # longer or multi-line text is pasted
+PASTE_CHUNK = int(os.environ.get('TMUX_PASTE_CHUNK', '16384'))  # characters per set-buffer over a channel
+
+# Broker frames: request = length + NUL-separated argv; reply = length + return code + output
+REQUEST_HEADER = struct.Struct('!I')
+REPLY_HEADER = struct.Struct('!Ii')
+
+# Arguments that tmux's command parser would split, expand or treat as a comment
+_PLAIN = re.compile(r'^[A-Za-z0-9_@%+=:,./=-]+$')
+
+def tmux_argv(*args: str, run_as: Optional[str] = None) -> List[str]:
+    """argv for tmux as run_as ('' for the current user), by default TMUX_RUN_AS"""
+    user = TMUX_RUN_AS if run_as is None else run_as
+    prefix = ['sudo', '-u', user] if user else []
+    return prefix + ['tmux', *args]
+
+def quote(arg: str) -> str:
+    """Quote one argument for a tmux command line (control mode reads one command per line)"""
+    if arg and _PLAIN.match(arg):
+        return arg
+    out = []
+    for ch in arg:
+        if ch in '\\"$':
+            out.append('\\' + ch)
+        elif ch == '\n':
+            out.append('\\n')
+        elif ch == '\t':
+            out.append('\\t')
+        elif ord(ch) < 0x20 or ord(ch) == 0x7f:
+            out.append(f"\\{ord(ch):03o}")
+        else:
+            out.append(ch)
+    return '"' + ''.join(out) + '"'
+
+class ChannelError(Exception):
+    """The control client is unavailable; callers fall back to exec"""
+
+class _Pending:
+    def __init__(self, args: List[str]):
+        self.args = args
+        self.done = threading.Event()
+        self.lines: List[str] = []
+        self.error = False
+        self.abandoned = False
+
+class TmuxChannel:
+    """One `tmux -C` client; commands are pipelined and answered in order
+
+    tmux executes a control client's commands sequentially and frames each reply
+    in %begin/%end (or %error) guards, so replies are matched to a FIFO of
+    pending commands. Notifications between the guards are ignored.
+    """
+
+    def __init__(self, session: str = CONTROL_SESSION):
+        self.session = session
+        self._proc: Optional[subprocess.Popen] = None
+        self._pending: Deque[_Pending] = deque()
+        self._lock = threading.Lock()
+        self.stats = {'commands': 0, 'errors': 0, 'restarts': 0}
+
+    def _start(self) -> None:
+        argv = tmux_argv('-C', 'new-session', '-A', '-s', self.session)
+        try:
+            self._proc = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL, text=True, encoding='utf-8',
+                                          errors='replace', bufsize=1)
+        except OSError as e:
+            raise ChannelError(f"Cannot start tmux control client: {e}")
+        self.stats['restarts'] += 1
+        threading.Thread(target=self._read, args=(self._proc,), name='tmux-channel', daemon=True).start()
+        # Output of the control session's own pane is never needed
+        self._send(['refresh-client', '-f', 'no-output'])
+
+    def _read(self, proc: subprocess.Popen) -> None:
+        current: Optional[_Pending] = None
+        guard = None
+        for line in proc.stdout:
+            line = line.rstrip('\n')
+            if current is None:
+                parts = line.split(' ')
+                # flags 1: the reply to a command this client sent (not the attach itself)
+                if parts[0] == '%begin' and len(parts) == 4 and parts[3] == '1':
+                    with self._lock:
+                        current = self._pending[0] if self._pending else None
+                    guard = parts[1:]
+                continue
+            parts = line.split(' ')
+            if parts[0] in ('%end', '%error') and parts[1:] == guard:
+                current.error = parts[0] == '%error'
+                with self._lock:
+                    self._pending.popleft()
+                current.done.set()
+                current = None
+            else:
+                current.lines.append(line)
+        # Client exited: fail everything still waiting
+        with self._lock:
+            if self._proc is proc:
+                self._proc = None
+            pending, self._pending = list(self._pending), deque()
+        for item in pending:
+            item.error = True
+            item.lines = ['tmux control client exited']
+            item.done.set()
+
+    def _send(self, args: List[str]) -> _Pending:
+        item = _Pending(args)
+        self._pending.append(item)
+        self._proc.stdin.write(' '.join(quote(a) for a in args) + '\n')
+        self._proc.stdin.flush()
+        return item
+
+    def submit(self, *args: str) -> _Pending:
+        """Queue a command without waiting for its reply (replies keep submission order)"""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            try:
+                return self._send(list(args))
+            except (OSError, ValueError) as e:
+                raise ChannelError(f"tmux control client unavailable: {e}")
+
+    def run(self, *args: str, timeout: float = 10) -> subprocess.CompletedProcess:
+        item = self.submit(*args)
+        if not item.done.wait(timeout):
+            item.abandoned = True
+            raise subprocess.TimeoutExpired(tmux_argv(*args), timeout)
+        self.stats['commands'] += 1
+        output = '\n'.join(item.lines) + ('\n' if item.lines else '')
+        if item.error:
+            self.stats['errors'] += 1
+            return subprocess.CompletedProcess(tmux_argv(*args), 1, '', output)
+        return subprocess.CompletedProcess(tmux_argv(*args), 0, output, '')
+
+    def close(self) -> None:
+        with self._lock:
+            if self._proc:
+                self._proc.stdin.close()
+                self._proc = None
+
+def read_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError('connection closed')
+        data += chunk
+    return data
+
+class BrokerChannel:
+    """Connection to the tmux broker; commands are pipelined and answered in order"""
+
+    def __init__(self, path: str = BROKER_SOCKET):
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        self._pending: Deque[_Pending] = deque()
+        self._lock = threading.Lock()
+        self.stats = {'commands': 0, 'errors': 0, 'restarts': 0}
+
+    def _connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise ChannelError(f"tmux broker unavailable: {e}")
+        self._sock = sock
+        self.stats['restarts'] += 1
+        threading.Thread(target=self._read, args=(sock,), name='tmux-broker', daemon=True).start()
+
+    def _read(self, sock: socket.socket) -> None:
+        try:
+            while True:
+                size, returncode = REPLY_HEADER.unpack(read_exactly(sock, REPLY_HEADER.size))
+                output = read_exactly(sock, size).decode('utf-8', 'replace')
+                with self._lock:
+                    item = self._pending.popleft()
+                item.error = returncode != 0
+                item.lines = [output]
+                item.done.set()
+        except (OSError, EOFError, IndexError):
+            pass
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            pending, self._pending = list(self._pending), deque()
+        sock.close()
+        for item in pending:
+            item.error = True
+            item.lines = ['tmux broker connection closed']
+            item.done.set()
+
+    def submit(self, *args: str) -> _Pending:
+        body = '\0'.join(args).encode()
+        item = _Pending(list(args))
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+            self._pending.append(item)
+            try:
+                self._sock.sendall(REQUEST_HEADER.pack(len(body)) + body)
+            except OSError as e:
+                self._pending.pop()
+                raise ChannelError(f"tmux broker unavailable: {e}")
+        return item
+
+    def run(self, *args: str, timeout: float = 10) -> subprocess.CompletedProcess:
+        item = self.submit(*args)
+        if not item.done.wait(timeout):
+            # Later replies would be matched to the wrong commands: start over
+            self.close()
+            raise subprocess.TimeoutExpired(tmux_argv(*args), timeout)
+        self.stats['commands'] += 1
+        output = item.lines[0] if item.lines else ''
+        if item.error:
+            self.stats['errors'] += 1
+            return subprocess.CompletedProcess(tmux_argv(*args), 1, '', output)
+        return subprocess.CompletedProcess(tmux_argv(*args), 0, output, '')
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sock:
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                self._sock = None
+
+_channel: Optional[TmuxChannel] = None
+_broker: Optional[BrokerChannel] = None
+_channel_lock = threading.Lock()
+
+def get_tmux_channel() -> TmuxChannel:
+    """Process-wide control-mode channel"""
+    global _channel
+    with _channel_lock:
+        if _channel is None:
+            _channel = TmuxChannel()
+        return _channel
+
+def get_broker_channel() -> BrokerChannel:
+    """Process-wide connection to the tmux broker"""
+    global _broker
+    with _channel_lock:
+        if _broker is None:
+            _broker = BrokerChannel()
+        return _broker
+
+def use_channel(mode: str) -> None:
+    """Switch this process's tmux() calls to 'exec', 'control' or 'broker'"""
+    global TMUX_CHANNEL
+    TMUX_CHANNEL = mode
+
+def tmux(*args: str, timeout: float = 10, run_as: Optional[str] = None) -> subprocess.CompletedProcess:
+    """Run a tmux command on claude-user's server; text output like subprocess.run
+
+    run_as targets another user's server instead; that is always a direct exec,
+    since the control client and broker are attached to TMUX_RUN_AS's server.
+    """
+    if TMUX_CHANNEL in ('control', 'broker') and run_as is None:
+        channel = get_tmux_channel() if TMUX_CHANNEL == 'control' else get_broker_channel()
+        try:
+            return channel.run(*args, timeout=timeout)
+        except ChannelError as e:
+            logger.warning(f"{e}; running tmux directly")
+    return subprocess.run(tmux_argv(*args, run_as=run_as), capture_output=True, text=True, timeout=timeout)
+
+def load_buffer(name: str, text: str, timeout: float = 30,
+                run_as: Optional[str] = None) -> subprocess.CompletedProcess:
+    """Put text into paste buffer `name` without it ever being a command-line argument
+
+    Over a channel the text goes in PASTE_CHUNK pieces (set-buffer, then set-buffer -a);
+    otherwise `tmux load-buffer -` reads it from stdin in one go.
+    """
+    if TMUX_CHANNEL in ('control', 'broker') and text and run_as is None:
+        try:
+            channel = get_tmux_channel() if TMUX_CHANNEL == 'control' else get_broker_channel()
+            result = None
+            for start in range(0, len(text), PASTE_CHUNK):
+                append = ['-a'] if start else []
+                result = channel.run('set-buffer', *append, '-b', name, text[start:start + PASTE_CHUNK],
+                                     timeout=timeout)
+                if result.returncode != 0:
+                    break
+            return result
+        except ChannelError as e:
+            logger.warning(f"{e}; loading the buffer directly")
+    return subprocess.run(tmux_argv('load-buffer', '-b', name, '-', run_as=run_as), input=text,
+                          capture_output=True, text=True, timeout=timeout)
+
+def send_text(target: str, text: str, enter: bool = True, timeout: float = 30,
+              run_as: Optional[str] = None) -> subprocess.CompletedProcess:
+    """Type text into a pane and optionally submit it
+
+    Short single-line text is sent with send-keys as before. Anything longer or with
+    newlines is loaded into a paste buffer and pasted with bracketed paste (when the
+    application asked for it), so it is neither limited by argv size nor read as key
+    names, and multi-line prompts are not submitted line by line. run_as is as for tmux().
+    """
+    if len(text) <= PASTE_THRESHOLD and '\n' not in text:
+        result = tmux('send-keys', '-t', target, text, timeout=timeout, run_as=run_as)
+    else:
+        name = f"noderr-{uuid.uuid4().hex[:12]}"
+        result = load_buffer(name, text, timeout=timeout, run_as=run_as)
+        if result.returncode == 0:
+            result = tmux('paste-buffer', '-d', '-p', '-b', name, '-t', target, timeout=timeout, run_as=run_as)
+        else:
+            tmux('delete-buffer', '-b', name, timeout=timeout, run_as=run_as)
+    if result.returncode == 0 and enter:
+        result = tmux('send-keys', '-t', target, 'C-m', timeout=timeout, run_as=run_as)
+    return result
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Durable Webhook Spool for Noderr
+Outbound events are appended to a local SQLite queue and delivered to the
+orchestrator in order, in batches, over a keep-alive connection with retry.
+Batches the receiver rejects outright, or that keep failing, are moved to a
+dead-letter table so they can't hold up the rest
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+import requests
+from typing import Dict, Any, List, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = os.environ.get('SPOOL_PATH', '/data/webhook-spool.db')
+SPOOL_BATCH = int(os.environ.get('SPOOL_BATCH', '50'))  # events per POST
+SPOOL_MAX_EVENTS = int(os.environ.get('SPOOL_MAX_EVENTS', '10000'))  # oldest dropped beyond this
+SPOOL_BACKOFF_BASE = float(os.environ.get('SPOOL_BACKOFF_BASE', '1'))  # seconds
+SPOOL_BACKOFF_MAX = float(os.environ.get('SPOOL_BACKOFF_MAX', '60'))  # seconds
+SPOOL_TIMEOUT = float(os.environ.get('SPOOL_TIMEOUT', '10'))  # seconds per POST
+SPOOL_MAX_ATTEMPTS = int(os.environ.get('SPOOL_MAX_ATTEMPTS', '50'))  # failed POSTs before a batch is dead-lettered
+RETRYABLE_4XX = (408, 429)  # other 4xx responses won't succeed on retry
+
+class WebhookSpool:
+    """Append-only event queue with a single in-order delivery thread"""
+
+    def __init__(self, url: str, path: str = SPOOL_PATH, batch_size: int = SPOOL_BATCH,
+                 on_response: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.url = url
+        self.path = path
+        self.batch_size = batch_size
+        self.on_response = on_response
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT, body TEXT NOT NULL, created REAL NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0)'
+        )
+        if 'attempts' not in [row[1] for row in self._db.execute('PRAGMA table_info(events)')]:
+            self._db.execute('ALTER TABLE events ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')  # older spools
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS dead_letters ('
+            'id INTEGER PRIMARY KEY, session TEXT, body TEXT NOT NULL, created REAL NOT NULL, '
+            'failed REAL NOT NULL, reason TEXT)'
+        )
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._http = requests.Session()  # keeps the connection to the orchestrator alive
+        self.stats = {'enqueued': 0, 'delivered': 0, 'batches': 0, 'failures': 0, 'dropped': 0, 'dead_lettered': 0}
+
+    def append(self, event: Dict[str, Any]) -> None:
+        """Durably enqueue an event and wake the sender"""
+        with self._lock:
+            self._db.execute('INSERT INTO events (session, body, created) VALUES (?, ?, ?)',
+                             (event.get('session'), json.dumps(event), time.time()))
+            self.stats['enqueued'] += 1
+            overflow = self._count() - SPOOL_MAX_EVENTS
+            if overflow > 0:
+                # The receiver detects the resulting offset gap and asks for a resend
+                self._db.execute('DELETE FROM events WHERE id IN (SELECT id FROM events ORDER BY id LIMIT ?)',
+                                 (overflow,))
+                self.stats['dropped'] += overflow
+                logger.warning(f"Spool full, dropped {overflow} oldest events")
+        self._wakeup.set()
+
+    def _count(self) -> int:
+        return self._db.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def _next_batch(self) -> List[tuple]:
+        with self._lock:
+            return self._db.execute('SELECT id, body, attempts FROM events ORDER BY id LIMIT ?',
+                                    (self.batch_size,)).fetchall()
+
+    def dead_letters(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM dead_letters').fetchone()[0]
+
+    def _dead_letter(self, batch: List[tuple], reason: str) -> None:
+        """Move a batch out of the queue; the receiver's offset check asks for a resend of its range"""
+        first, last = batch[0][0], batch[-1][0]
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            self._db.execute('INSERT INTO dead_letters (id, session, body, created, failed, reason) '
+                             'SELECT id, session, body, created, ?, ? FROM events WHERE id BETWEEN ? AND ?',
+                             (time.time(), reason, first, last))
+            self._db.execute('DELETE FROM events WHERE id BETWEEN ? AND ?', (first, last))
+            self._db.execute('DELETE FROM dead_letters WHERE id NOT IN '
+                             '(SELECT id FROM dead_letters ORDER BY id DESC LIMIT ?)', (SPOOL_MAX_EVENTS,))
+            self._db.execute('COMMIT')
+        self.stats['dead_lettered'] += len(batch)
+        logger.error(f"Dead-lettered {len(batch)} events ({reason})")
+
+    def _failed(self, batch: List[tuple], reason: str) -> bool:
+        """Count a failed attempt; True if the batch was given up on (so the spool moves on)"""
+        self.stats['failures'] += 1
+        with self._lock:
+            self._db.execute('UPDATE events SET attempts = attempts + 1 WHERE id BETWEEN ? AND ?',
+                             (batch[0][0], batch[-1][0]))
+        if max(attempts for _, _, attempts in batch) + 1 >= SPOOL_MAX_ATTEMPTS:
+            self._dead_letter(batch, f"{reason} after {SPOOL_MAX_ATTEMPTS} attempts")
+            return True
+        return False
+
+    def flush_once(self) -> Optional[bool]:
+        """Deliver the oldest batch; None if the spool is empty, else whether the spool moved past it
+        (accepted, or dead-lettered because retrying can't help)"""
+        batch = self._next_batch()
+        if not batch:
+            return None
+        payload = {
+            'event': 'batch',
+            'source': 'completion_monitor',
+            'events': [json.loads(body) for _, body, _ in batch]
+        }
+        try:
+            response = self._http.post(self.url, json=payload, timeout=SPOOL_TIMEOUT)
+        except requests.RequestException as e:
+            logger.warning(f"Webhook delivery failed: {e}")
+            return self._failed(batch, str(e))
+        if not response.ok:
+            logger.warning(f"Webhook receiver returned {response.status_code}")
+            if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_4XX:
+                self.stats['failures'] += 1
+                self._dead_letter(batch, f"HTTP {response.status_code}")
+                return True
+            return self._failed(batch, f"HTTP {response.status_code}")
+
+        with self._lock:
+            self._db.execute('DELETE FROM events WHERE id <= ?', (batch[-1][0],))
+        self.stats['delivered'] += len(batch)
+        self.stats['batches'] += 1
+        if self.on_response:
+            try:
+                self.on_response(response.json())
+            except ValueError:
+                pass
+        return True
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            delivered = self.flush_once()
+            if delivered is None:
+                self._wakeup.wait(1)
+                self._wakeup.clear()
+            elif delivered:
+                failures = 0
+            else:
+                # Full jitter: spread retries from many monitors after an orchestrator outage
+                delay = random.uniform(0, min(SPOOL_BACKOFF_MAX, SPOOL_BACKOFF_BASE * (2 ** failures)))
+                failures += 1
+                self._stop.wait(delay)
+
+    def start(self) -> 'WebhookSpool':
+        if not self._thread:
+            self._thread = threading.Thread(target=self._run, name='webhook-spool', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None